@@ -2,10 +2,33 @@ import streamlit as st
 import pandas as pd
 import os
 from datetime import datetime
-import random
-import barcode
-from barcode.writer import ImageWriter
 import io
+import time
+import perf
+from perf import span
+from inventory_utils import (
+    clean_nans, force_all_columns_to_string, clean_barcode, format_rrp,
+    inventory_snapshot, get_derived, get_price_cents, prepare_for_save, generate_unique_barcode, generate_framecode, size_options,
+)
+from warmup import start_warmup, inventory_paths
+from reconcile import reconcile_inventory, expected_quantities
+from money import COST_FIELDS, to_cents, format_cents, format_cents_value, format_money, first_cents, total_cents
+from archive_store import get_archive_index, records_to_frame, ARCHIVE_REASON_OPTIONS
+from bulk_edit import (
+    BULK_FILTER_FIELDS, BULK_OPERATIONS, PRICE_FIELDS, LOCATION_FIELDS,
+    read_barcode_list, select_rows, apply_bulk_operation,
+)
+from label_sheets import LABEL_LAYOUTS, DEFAULT_LAYOUT, labels_per_page, label_rows, build_label_pdf
+from bulk_import import read_import_file, prepare_import, rows_to_commit, IMPORT_STATUS_OK
+from inventory_diff import read_download, diff_inventory, change_report, apply_download, row_keys
+from change_feed import get_change_feed, VersionConflict
+from write_behind import get_write_behind
+from integrity import get_integrity, duplicate_rows, get_key_positions
+from lookup_index import get_prefix_index, search_products, lookup_table, resolve_barcode
+from frame_fit import render_similar_frames
+from duplicates import get_duplicate_clusters
+
+_rerun_start = time.perf_counter()
 
 # --- Custom CSS for green buttons and narrower textfields ---
 st.markdown("""
@@ -32,34 +55,14 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-def clean_nans(df):
-    return df.replace([pd.NA, 'nan'], '', regex=True)
-
-def force_all_columns_to_string(df):
-    for col in df.columns:
-        df[col] = df[col].astype(str)
-    return df
-
-def clean_barcode(val):
-    if pd.isnull(val) or val == "":
-        return ""
-    s = str(val).strip().replace('\u200b','').replace('\u00A0','')
-    try:
-        f = float(s)
-        s = str(int(f))
-    except ValueError:
-        pass
-    return s
-
-def format_rrp(val):
-    try:
-        f = float(str(val).replace("$", "").strip())
-        return f"${f:.2f}"
-    except Exception:
-        return "$0.00"
-
 INVENTORY_FOLDER = os.path.join(os.path.dirname(__file__), "Inventory")
-inventory_files = [f for f in os.listdir(INVENTORY_FOLDER) if f.lower().endswith(('.xlsx', '.csv'))]
+ARCHIVE_FOLDER = INVENTORY_FOLDER
+ARCHIVE_FILE = os.path.join(ARCHIVE_FOLDER, "archive_inventory.xlsx")
+ARCHIVE_LOG_FILE = os.path.join(ARCHIVE_FOLDER, "archive_inventory_log.jsonl")
+inventory_files = [
+    f for f in os.listdir(INVENTORY_FOLDER)
+    if f.lower().endswith(('.xlsx', '.csv')) and f != os.path.basename(ARCHIVE_FILE)
+]
 
 if not inventory_files:
     st.error("No inventory files found in the 'Inventory' folder.")
@@ -70,82 +73,63 @@ if len(inventory_files) > 1:
     selected_file = st.selectbox("Select inventory file to use:", inventory_files)
 
 INVENTORY_FILE = os.path.join(INVENTORY_FOLDER, selected_file)
-ARCHIVE_FOLDER = INVENTORY_FOLDER
-ARCHIVE_FILE = os.path.join(ARCHIVE_FOLDER, "archive_inventory.xlsx")
 
 st.set_page_config(page_title="Inventory Manager", layout="wide")
+start_warmup(inventory_paths(INVENTORY_FOLDER))
 
 def load_inventory():
+    # df_snapshot is the cache entry behind the frame: row positions from the
+    # indexes taken through it always point into this frame
+    global df_snapshot
     if os.path.exists(INVENTORY_FILE):
-        if INVENTORY_FILE.lower().endswith('.xlsx'):
-            df = pd.read_excel(INVENTORY_FILE)
-        elif INVENTORY_FILE.lower().endswith('.csv'):
-            df = pd.read_csv(INVENTORY_FILE)
-        else:
+        if not INVENTORY_FILE.lower().endswith(('.xlsx', '.csv')):
             st.error("Unsupported inventory file type.")
             st.stop()
-        df = force_all_columns_to_string(df)
-        df.rename(columns={"FRAME NO.": "FRAMENUM"}, inplace=True)
-        if "BARCODE" in df.columns:
-            df["BARCODE"] = df["BARCODE"].map(clean_barcode)
-            cols = list(df.columns)
-            cols.insert(0, cols.pop(cols.index("BARCODE")))
-            df = df[cols]
-        if "RRP" in df.columns:
-            df["RRP"] = df["RRP"].apply(lambda x: str(x).replace("$", "").strip())
-        return df
+        df_snapshot = inventory_snapshot(INVENTORY_FILE)
+        return df_snapshot["df"].copy(deep=False)
     else:
         st.error(f"Inventory file '{INVENTORY_FILE}' not found.")
         st.stop()
 
-def load_archive_inventory():
-    if os.path.exists(ARCHIVE_FILE):
-        df = pd.read_excel(ARCHIVE_FILE)
-        df = force_all_columns_to_string(df)
-        df.rename(columns={"FRAME NO.": "FRAMENUM"}, inplace=True)
-        if "BARCODE" in df.columns:
-            df["BARCODE"] = df["BARCODE"].map(clean_barcode)
-            cols = list(df.columns)
-            cols.insert(0, cols.pop(cols.index("BARCODE")))
-            df = df[cols]
-        if "RRP" in df.columns:
-            df["RRP"] = df["RRP"].apply(lambda x: str(x).replace("$", "").strip())
-        return df
-    else:
-        return pd.DataFrame()
-
-def generate_unique_barcode(df):
-    while True:
-        barcode_val = f"{random.randint(1, 15000):05d}"
-        barcode_val_clean = clean_barcode(barcode_val)
-        if "BARCODE" not in df.columns or barcode_val_clean not in df["BARCODE"].map(clean_barcode).values:
-            return barcode_val_clean
-
-def generate_framecode(supplier, df):
-    prefix = supplier[:3].upper()
-    frame_col = "FRAMENUM"
-    if frame_col not in df.columns:
-        return prefix + "000001"
-    framecodes = df[frame_col].dropna().astype(str)
-    matching = framecodes[framecodes.str.startswith(prefix)]
-    nums = matching.str[len(prefix):].str.extract(r'(\d{6})')[0].dropna()
-    if not nums.empty:
-        max_num = int(nums.max())
-        next_num = max_num + 1
-    else:
-        next_num = 1
-    return f"{prefix}{next_num:06d}"
+def report_conflict():
+    st.session_state["save_conflict_message"] = (
+        "❌ Someone else saved the inventory after this page loaded, so your change was not saved. "
+        "The page now shows their changes; please make your change again."
+    )
+    st.rerun()
+
+def save_inventory(df):
+    # Saves go through the change feed: a save based on an older version is refused.
+    # The file itself is rewritten in the background (see write_behind.py).
+    global base_version, df_snapshot
+    queued = []
+    with span("manager.save_inventory"):
+        df = prepare_for_save(df)
+        try:
+            base_version = change_feed.commit(
+                base_version, get_derived(INVENTORY_FILE, "manager_saved_form", prepare_for_save, df_snapshot), df,
+                write=lambda frame: queued.append(write_behind.submit(frame)), deferred=True,
+            )
+        except VersionConflict:
+            report_conflict()
+    # The rest of this run looks rows up in the frame just saved
+    df_snapshot = queued[0]
+    return df
 
 def generate_barcode_image(code):
     try:
+        # python-barcode pulls in PIL; import on first use rather than on every cold start
+        import barcode
+        from barcode.writer import ImageWriter
         CODE128 = barcode.get_barcode_class('code128')
         code = str(code)
         if not code:
             st.error("Barcode value cannot be empty.")
             return None
-        my_code = CODE128(code, writer=ImageWriter())
-        buffer = io.BytesIO()
-        my_code.write(buffer, options={"write_text": False})
+        with span("manager.barcode_image"):
+            my_code = CODE128(code, writer=ImageWriter())
+            buffer = io.BytesIO()
+            my_code.write(buffer, options={"write_text": False})
         buffer.seek(0)
         return buffer
     except Exception as e:
@@ -198,7 +182,8 @@ FRAMETYPE_OPTIONS = ["MEN", "WOMEN", "KIDS", "UNISEX"]
 F_TYPE_OPTIONS = ["MEN", "WOMEN", "KIDS", "UNISEX"]
 FRSTATUS_OPTIONS = ["CONSIGNMENT OWNED", "PRACTICE OWNED"]
 TAXPC_OPTIONS = [f"GST {i}%" for i in range(1, 21)]
-SIZE_OPTIONS = [f"{i:02d}-{j:02d}" for i in range(100) for j in range(100)]
+SIZE_OPTIONS = size_options()
+ARCHIVE_PAGE_SIZE = 200
 
 # --- Session state initialization ---
 if "add_product_expanded" not in st.session_state:
@@ -213,17 +198,25 @@ if "edit_product_index" not in st.session_state:
     st.session_state["edit_product_index"] = None
 if "edit_delete_expanded" not in st.session_state:
     st.session_state["edit_delete_expanded"] = False
-if "pending_delete_index" not in st.session_state:
-    st.session_state["pending_delete_index"] = None
+if "pending_delete_key" not in st.session_state:
+    st.session_state["pending_delete_key"] = None
 if "pending_delete_confirmed" not in st.session_state:
     st.session_state["pending_delete_confirmed"] = False
 if "supplier_for_framecode" not in st.session_state:
     st.session_state["supplier_for_framecode"] = ""
 if "last_deleted_product" not in st.session_state:
     st.session_state["last_deleted_product"] = None
+if "show_archive" not in st.session_state:
+    st.session_state["show_archive"] = False
 
-df = load_inventory()
-archive_df = load_archive_inventory()
+# Created first so saves left unwritten by a crash are replayed before the load
+write_behind = get_write_behind(INVENTORY_FILE)
+change_feed = get_change_feed(INVENTORY_FILE)
+with span("manager.load_inventory"):
+    # The version is read first, so a save landing in between shows up as a conflict
+    base_version = change_feed.refresh()
+    df = load_inventory()
+archive_index = get_archive_index(ARCHIVE_LOG_FILE, legacy_path=ARCHIVE_FILE)
 columns = list(df.columns)
 barcode_col = "BARCODE"
 framecode_col = "FRAMENUM"
@@ -236,6 +229,8 @@ if barcode_col not in columns or framecode_col not in columns:
 headers = [h for h in columns if h.lower() != "timestamp"]
 
 st.title("Inventory Manager")
+if st.session_state.get("save_conflict_message"):
+    st.error(st.session_state.pop("save_conflict_message"))
 
 st.markdown("#### Generate Unique Barcodes")
 btn_col1, btn_col2 = st.columns(2)
@@ -334,13 +329,11 @@ with st.expander("➕ Add a New Product", expanded=st.session_state["add_product
             missing = [field for field in required_fields if field in visible_headers and not input_values.get(field)]
             barcode_cleaned = clean_barcode(st.session_state["barcode_textinput"])
             framecode_cleaned = clean_barcode(st.session_state["framecode"])
-            df_barcodes_cleaned = df[barcode_col].map(clean_barcode)
-            df_framecodes_cleaned = df[framecode_col].map(clean_barcode)
             if missing:
                 st.warning(f"⚠️ {', '.join(missing)} are required.")
-            elif barcode_cleaned in df_barcodes_cleaned.values:
+            elif duplicate_rows(INVENTORY_FILE, barcode_col, barcode_cleaned, snapshot=df_snapshot):
                 st.error("❌ This barcode already exists in inventory!")
-            elif framecode_cleaned in df_framecodes_cleaned.values:
+            elif duplicate_rows(INVENTORY_FILE, framecode_col, framecode_cleaned, snapshot=df_snapshot):
                 st.error("❌ This framecode already exists in inventory!")
             else:
                 new_row = {}
@@ -361,84 +354,196 @@ with st.expander("➕ Add a New Product", expanded=st.session_state["add_product
                 if "Timestamp" in df.columns:
                     new_row["Timestamp"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                df = clean_nans(df)
-                df = force_all_columns_to_string(df)
-                df[barcode_col] = df[barcode_col].map(clean_barcode)
-                if "RRP" in df.columns:
-                    df["RRP"] = df["RRP"].apply(format_rrp)
-                if INVENTORY_FILE.lower().endswith('.xlsx'):
-                    df.to_excel(INVENTORY_FILE, index=False)
-                else:
-                    df.to_csv(INVENTORY_FILE, index=False)
+                df = save_inventory(df)
                 st.success(f"✅ Product added successfully!")
                 # No auto-clear; user can clear fields manually if needed
 
 # --- The rest of your script (INVENTORY TABLE, DOWNLOADS, EDIT/DELETE, etc.) ---
 
+def build_display_frame(frame):
+    # RRP stays numeric (dollars from whole cents) so the table sorts by price;
+    # the "$" is added by the column format when it is drawn
+    frame = clean_nans(frame)
+    if "RRP" in frame.columns:
+        frame["RRP"] = to_cents(frame["RRP"]) / 100
+    if "BARCODE" in frame.columns:
+        frame["BARCODE"] = frame["BARCODE"].map(clean_barcode)
+    return frame
+
+
+def build_export_frame(frame):
+    frame = clean_nans(frame)
+    if "RRP" in frame.columns:
+        frame["RRP"] = format_money(frame["RRP"])
+    if "BARCODE" in frame.columns:
+        frame["BARCODE"] = frame["BARCODE"].map(clean_barcode)
+    return frame
+
+
+def build_stock_value(frame):
+    quantities = expected_quantities(frame)
+    return {
+        "units": int(quantities.sum()),
+        "retail": total_cents(first_cents(frame, ["RRP"]), quantities),
+        "cost": total_cents(first_cents(frame, COST_FIELDS), quantities),
+    }
+
+
+MONEY_COLUMN_CONFIG = {"RRP": st.column_config.NumberColumn("RRP", format="$%.2f")}
+
+
+def build_excel_bytes(frame):
+    excel_buffer = io.BytesIO()
+    frame.to_excel(excel_buffer, index=False)
+    return excel_buffer.getvalue()
+
+
+def inventory_export_bytes(snapshot, fmt):
+    # Runs when a download button is pressed; built once per version for every session
+    def build(frame):
+        export = get_derived(INVENTORY_FILE, "manager_export", build_export_frame, snapshot)
+        return build_excel_bytes(export) if fmt == "excel" else export.to_csv(index=False).encode('utf-8')
+    with span(f"manager.{fmt}_export"):
+        return get_derived(INVENTORY_FILE, f"manager_{fmt}", build, snapshot)
+
+
+# The formatted table is built once per saved version of the file and shared by
+# every open session; the exports only when someone downloads them
 st.markdown('### Current Inventory')
-df_display = df.copy()
-if "RRP" in df_display.columns:
-    df_display["RRP"] = df_display["RRP"].apply(format_rrp).astype(str)
-if "BARCODE" in df_display.columns:
-    df_display["BARCODE"] = df_display["BARCODE"].map(clean_barcode)
-st.dataframe(clean_nans(df_display), width='stretch')
+with span("manager.normalize_display"):
+    df_display = get_derived(INVENTORY_FILE, "manager_display", build_display_frame, df_snapshot)
+    stock_value = get_derived(INVENTORY_FILE, "manager_stock_value", build_stock_value, df_snapshot)
+st.caption(
+    f"{stock_value['units']} units · {format_cents([stock_value['retail']]).iloc[0]} at RRP · "
+    f"{format_cents([stock_value['cost']]).iloc[0]} at cost"
+)
+with span("manager.inventory_table_render"):
+    st.dataframe(df_display, width='stretch', column_config=MONEY_COLUMN_CONFIG)
 
 download_date_str = datetime.now().strftime("%Y-%m-%d")
 custom_download_name = f"fil-{selected_file.split('.')[0]}_{download_date_str}-downloaded"
-excel_buffer = io.BytesIO()
-df_display["RRP"] = df_display["RRP"].astype(str)
-clean_nans(df_display).to_excel(excel_buffer, index=False)
-excel_buffer.seek(0)
 st.download_button(
     label="📄 Download as Excel",
-    data=excel_buffer,
+    data=lambda snapshot=df_snapshot: inventory_export_bytes(snapshot, "excel"),
     file_name=f"{custom_download_name}.xlsx",
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 )
 st.download_button(
     label="🗂️ Download as CSV",
-    data=clean_nans(df_display).to_csv(index=False).encode('utf-8'),
+    data=lambda snapshot=df_snapshot: inventory_export_bytes(snapshot, "csv"),
     file_name=f"{custom_download_name}.csv",
     mime="text/csv"
 )
 
-if not archive_df.empty:
-    st.markdown("### Archive Inventory")
-    archive_df_display = archive_df.copy()
+# --- Archive: loaded lazily and queried through the barcode/FRAMENUM/date index ---
+st.markdown("### Archive Inventory")
+st.checkbox("Show archive", key="show_archive")
+if st.session_state["show_archive"]:
+    st.caption(f"{archive_index.count()} archived products")
+    arch_f1, arch_f2, arch_f3, arch_f4 = st.columns(4)
+    archive_barcode_q = arch_f1.text_input("Archive barcode", key="archive_barcode_query")
+    archive_framenum_q = arch_f2.text_input("Archive FRAMENUM", key="archive_framenum_query")
+    archive_from_q = arch_f3.date_input("Archived from", value=None, key="archive_from_query")
+    archive_to_q = arch_f4.date_input("Archived to", value=None, key="archive_to_query")
+    with span("manager.archive_query"):
+        archive_records = archive_index.query(
+            barcode=archive_barcode_q,
+            framenum=archive_framenum_q,
+            date_from=archive_from_q,
+            date_to=archive_to_q,
+            limit=ARCHIVE_PAGE_SIZE,
+        )
+    archive_df_display = records_to_frame(archive_records, columns)
     if "RRP" in archive_df_display.columns:
-        archive_df_display["RRP"] = archive_df_display["RRP"].apply(format_rrp).astype(str)
+        archive_df_display["RRP"] = format_money(archive_df_display["RRP"])
     if "BARCODE" in archive_df_display.columns:
         archive_df_display["BARCODE"] = archive_df_display["BARCODE"].map(clean_barcode)
-    st.dataframe(clean_nans(archive_df_display), width='stretch')
-    archive_download_name = f"fil-archive_{download_date_str}-downloaded"
-    arch_col1, arch_col2 = st.columns([1, 1])
-    with arch_col1:
-        st.download_button(
-            label="📄 Archive Excel",
-            data=open(ARCHIVE_FILE, "rb").read(),
-            file_name=f"{archive_download_name}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    with arch_col2:
-        archive_csv_bytes = clean_nans(archive_df_display).to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="🗂️ Archive CSV",
-            data=archive_csv_bytes,
-            file_name=f"{archive_download_name}.csv",
-            mime="text/csv"
+    if len(archive_records) >= ARCHIVE_PAGE_SIZE:
+        st.caption(f"Showing the {ARCHIVE_PAGE_SIZE} most recent matches; narrow the search to see others.")
+    st.dataframe(clean_nans(archive_df_display), width='stretch', hide_index=True)
+    if archive_records:
+        archive_download_name = f"fil-archive_{download_date_str}-downloaded"
+        arch_col1, arch_col2 = st.columns([1, 1])
+        with arch_col1:
+            archive_excel_buffer = io.BytesIO()
+            clean_nans(archive_df_display).to_excel(archive_excel_buffer, index=False)
+            archive_excel_buffer.seek(0)
+            st.download_button(
+                label="📄 Archive Excel",
+                data=archive_excel_buffer,
+                file_name=f"{archive_download_name}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+        with arch_col2:
+            archive_csv_bytes = clean_nans(archive_df_display).to_csv(index=False).encode('utf-8')
+            st.download_button(
+                label="🗂️ Archive CSV",
+                data=archive_csv_bytes,
+                file_name=f"{archive_download_name}.csv",
+                mime="text/csv"
+            )
+        restore_id = st.selectbox(
+            "Select an archived product to restore",
+            options=[r["ARCHIVE_ID"] for r in archive_records],
+            format_func=lambda rid: f"{clean_barcode(archive_index.records[rid].get(barcode_col, ''))} - {archive_index.records[rid].get(framecode_col, '')} ({archive_index.records[rid]['ARCHIVED_AT'] or 'legacy'})",
+            key="restore_archive_id"
         )
+        if st.button("♻️ Restore to Inventory", key="restore_archive_btn"):
+            record = archive_index.get(restore_id)
+            restore_barcode = clean_barcode(record.get(barcode_col, ""))
+            if restore_barcode and restore_barcode in df[barcode_col].values:
+                st.error("❌ A product with this barcode is already in inventory!")
+            else:
+                restored_row = {col: record.get(col, "") for col in columns}
+                restored_row[barcode_col] = restore_barcode
+                df = pd.concat([df, pd.DataFrame([restored_row])], ignore_index=True)
+                df = save_inventory(df)
+                archive_index.mark_restored(restore_id)
+                st.success(f"✅ Product {restore_barcode} restored to inventory.")
+                st.rerun()
 
 with st.expander("✏️ Edit or 🗑 Delete Products", expanded=st.session_state["edit_delete_expanded"]):
     if len(df) > 0:
-        selected_row = st.selectbox(
+        # Products are selected by a stable row key (PKEY, UUID or BARCODE), not by
+        # position, so other users' adds and deletes can't shift the selection.
+        # Only the products matching the search are offered, from a prefix index
+        # built once per inventory version.
+        search_index = get_prefix_index(INVENTORY_FILE, df_snapshot)
+        key_positions = search_index["positions"]
+        if "pending_selected_product" in st.session_state:
+            st.session_state["selected_product"] = st.session_state.pop("pending_selected_product")
+            st.session_state["product_search"] = ""
+        product_search = st.text_input(
+            "Search by barcode, frame number or model",
+            key="product_search",
+            placeholder="Type the start of a barcode, FRAMENUM or model",
+        )
+        product_options = search_products(search_index, product_search)
+        current_key = st.session_state.get("selected_product")
+        if current_key not in key_positions or (product_search.strip() and current_key not in product_options):
+            st.session_state.pop("selected_product", None)
+        elif current_key not in product_options:
+            product_options.insert(0, current_key)
+        if product_search.strip() and not product_options:
+            st.info("ℹ️ No products match this search.")
+        selected_key = st.selectbox(
             "Select a product to edit or delete",
-            options=df.index.tolist(),
-            format_func=lambda i: f"{clean_barcode(df.at[i, barcode_col])} - {clean_barcode(df.at[i, framecode_col])}",
+            options=product_options,
+            format_func=search_index["labels"].get,
             key="selected_product"
         )
+        selected_row = df.index[key_positions[selected_key]] if selected_key is not None else None
         if selected_row is not None:
             st.session_state["edit_product_index"] = selected_row
+            # Version this edit form was filled from; reset when another product is picked
+            edit_base = st.session_state.get("edit_base")
+            if not edit_base or edit_base[0] != selected_key:
+                edit_base = st.session_state["edit_base"] = (selected_key, base_version)
+            if st.session_state.get("edit_conflict_message"):
+                st.error(st.session_state.pop("edit_conflict_message"))
             product = df.loc[selected_row]
+            # The stored price, from this version's cents column rather than re-parsed
+            product_cents = get_price_cents(INVENTORY_FILE, "RRP", df_snapshot).iloc[df.index.get_loc(selected_row)] if "RRP" in df.columns else None
             edit_values = {}
             n_cols = 3
             visible_headers = [h for h in VISIBLE_FIELDS if h in headers]
@@ -453,7 +558,7 @@ with st.expander("✏️ Edit or 🗑 Delete Products", expanded=st.session_stat
                 for idx, header in enumerate(row):
                     value = product[header] if header in product else ""
                     show_value = clean_barcode(value) if header in [barcode_col, framecode_col] else value
-                    unique_key = f"edit_textinput_{header}_{selected_row}"
+                    unique_key = f"edit_textinput_{header}_{selected_key}"
                     smart_suggestion = get_smart_default(header, df)
                     if header in [barcode_col, framecode_col]:
                         label = header
@@ -501,7 +606,7 @@ with st.expander("✏️ Edit or 🗑 Delete Products", expanded=st.session_stat
                     elif header.upper() in ["TEMPLE", "DEPTH", "DIAG", "EXCOSTPR", "COST PRICE"]:
                         edit_values[header] = cols[idx].text_input(header, value=str(show_value), key=unique_key)
                     elif header.upper() == "RRP":
-                        edit_values[header] = cols[idx].text_input(header, value=format_rrp(show_value), key=unique_key)
+                        edit_values[header] = cols[idx].text_input(header, value=format_cents_value(product_cents), key=unique_key)
                     elif header.upper() == "TAXPC":
                         default_tax = str(show_value) if str(show_value) in TAXPC_OPTIONS else TAXPC_OPTIONS[9]
                         edit_values[header] = cols[idx].selectbox(header, TAXPC_OPTIONS, index=max(0, TAXPC_OPTIONS.index(default_tax)), key=unique_key)
@@ -509,7 +614,7 @@ with st.expander("✏️ Edit or 🗑 Delete Products", expanded=st.session_stat
                         edit_values[header] = cols[idx].text_input(header, value=str(show_value), key=unique_key)
                     else:
                         edit_values[header] = cols[idx].text_input(header, value=str(show_value), key=unique_key)
-            with st.form(key=f"edit_form_{selected_row}"):
+            with st.form(key=f"edit_form_{selected_key}"):
                 col1, col2 = st.columns(2)
                 submit_edit = col1.form_submit_button("Save Changes")
                 submit_delete = col2.form_submit_button("Delete Product")
@@ -518,15 +623,24 @@ with st.expander("✏️ Edit or 🗑 Delete Products", expanded=st.session_stat
                         edit_values["AVAILFROM"] = edit_values["AVAILFROM"].strftime('%Y-%m-%d')
                     edit_barcode_cleaned = clean_barcode(edit_values[barcode_col])
                     edit_framecode_cleaned = clean_barcode(edit_values[framecode_col])
-                    df_barcodes_cleaned = df[barcode_col].map(clean_barcode)
-                    df_framecodes_cleaned = df[framecode_col].map(clean_barcode)
-                    duplicate_barcode = (df_barcodes_cleaned == edit_barcode_cleaned) & (df.index != selected_row)
-                    duplicate_framecode = (df_framecodes_cleaned == edit_framecode_cleaned) & (df.index != selected_row)
-                    if duplicate_barcode.any():
+                    selected_position = df.index.get_loc(selected_row)
+                    duplicate_barcode = duplicate_rows(INVENTORY_FILE, barcode_col, edit_barcode_cleaned, selected_position, df_snapshot)
+                    duplicate_framecode = duplicate_rows(INVENTORY_FILE, framecode_col, edit_framecode_cleaned, selected_position, df_snapshot)
+                    touched_keys = change_feed.changed_keys_since(edit_base[1])
+                    if touched_keys is None or selected_key in touched_keys:
+                        # Someone else changed this product since the form was filled in:
+                        # reload the form with their values rather than overwrite them
+                        for state_key in [k for k in st.session_state if k.startswith("edit_textinput_") and k.endswith(f"_{selected_key}")]:
+                            del st.session_state[state_key]
+                        st.session_state["edit_base"] = None
+                        st.session_state["edit_conflict_message"] = "❌ This product was changed by someone else while you were editing. The form now shows their version; please make your change again."
+                        st.rerun()
+                    elif duplicate_barcode:
                         st.error("❌ Another product with this barcode already exists!")
-                    elif duplicate_framecode.any():
+                    elif duplicate_framecode:
                         st.error("❌ Another product with this framecode already exists!")
                     else:
+                        # Fields without an input (PKEY, UUID, ...) keep their values so the row key survives
                         for h in headers:
                             if h in edit_values:
                                 val = edit_values[h]
@@ -536,52 +650,301 @@ with st.expander("✏️ Edit or 🗑 Delete Products", expanded=st.session_stat
                                     val = clean_barcode(val)
                                 if h == "RRP":
                                     val = format_rrp(val)
-                                df.at[selected_row, h] = val
-                            else:
-                                df.at[selected_row, h] = ""
+                                df.at[selected_row, h] = str(val)
                         if "Timestamp" in df.columns:
                             df.at[selected_row, "Timestamp"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        df = clean_nans(df)
-                        df = force_all_columns_to_string(df)
-                        df[barcode_col] = df[barcode_col].map(clean_barcode)
-                        if "RRP" in df.columns:
-                            df["RRP"] = df["RRP"].apply(format_rrp)
-                        if INVENTORY_FILE.lower().endswith('.xlsx'):
-                            df.to_excel(INVENTORY_FILE, index=False)
-                        else:
-                            df.to_csv(INVENTORY_FILE, index=False)
+                        df = save_inventory(df)
                         st.success("✅ Product updated successfully!")
+                        st.session_state["pending_selected_product"] = row_keys(df)[df.index.get_loc(selected_row)]
+                        st.session_state["edit_base"] = None
                         st.session_state["edit_delete_expanded"] = True
                         st.rerun()
                 if submit_delete:
-                    st.session_state["pending_delete_index"] = selected_row
+                    st.session_state["pending_delete_key"] = selected_key
 
     else:
         st.info("ℹ️ No products in inventory yet.")
 
-if st.session_state.get("pending_delete_index") is not None:
-    st.warning(f"⚠️ Are you sure you want to delete product with barcode '{clean_barcode(df.at[st.session_state['pending_delete_index'], barcode_col])}' and framecode '{clean_barcode(df.at[st.session_state['pending_delete_index'], framecode_col])}'?")
+pending_delete_position = None
+if st.session_state.get("pending_delete_key") is not None:
+    pending_delete_position = get_prefix_index(INVENTORY_FILE, df_snapshot)["positions"].get(st.session_state["pending_delete_key"])
+    if pending_delete_position is None:
+        st.info("ℹ️ The product you chose to delete has already been removed.")
+        st.session_state["pending_delete_key"] = None
+if pending_delete_position is not None:
+    pending_delete_index = df.index[pending_delete_position]
+    st.warning(f"⚠️ Are you sure you want to delete product with barcode '{clean_barcode(df.at[pending_delete_index, barcode_col])}' and framecode '{clean_barcode(df.at[pending_delete_index, framecode_col])}'? It will be moved to the archive.")
+    archive_reason = st.selectbox("Archive reason", ARCHIVE_REASON_OPTIONS, key="archive_reason")
     confirm_col, cancel_col = st.columns(2)
     with confirm_col:
         if st.button("Confirm Delete", key="confirm_delete_btn"):
-            df = df.drop(st.session_state["pending_delete_index"]).reset_index(drop=True)
-            df = clean_nans(df)
-            df = force_all_columns_to_string(df)
-            df[barcode_col] = df[barcode_col].map(clean_barcode)
-            if "RRP" in df.columns:
-                df["RRP"] = df["RRP"].apply(format_rrp)
-            if INVENTORY_FILE.lower().endswith('.xlsx'):
-                df.to_excel(INVENTORY_FILE, index=False)
-            else:
-                df.to_csv(INVENTORY_FILE, index=False)
-            st.success("✅ Product deleted successfully!")
+            deleted_row = df.loc[pending_delete_index]
+            df = save_inventory(df.drop(pending_delete_index).reset_index(drop=True))
+            # Archived only once the save is accepted: a conflicting save reruns the
+            # page and leaves the product in the inventory
+            archive_index.archive_row(deleted_row, reason=archive_reason)
+            st.success("✅ Product deleted and archived successfully!")
             st.session_state["edit_product_index"] = None
             st.session_state["edit_delete_expanded"] = True
-            st.session_state["pending_delete_index"] = None
+            st.session_state["pending_delete_key"] = None
             st.rerun()
     with cancel_col:
         if st.button("Cancel", key="cancel_delete_btn"):
-            st.session_state["pending_delete_index"] = None
+            st.session_state["pending_delete_key"] = None
+
+with st.expander("🧰 Bulk Edit Products"):
+    st.write("Select products by filter or by a list of barcodes, then apply one change to all of them in a single save.")
+    if st.session_state.get("bulk_apply_message"):
+        st.success(st.session_state.pop("bulk_apply_message"))
+    bulk_filters = {}
+    filter_cols = st.columns(len(BULK_FILTER_FIELDS) + 1, gap="small")
+    for idx, field in enumerate(BULK_FILTER_FIELDS):
+        if field in df.columns:
+            field_options = [""] + sorted(v for v in df[field].fillna("").astype(str).unique() if v and v != "nan")
+            bulk_filters[field] = filter_cols[idx].selectbox(field, field_options, key=f"bulk_filter_{field}")
+    bulk_prefix = filter_cols[-1].text_input("FRAMENUM prefix", key="bulk_filter_framenum_prefix")
+    price_cols = st.columns(3, gap="small")
+    bulk_price_field = price_cols[0].selectbox("Price", [f for f in PRICE_FIELDS if f in df.columns] or ["RRP"], key="bulk_filter_price_field")
+    bulk_price_min = price_cols[1].number_input("From $ (0 = any)", min_value=0.0, value=0.0, step=10.0, key="bulk_filter_price_min")
+    bulk_price_max = price_cols[2].number_input("To $ (0 = any)", min_value=0.0, value=0.0, step=10.0, key="bulk_filter_price_max")
+    bulk_price_range = (
+        bulk_price_field,
+        round(bulk_price_min * 100) if bulk_price_min else None,
+        round(bulk_price_max * 100) if bulk_price_max else None,
+    )
+    bulk_list_file = st.file_uploader("Or upload a barcode list", type=["csv", "xlsx", "txt"], key="bulk_barcode_file")
+    bulk_list_text = st.text_area("Or paste barcodes (one per line)", key="bulk_barcode_text")
+    bulk_barcodes = read_barcode_list(bulk_list_file, bulk_list_text)
+    bulk_price_cents = (
+        get_price_cents(INVENTORY_FILE, bulk_price_field, df_snapshot)
+        if (bulk_price_min or bulk_price_max) and bulk_price_field in df.columns else None
+    )
+    bulk_mask = select_rows(df, bulk_filters, bulk_prefix, bulk_barcodes, barcode_col, framecode_col,
+                            bulk_price_range, bulk_price_cents)
+    has_selection = any(bulk_filters.values()) or bool(bulk_prefix) or bool(bulk_barcodes) or bool(bulk_price_min or bulk_price_max)
+    if not has_selection:
+        st.info("ℹ️ Choose a filter or barcode list to select products.")
+    else:
+        bulk_selected_count = int(bulk_mask.sum())
+        st.markdown(f"**{bulk_selected_count} products selected**")
+        if bulk_barcodes:
+            unknown_barcodes = sorted(set(bulk_barcodes) - set(df[barcode_col]))
+            if unknown_barcodes:
+                st.warning(f"⚠️ {len(unknown_barcodes)} listed barcodes are not in inventory: {', '.join(unknown_barcodes[:20])}")
+        st.dataframe(clean_nans(df[bulk_mask].head(50)), width='stretch')
+        bulk_operation = st.radio("Change to apply", BULK_OPERATIONS, horizontal=True, key="bulk_operation")
+        bulk_field = None
+        bulk_value = None
+        if bulk_operation == "Set field":
+            editable_fields = [h for h in headers if h not in (barcode_col, framecode_col)]
+            bulk_field = st.selectbox("Field", editable_fields, key="bulk_set_field")
+            bulk_value = st.text_input("New value", key="bulk_set_value")
+        elif bulk_operation == "Percent price change":
+            bulk_field = st.selectbox("Price field", [f for f in PRICE_FIELDS if f in df.columns], key="bulk_price_field")
+            bulk_value = st.number_input("Percent change (e.g. 10 or -5)", value=0.0, step=0.5, key="bulk_price_pct")
+        elif bulk_operation == "Relocate":
+            loc_cols = st.columns(len(LOCATION_FIELDS), gap="small")
+            bulk_value = {
+                loc_field: loc_cols[i].text_input(f"New {loc_field}", key=f"bulk_relocate_{loc_field}")
+                for i, loc_field in enumerate(LOCATION_FIELDS) if loc_field in df.columns
+            }
+        else:
+            bulk_archive_reason = st.selectbox("Archive reason", ARCHIVE_REASON_OPTIONS, key="bulk_archive_reason")
+        if st.button(f"Apply to {bulk_selected_count} products", key="bulk_apply_btn", disabled=bulk_selected_count == 0):
+            with span("manager.bulk_apply"):
+                updated_df, removed_rows, bulk_errors = apply_bulk_operation(df, bulk_mask, bulk_operation, bulk_field, bulk_value)
+            if bulk_errors:
+                for err in bulk_errors:
+                    st.error(f"❌ {err}")
+            else:
+                df = save_inventory(updated_df)
+                if not removed_rows.empty:
+                    archive_index.archive_rows(removed_rows.to_dict("records"), reason=bulk_archive_reason)
+                # Rerun so the selection and preview show the saved values
+                st.session_state["bulk_apply_message"] = f"✅ {bulk_operation} applied to {bulk_selected_count} products."
+                st.rerun()
+
+with st.expander("🏷️ Print Barcode Labels"):
+    st.write("Select products by filter or by a list of barcodes and download a PDF sheet of Code128 labels.")
+    label_filters = {}
+    label_filter_cols = st.columns(len(BULK_FILTER_FIELDS) + 1, gap="small")
+    for idx, field in enumerate(BULK_FILTER_FIELDS):
+        if field in df.columns:
+            field_options = [""] + sorted(v for v in df[field].fillna("").astype(str).unique() if v and v != "nan")
+            label_filters[field] = label_filter_cols[idx].selectbox(field, field_options, key=f"label_filter_{field}")
+    label_prefix = label_filter_cols[-1].text_input("FRAMENUM prefix", key="label_filter_framenum_prefix")
+    label_list_text = st.text_area("Or paste barcodes (one per line)", key="label_barcode_text")
+    label_barcodes = read_barcode_list(None, label_list_text)
+    label_opt1, label_opt2, label_opt3 = st.columns(3, gap="small")
+    label_layout_name = label_opt1.selectbox("Label stock", list(LABEL_LAYOUTS), index=list(LABEL_LAYOUTS).index(DEFAULT_LAYOUT), key="label_layout")
+    label_layout = LABEL_LAYOUTS[label_layout_name]
+    label_start = label_opt2.number_input("Start at label", min_value=1, max_value=labels_per_page(label_layout), value=1, step=1, key="label_start_position")
+    label_per_unit = label_opt3.checkbox("One label per unit (QUANTITY)", key="label_one_per_unit")
+    if not (any(label_filters.values()) or label_prefix or label_barcodes):
+        st.info("ℹ️ Choose a filter or barcode list to select products.")
+    else:
+        label_mask = select_rows(df, label_filters, label_prefix, label_barcodes, barcode_col, framecode_col)
+        selected_labels = label_rows(df, label_mask, label_per_unit, barcode_col)
+        st.markdown(f"**{len(selected_labels)} labels selected**")
+        # A PDF built for a different selection or layout is not offered for download
+        label_pdf_key = (tuple(selected_labels[barcode_col]), label_layout_name, int(label_start))
+        if st.button(f"Create PDF of {len(selected_labels)} labels", key="label_build_btn", disabled=selected_labels.empty):
+            with span("manager.label_sheet"):
+                label_pdf, label_failed = build_label_pdf(selected_labels, label_layout, int(label_start), barcode_col=barcode_col)
+            st.session_state["label_pdf"] = (label_pdf_key, label_pdf)
+            if label_failed:
+                st.warning(f"⚠️ {len(label_failed)} barcodes could not be encoded: {', '.join(label_failed[:20])}")
+        if st.session_state.get("label_pdf") and st.session_state["label_pdf"][0] == label_pdf_key:
+            st.download_button(
+                label="Download Labels (PDF)",
+                data=st.session_state["label_pdf"][1],
+                file_name="barcode_labels.pdf",
+                mime="application/pdf",
+                key="label_pdf_download",
+            )
+
+with st.expander("📥 Import Supplier Delivery"):
+    st.write("Upload a CSV or Excel file of new frames. Headers such as FRAME NO., F GROUP and COST PRICE are mapped automatically.")
+    import_file = st.file_uploader("Upload delivery file", type=["csv", "xlsx"], key="import_delivery_file")
+    import_opt1, import_opt2 = st.columns(2)
+    import_auto_barcode = import_opt1.checkbox("Allocate missing barcodes", value=True, key="import_auto_barcode")
+    import_auto_framecode = import_opt2.checkbox("Allocate missing framecodes (from SUPPLIER)", value=True, key="import_auto_framecode")
+    if import_file is not None:
+        try:
+            incoming_df = read_import_file(import_file)
+        except Exception as e:
+            st.error(f"❌ Error reading file: {e}")
+            incoming_df = None
+        if incoming_df is not None:
+            # Allocation is random, so keep the prepared preview stable across reruns
+            import_key = (import_file.name, import_file.size, import_auto_barcode, import_auto_framecode, len(df))
+            if st.session_state.get("import_preview_key") != import_key:
+                with span("manager.import_prepare"):
+                    st.session_state["import_preview"] = prepare_import(
+                        incoming_df, df, barcode_col, framecode_col,
+                        auto_barcode=import_auto_barcode, auto_framecode=import_auto_framecode,
+                    )
+                st.session_state["import_preview_key"] = import_key
+            import_preview, import_mapping, import_unmapped = st.session_state["import_preview"]
+            st.markdown("**Header mapping**")
+            st.dataframe(pd.DataFrame({"File header": list(import_mapping), "Inventory column": list(import_mapping.values())}), hide_index=True)
+            if import_unmapped:
+                st.warning(f"⚠️ These columns will be ignored: {', '.join(import_unmapped)}")
+            import_ok_count = int((import_preview["IMPORT_STATUS"] == IMPORT_STATUS_OK).sum())
+            import_bad_count = len(import_preview) - import_ok_count
+            st.markdown(f"**{import_ok_count} rows ready, {import_bad_count} rows with problems**")
+            if import_bad_count:
+                st.dataframe(import_preview["IMPORT_STATUS"].value_counts().rename_axis("Status").reset_index(name="Rows"), hide_index=True)
+            st.dataframe(clean_nans(import_preview), width='stretch')
+            if st.button(f"Import {import_ok_count} products", key="import_commit_btn", disabled=import_ok_count == 0):
+                df = pd.concat([df, rows_to_commit(import_preview)], ignore_index=True)
+                df = save_inventory(df)
+                st.session_state["import_preview_key"] = None
+                st.success(f"✅ Imported {import_ok_count} products.")
+
+with st.expander("🩺 Data Integrity Report"):
+    st.write("Checks run once per version of the inventory file: duplicate barcodes and framecodes, unreadable prices and dates, out-of-range quantities and barcodes that only match after cleaning.")
+    with span("manager.integrity_scan"):
+        integrity = get_integrity(INVENTORY_FILE, df_snapshot)
+    st.dataframe(integrity["summary"], width='stretch', hide_index=True)
+    integrity_issues = integrity["issues"]
+    if integrity_issues.empty:
+        st.success("✅ No problems found.")
+    else:
+        integrity_checks = st.multiselect(
+            "Show", sorted(integrity_issues["CHECK"].unique()), key="integrity_checks",
+        )
+        shown_issues = integrity_issues[integrity_issues["CHECK"].isin(integrity_checks)] if integrity_checks else integrity_issues
+        st.dataframe(clean_nans(shown_issues), width='stretch', hide_index=True)
+        st.download_button(
+            label="Download Integrity Report (CSV)",
+            data=integrity_issues.to_csv(index=False).encode('utf-8'),
+            file_name="inventory_integrity.csv",
+            mime="text/csv",
+            key="integrity_csv",
+        )
+
+with st.expander("🧬 Duplicate Products"):
+    st.write("Products that appear more than once under different barcodes: rows with the same FRAMENUM, model, manufacturer, size, colour and frame type, across the inventory and the archive.")
+    dup_cols = st.columns(2)
+    dup_normalize = dup_cols[0].checkbox("Ignore case and extra spaces", value=True, key="duplicates_normalize")
+    dup_archive = dup_cols[1].checkbox("Include archived products", value=True, key="duplicates_include_archive")
+    with span("manager.duplicate_clusters"):
+        dup_result = get_duplicate_clusters(INVENTORY_FILE, archive_index if dup_archive else None, dup_normalize, df_snapshot)
+    dup_clusters = dup_result["clusters"]
+    if dup_clusters.empty:
+        st.success("✅ No duplicate products found.")
+    else:
+        st.write(f"{len(dup_clusters)} products entered more than once ({int(dup_clusters['ROWS'].sum())} rows).")
+        st.dataframe(dup_clusters, width='stretch', hide_index=True)
+        dup_selected = st.selectbox(
+            "Show the rows of cluster", dup_clusters["CLUSTER"].tolist(), key="duplicates_cluster",
+            format_func=lambda c: f"{c}: {dup_clusters.at[c - 1, 'FRAMENUM']} {dup_clusters.at[c - 1, 'MODEL']} ({dup_clusters.at[c - 1, 'BARCODES']})",
+        )
+        dup_members = dup_result["members"]
+        st.dataframe(dup_members[dup_members["CLUSTER"] == dup_selected], width='stretch', hide_index=True)
+        st.download_button(
+            label="Download Duplicate Products (CSV)",
+            data=dup_members.to_csv(index=False).encode('utf-8'),
+            file_name="duplicate_products.csv",
+            mime="text/csv",
+            key="duplicates_csv",
+        )
+
+with st.expander("🔄 Compare POS Download"):
+    st.write("Upload a fresh POS stock download to see what changed against the current inventory file before replacing it.")
+    download_file = st.file_uploader("Upload POS download", type=["csv", "xlsx"], key="pos_download_file")
+    if download_file is not None:
+        download_key = (download_file.name, download_file.size, selected_file, base_version)
+        if st.session_state.get("pos_diff_key") != download_key:
+            try:
+                download_df = read_download(download_file)
+                with span("manager.pos_diff"):
+                    # The diff reuses hashes saved against the file, so write queued saves first
+                    write_behind.flush()
+                    st.session_state["pos_diff"] = (download_df, diff_inventory(df, download_df, INVENTORY_FILE))
+                st.session_state["pos_diff_key"] = download_key
+            except Exception as e:
+                st.error(f"❌ Error reading file: {e}")
+                st.session_state["pos_diff_key"] = None
+        if st.session_state.get("pos_diff_key") == download_key:
+            download_df, pos_diff = st.session_state["pos_diff"]
+            diff_cols = st.columns(4)
+            diff_cols[0].metric("Added", len(pos_diff["added"]))
+            diff_cols[1].metric("Removed", len(pos_diff["removed"]))
+            diff_cols[2].metric("Changed", pos_diff["changed_rows"])
+            diff_cols[3].metric("Unchanged", pos_diff["unchanged_rows"])
+            if pos_diff["added_columns"] or pos_diff["removed_columns"]:
+                st.warning(f"⚠️ Columns added: {', '.join(pos_diff['added_columns']) or 'none'}; removed: {', '.join(pos_diff['removed_columns']) or 'none'}")
+            if not pos_diff["changes"].empty:
+                st.write("✏️ Changed fields:")
+                st.dataframe(clean_nans(pos_diff["changes"]), width='stretch', hide_index=True)
+            if not pos_diff["added"].empty:
+                st.write("➕ Added products:")
+                st.dataframe(clean_nans(pos_diff["added"]), width='stretch', hide_index=True)
+            if not pos_diff["removed"].empty:
+                st.write("➖ Removed products:")
+                st.dataframe(clean_nans(pos_diff["removed"]), width='stretch', hide_index=True)
+            st.download_button(
+                label="Download Change Report (CSV)",
+                data=change_report(pos_diff).to_csv(index=False).encode('utf-8'),
+                file_name="pos_download_changes.csv",
+                mime="text/csv",
+                key="pos_diff_download",
+            )
+            has_changes = len(pos_diff["added"]) or len(pos_diff["removed"]) or pos_diff["changed_rows"] or pos_diff["added_columns"] or pos_diff["removed_columns"]
+            if st.button(f"Replace {selected_file} with this download", key="pos_apply_btn", disabled=not has_changes):
+                with span("manager.pos_apply"):
+                    try:
+                        base_version = change_feed.commit(
+                            base_version, df, download_df, diff=pos_diff,
+                            write=lambda frame: apply_download(INVENTORY_FILE, df, frame, pos_diff),
+                        )
+                    except VersionConflict:
+                        report_conflict()
+                df = load_inventory()
+                st.session_state["pos_diff_key"] = None
+                st.success(f"✅ {selected_file} updated from the POS download.")
 
 with st.expander("📦 Stock Count"):
     st.write("Upload a file (CSV, Excel, or TXT) of scanned barcodes from your stock count.")
@@ -615,44 +978,102 @@ with st.expander("📦 Stock Count"):
             barcode_column = st.selectbox(
                 "Select the column containing barcodes", barcode_candidates
             )
-            inventory_barcodes = set(df[barcode_col].map(clean_barcode))
-            scanned_barcodes = set(scanned_df[barcode_column].map(clean_barcode))
-            matched = inventory_barcodes & scanned_barcodes
-            missing = inventory_barcodes - scanned_barcodes
-            unexpected = scanned_barcodes - inventory_barcodes
-            st.success(f"✅ Matched items: {len(matched)}")
-            st.warning(f"⚠️ Missing items: {len(missing)}")
-            st.error(f"❌ Unexpected items: {len(unexpected)}")
-            if matched:
+            with span("manager.stock_count_reconcile"):
+                scan_counts = scanned_df[barcode_column].map(clean_barcode).value_counts()
+                scan_counts = scan_counts[scan_counts.index != ""]
+                stock_count_reports = reconcile_inventory(df, scan_counts, barcode_col=barcode_col)
+            matched_df = stock_count_reports["matched"]
+            missing_df = stock_count_reports["missing"]
+            unexpected_df = stock_count_reports["unexpected"]
+            variance_df = stock_count_reports["variance"]
+            st.success(f"✅ Matched items: {len(matched_df)}")
+            st.warning(f"⚠️ Missing items: {len(missing_df)}")
+            st.error(f"❌ Unexpected items: {len(unexpected_df)}")
+            if not matched_df.empty:
                 st.write("✅ Present items:")
-                st.dataframe(clean_nans(df[df[barcode_col].map(clean_barcode).isin(matched)]), width='stretch')
-            if missing:
+                st.dataframe(clean_nans(matched_df.drop(columns=["PARTITION"])), width='stretch')
+            if not missing_df.empty:
                 st.write("❌ Missing items:")
-                st.dataframe(clean_nans(df[df[barcode_col].map(clean_barcode).isin(missing)]), width='stretch')
-            if unexpected:
+                st.dataframe(clean_nans(missing_df.drop(columns=["PARTITION"])), width='stretch')
+            if not variance_df.empty:
+                st.write("📊 Quantity variances (counted vs expected):")
+                st.dataframe(clean_nans(variance_df.drop(columns=["PARTITION"])), width='stretch')
+            if not unexpected_df.empty:
                 st.write("⚠️ Unexpected items (not in system):")
-                st.write(list(unexpected))
+                st.write(unexpected_df[barcode_col].tolist())
 
 with st.expander("🔍 Quick Stock Check (Scan Barcode)"):
-    st.write("Place your cursor below, scan a barcode, and instantly see product details!")
-    scanned_barcode = st.text_input("Scan Barcode", value="", key="stock_check_barcode_input")
+    stock_check_mode = st.radio("Check", ["One barcode", "A list of barcodes"], horizontal=True, key="stock_check_mode")
+    if stock_check_mode == "One barcode":
+        st.write("Place your cursor below, scan a barcode, and instantly see product details!")
+        scanned_barcode = st.text_input("Scan Barcode", value="", key="stock_check_barcode_input")
+    else:
+        scanned_barcode = ""
+        st.write("Scan or paste a tray of barcodes (one per line), or upload a list, and check them all at once.")
+        batch_text = st.text_area("Barcodes", key="stock_check_batch_text", height=150)
+        batch_file = st.file_uploader("Or upload a list (CSV, Excel or TXT)", type=["csv", "xlsx", "txt"], key="stock_check_batch_file")
+        batch_barcodes = read_barcode_list(batch_file, batch_text)
+        if batch_barcodes:
+            # Every code is resolved in one pass over the shared indexes, whatever the list length
+            with span("manager.quick_check_batch"):
+                batch_table, batch_positions = lookup_table(INVENTORY_FILE, df, batch_barcodes, snapshot=df_snapshot)
+            batch_found = int((batch_table["STATUS"] == "Found").sum())
+            st.markdown(f"**{batch_found} of {len(batch_table)} barcodes found**")
+            st.dataframe(batch_table, width='stretch', hide_index=True)
+            st.download_button(
+                label="Download Check (CSV)",
+                data=batch_table.to_csv(index=False).encode('utf-8'),
+                file_name="stock_check.csv",
+                mime="text/csv",
+                key="stock_check_batch_csv",
+            )
+            if batch_found and st.checkbox("Labels for the found products", key="stock_check_batch_labels"):
+                batch_mask = pd.Series(False, index=df.index)
+                batch_mask.iloc[batch_positions] = True
+                batch_labels = label_rows(df, batch_mask, barcode_col=barcode_col)
+                batch_layout_name = st.selectbox("Label stock", list(LABEL_LAYOUTS), index=list(LABEL_LAYOUTS).index(DEFAULT_LAYOUT), key="stock_check_label_layout")
+                batch_pdf_key = (tuple(batch_labels[barcode_col]), batch_layout_name)
+                if st.button(f"Create PDF of {len(batch_labels)} labels", key="stock_check_label_btn"):
+                    with span("manager.label_sheet"):
+                        batch_pdf, batch_failed = build_label_pdf(batch_labels, LABEL_LAYOUTS[batch_layout_name], barcode_col=barcode_col)
+                    st.session_state["stock_check_label_pdf"] = (batch_pdf_key, batch_pdf)
+                    if batch_failed:
+                        st.warning(f"⚠️ {len(batch_failed)} barcodes could not be encoded: {', '.join(batch_failed[:20])}")
+                if st.session_state.get("stock_check_label_pdf") and st.session_state["stock_check_label_pdf"][0] == batch_pdf_key:
+                    st.download_button(
+                        label="Download Labels (PDF)",
+                        data=st.session_state["stock_check_label_pdf"][1],
+                        file_name="stock_check_labels.pdf",
+                        mime="application/pdf",
+                        key="stock_check_label_download",
+                    )
     if scanned_barcode:
         cleaned_input = clean_barcode(scanned_barcode)
-        matches = df[df[barcode_col].map(clean_barcode) == cleaned_input]
+        with span("manager.quick_check_lookup"):
+            # Every row with this barcode, from the index built once per inventory version
+            barcode_positions = get_key_positions(INVENTORY_FILE, df_snapshot).get(barcode_col, {})
+            positions = barcode_positions.get(cleaned_input, [])
+            if not positions:
+                # Not a BARCODE: try the supplier barcode, stock code, FRAMENUM and POS keys
+                resolved, matched_on = resolve_barcode(INVENTORY_FILE, cleaned_input, df_snapshot)
+                if resolved is not None:
+                    st.info(f"{matched_on} {cleaned_input} matched barcode {resolved}.")
+                    positions = barcode_positions.get(resolved, [])
+            matches = df.iloc[positions]
         if not matches.empty:
             matches = force_all_columns_to_string(matches)
             st.success("✅ Product found:")
-            matches_display = matches.copy()
-            if "RRP" in matches_display.columns:
-                matches_display["RRP"] = matches_display["RRP"].apply(format_rrp)
+            matches_display = matches.copy(deep=False)
+            rrp_cents = get_price_cents(INVENTORY_FILE, "RRP", df_snapshot).iloc[positions] if "RRP" in matches.columns else None
+            if rrp_cents is not None:
+                matches_display["RRP"] = format_cents(rrp_cents).to_numpy()
             if "BARCODE" in matches_display.columns:
                 matches_display["BARCODE"] = matches_display["BARCODE"].map(clean_barcode)
             st.dataframe(clean_nans(matches_display), width='stretch')
             product = matches.iloc[0]
             barcode_value = clean_barcode(product[barcode_col])
             barcode_img_buffer = generate_barcode_image(barcode_value)
-            rrp = str(product.get("RRP", ""))
-            rrp_display = format_rrp(rrp)
+            rrp_display = format_cents_value(rrp_cents.iloc[0] if rrp_cents is not None else None)
             framecode = str(product.get("FRAMENUM", ""))
             model = str(product.get("MODEL", ""))
             manufact = str(product.get("MANUFACT", ""))
@@ -675,5 +1096,10 @@ with st.expander("🔍 Quick Stock Check (Scan Barcode)"):
             st.markdown(f'Available From: {availfrom}', unsafe_allow_html=True)
             st.markdown(f'Size: {size}', unsafe_allow_html=True)
             st.markdown('</div></div>', unsafe_allow_html=True)
+            st.markdown("**Frames like this one**")
+            render_similar_frames(st, INVENTORY_FILE, barcode_value, "quick_check_fit", df_snapshot)
         else:
             st.error("❌ Barcode not found in inventory.")
+
+perf.render_panel(st)
+perf.record("manager.rerun", time.perf_counter() - _rerun_start)
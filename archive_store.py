@@ -0,0 +1,202 @@
+import bisect
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from inventory_utils import clean_barcode, force_all_columns_to_string
+
+# The archive is an append-only JSON-lines log: one "archive" event per retired
+# product and one "restore" event when it goes back into inventory. Appending a
+# line never rewrites earlier entries, and the in-memory index below only reads
+# the bytes added since it last looked at the file.
+ARCHIVE_EVENT = "archive"
+RESTORE_EVENT = "restore"
+ARCHIVE_REASON_OPTIONS = ["RETIRED", "DELETED", "DAMAGED", "RETURNED TO SUPPLIER"]
+ARCHIVE_META_FIELDS = ["ARCHIVE_ID", "ARCHIVED_AT", "ARCHIVE_REASON"]
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _append_events(log_path, events):
+    lines = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class ArchiveIndex:
+    def __init__(self, log_path, legacy_path=None):
+        self.log_path = log_path
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # version changes whenever records or restored do, so views built from
+        # the archive can tell when they are stale
+        self.version = getattr(self, "version", 0) + 1
+        self._offset = 0
+        self._legacy_loaded = False
+        self.records = {}
+        self.restored = set()
+        self.by_barcode = {}
+        self.by_framenum = {}
+        # (ARCHIVED_AT, ARCHIVE_ID) kept sorted; log events are written in time order
+        self.by_date = []
+
+    def _add_record(self, record_id, archived_at, reason, row):
+        record = dict(row)
+        record["ARCHIVE_ID"] = record_id
+        record["ARCHIVED_AT"] = archived_at
+        record["ARCHIVE_REASON"] = reason
+        self.records[record_id] = record
+        self.version += 1
+        barcode_val = clean_barcode(record.get("BARCODE", ""))
+        framenum_val = clean_barcode(record.get("FRAMENUM", ""))
+        if barcode_val:
+            self.by_barcode.setdefault(barcode_val, []).append(record_id)
+        if framenum_val:
+            self.by_framenum.setdefault(framenum_val.upper(), []).append(record_id)
+        key = (archived_at, record_id)
+        if not self.by_date or key >= self.by_date[-1]:
+            self.by_date.append(key)
+        else:
+            bisect.insort(self.by_date, key)
+
+    def _load_legacy(self):
+        # The old archive workbook is read-only history; it is parsed once, and
+        # only when an archive query is actually made.
+        self._legacy_loaded = True
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        legacy_df = force_all_columns_to_string(pd.read_excel(self.legacy_path))
+        legacy_df.rename(columns={"FRAME NO.": "FRAMENUM"}, inplace=True)
+        for i, row in enumerate(legacy_df.to_dict("records")):
+            self._add_record(f"legacy-{i}", "", "LEGACY", row)
+
+    def _read_new_events(self):
+        if not os.path.exists(self.log_path):
+            if self._offset:
+                self._reset()
+            return
+        size = os.path.getsize(self.log_path)
+        if size < self._offset:
+            # Log was replaced or truncated; start again from scratch.
+            self._reset()
+        if size == self._offset:
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read(size - self._offset)
+        # Only consume complete lines so a write in progress is picked up next time.
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            return
+        self._offset += end + 1
+        for raw in chunk[:end].splitlines():
+            if not raw.strip():
+                continue
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                continue
+            if event.get("event") == ARCHIVE_EVENT:
+                self._add_record(event["id"], event.get("at", ""), event.get("reason", ""), event.get("row", {}))
+            elif event.get("event") == RESTORE_EVENT:
+                self.restored.add(event["id"])
+                self.version += 1
+
+    def refresh(self):
+        with self._lock:
+            # Events first: a replaced log resets the index, legacy records included
+            self._read_new_events()
+            if not self._legacy_loaded:
+                self._load_legacy()
+
+    def archive_row(self, row, reason="RETIRED"):
+        return self.archive_rows([row], reason=reason)[0]
+
+    def archive_rows(self, rows, reason="RETIRED"):
+        # Many rows still go out as a single append
+        now = _now()
+        events = []
+        for row in rows:
+            clean_row = {k: ("" if pd.isnull(v) else str(v)) for k, v in dict(row).items()}
+            events.append({
+                "event": ARCHIVE_EVENT,
+                "id": uuid.uuid4().hex,
+                "at": now,
+                "reason": reason,
+                "row": clean_row,
+            })
+        with self._lock:
+            _append_events(self.log_path, events)
+        return [event["id"] for event in events]
+
+    def mark_restored(self, record_id):
+        with self._lock:
+            _append_events(self.log_path, [{"event": RESTORE_EVENT, "id": record_id, "at": _now()}])
+
+    def get(self, record_id):
+        self.refresh()
+        return self.records.get(record_id)
+
+    def count(self):
+        self.refresh()
+        return len(self.records) - len(self.restored)
+
+    def query(self, barcode=None, framenum=None, date_from=None, date_to=None, limit=200):
+        self.refresh()
+        candidates = None
+        if barcode:
+            candidates = set(self.by_barcode.get(clean_barcode(barcode), []))
+        if framenum:
+            matches = set(self.by_framenum.get(clean_barcode(framenum).upper(), []))
+            candidates = matches if candidates is None else candidates & matches
+        if date_from or date_to:
+            lo = bisect.bisect_left(self.by_date, (str(date_from), "")) if date_from else 0
+            hi = bisect.bisect_right(self.by_date, (f"{date_to} 23:59:59", "~")) if date_to else len(self.by_date)
+            in_range = {rid for _, rid in self.by_date[lo:hi]}
+            candidates = in_range if candidates is None else candidates & in_range
+        if candidates is None:
+            ordered = [rid for _, rid in reversed(self.by_date)]
+        else:
+            ordered = sorted(candidates, key=lambda rid: (self.records[rid]["ARCHIVED_AT"], rid), reverse=True)
+        results = []
+        for rid in ordered:
+            if rid in self.restored:
+                continue
+            results.append(self.records[rid])
+            if limit and len(results) >= limit:
+                break
+        return results
+
+
+def records_to_frame(records, columns=None):
+    if not records:
+        return pd.DataFrame(columns=ARCHIVE_META_FIELDS + list(columns or []))
+    frame = pd.DataFrame(records)
+    ordered = ARCHIVE_META_FIELDS + [c for c in (columns or frame.columns) if c not in ARCHIVE_META_FIELDS]
+    return frame.reindex(columns=ordered).fillna("")
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_archive_index(log_path, legacy_path=None):
+    # One index per log file for the whole process, shared by every session.
+    key = os.path.abspath(log_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = ArchiveIndex(log_path, legacy_path)
+            _indexes[key] = index
+    return index
@@ -1,12 +1,55 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, render_template, request, jsonify, redirect, url_for, g
 import openpyxl
 import os
+import threading
+import time
+from collections import Counter
+import perf
+from warmup import start_warmup, status as warmup_status
 
 app = Flask(__name__)
 
+# Request counts and a latency histogram per route, always on (a dict update per
+# request) so /metrics works without INVENTORY_PERF. Each worker process keeps
+# its own; the pid label tells them apart.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+_request_counts = Counter()
+_latency_counts = Counter()
+_latency_sums = Counter()
+_metrics_lock = threading.Lock()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        with _metrics_lock:
+            _request_counts[(route, response.status_code)] += 1
+            _latency_sums[route] += elapsed
+            for bound in LATENCY_BUCKETS:
+                if elapsed <= bound:
+                    _latency_counts[(route, bound)] += 1
+            _latency_counts[(route, "+Inf")] += 1
+        if perf.is_enabled():
+            perf.record(f"server.{request.url_rule.rule if request.url_rule else request.path}", elapsed)
+    return response
+
+
+@app.route('/perf')
+def perf_stats():
+    return jsonify({"enabled": perf.is_enabled(), "spans": perf.stats()})
+
 EXCEL_PATH = 'inventory.xlsx'
 
-def get_inventory_headers(excel_path=EXCEL_PATH):
+def get_inventory_headers(excel_path=None):
+    excel_path = excel_path or EXCEL_PATH
     if not os.path.exists(excel_path):
         wb = openpyxl.Workbook()
         ws = wb.active
@@ -19,21 +62,88 @@ def get_inventory_headers(excel_path=EXCEL_PATH):
     headers = [cell.value for cell in next(ws.iter_rows(max_row=1))]
     return headers
 
-def find_product_by_barcode(barcode, excel_path=EXCEL_PATH):
-    wb = openpyxl.load_workbook(excel_path)
-    ws = wb.active
-    headers = [cell.value for cell in next(ws.iter_rows(max_row=1))]
-    barcode_column = None
-    for idx, header in enumerate(headers):
-        if str(header).lower() == "barcode":
-            barcode_column = idx
-            break
-    if barcode_column is None:
-        return None
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if str(row[barcode_column]).strip() == str(barcode).strip():
-            return dict(zip(headers, row))
-    return None
+_product_indexes = {}
+_product_index_lock = threading.Lock()
+# Set by serve_barcodes.py once it has loaded the index, before it forks
+preloaded = False
+
+def load_product_index(excel_path=None):
+    # Parsed once per file version; each request is then a dict lookup
+    excel_path = excel_path or EXCEL_PATH
+    if not os.path.exists(excel_path):
+        return {}
+    stat = os.stat(excel_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _product_index_lock:
+        cached = _product_indexes.get(excel_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        with perf.span("server.load_workbook"):
+            wb = openpyxl.load_workbook(excel_path, read_only=True)
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+        headers = list(next(rows, []))
+        barcode_column = None
+        for idx, header in enumerate(headers):
+            if str(header).lower() == "barcode":
+                barcode_column = idx
+                break
+        index = {}
+        if barcode_column is not None:
+            for row in rows:
+                if barcode_column < len(row):
+                    index.setdefault(str(row[barcode_column]).strip(), dict(zip(headers, row)))
+        wb.close()
+        _product_indexes[excel_path] = (signature, index)
+        return index
+
+def find_product_by_barcode(barcode, excel_path=None):
+    return load_product_index(excel_path).get(str(barcode).strip())
+
+@app.route('/ready')
+def ready():
+    state = warmup_status()
+    # serve_barcodes.py loads the index before forking and never starts warm-up.
+    # It may have found no workbook to load, so the cache can still be empty.
+    if not state["ready"] and preloaded:
+        state = dict(state, ready=True)
+    return jsonify(state), (200 if state["ready"] else 503)
+
+@app.route('/health')
+def health():
+    # Liveness: answers without touching the workbook
+    with _product_index_lock:
+        cached = _product_indexes.get(EXCEL_PATH)
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "products": len(cached[1]) if cached else 0,
+        "index_signature": list(cached[0]) if cached else None,
+    })
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format
+    pid = os.getpid()
+    lines = [
+        "# TYPE barcode_server_requests_total counter",
+    ]
+    with _metrics_lock:
+        counts = sorted(_request_counts.items())
+        buckets = dict(_latency_counts)
+        sums = dict(_latency_sums)
+        cached = _product_indexes.get(EXCEL_PATH)
+    for (route, status), count in counts:
+        lines.append(f'barcode_server_requests_total{{pid="{pid}",route="{route}",status="{status}"}} {count}')
+    lines.append("# TYPE barcode_server_request_seconds histogram")
+    for route in sorted(sums):
+        for bound in LATENCY_BUCKETS + ("+Inf",):
+            lines.append(f'barcode_server_request_seconds_bucket{{pid="{pid}",route="{route}",le="{bound}"}} {buckets.get((route, bound), 0)}')
+        lines.append(f'barcode_server_request_seconds_sum{{pid="{pid}",route="{route}"}} {sums[route]:.6f}')
+        lines.append(f'barcode_server_request_seconds_count{{pid="{pid}",route="{route}"}} {buckets.get((route, "+Inf"), 0)}')
+    lines.append("# TYPE barcode_server_products gauge")
+    lines.append(f'barcode_server_products{{pid="{pid}"}} {len(cached[1]) if cached else 0}')
+    return "\n".join(lines) + "\n", 200, {"Content-Type": "text/plain; version=0.0.4"}
 
 @app.route('/scan')
 def scan():
@@ -65,4 +175,5 @@ def add_product_page():
     """
 
 if __name__ == '__main__':
-    app.run(port=5001)
\ No newline at end of file
+    start_warmup([], extra_steps=[("product_index", load_product_index)])
+    app.run(port=5001)
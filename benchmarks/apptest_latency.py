@@ -0,0 +1,367 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from benchmarks.run import RESULTS_DIR, git_revision
+from benchmarks.synthetic import make_inventory, write_inventory
+
+# End-to-end rerun latency: drives the real pages with Streamlit's AppTest
+# through scripted sessions on synthetic inventories, and records the wall
+# time and peak Python memory of every interaction. Any interaction over its
+# latency budget (or raising in the app) fails the run with exit status 1:
+#
+#     python -m benchmarks.apptest_latency --sizes 1000 10000 --budget-ms 1500
+#     python -m benchmarks.apptest_latency --sizes 1000 --scale 0.1   # 50 scans, 5 adds
+#     python -m benchmarks.apptest_latency --sessions stocktake --step-budget "stocktake.first load=5000"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_BUDGET_MS = 1500.0
+# Left out of the scratch copy of the app so every run starts from empty logs
+IGNORED = shutil.ignore_patterns(
+    ".git", "Inventory", "results", "__pycache__", "stocktake_sessions", "reconciliation_reports",
+    "scanned_barcodes.csv", "unfound_barcodes.csv", "*.jsonl",
+)
+
+
+def _scan(barcode):
+    def step(at, ctx):
+        at.text_input(key="stocktake_scan_input").input(barcode(ctx))
+        at.button(key="FormSubmitter:stocktake_scan_form-Add Scanned Barcode").click()
+    return step
+
+
+def _nth_barcode(ctx):
+    # A different product for every repeat, wrapping round on small inventories
+    barcodes = ctx["inventory"]["BARCODE"]
+    return barcodes.iloc[ctx["repeat"] % len(barcodes)]
+
+
+def _barcode_list(ctx, count=20):
+    return "\n".join(ctx["inventory"]["BARCODE"].iloc[:count])
+
+
+def _button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def _add_product(at, ctx):
+    # Barcodes and framecodes the synthetic inventories never use
+    at.text_input(key="barcode_textinput").input(f"77{ctx['repeat']:08d}")
+    at.text_input(key="framecode").input(f"HRN{ctx['repeat']:06d}")
+    at.button(key="FormSubmitter:add_product_form-Add Product").click()
+
+
+def _search_text(ctx):
+    return str(ctx["inventory"]["FRAMENUM"].iloc[0])[:4]
+
+
+def _search_product(at, ctx):
+    at.text_input(key="product_search").input(_search_text(ctx))
+
+
+def _select_product(at, ctx):
+    # The picker's values are row keys (its options are their labels); pick the
+    # middle match of the search from the index the page itself is using
+    from lookup_index import get_prefix_index, search_products
+
+    matches = search_products(get_prefix_index(ctx["inventory_file"]), _search_text(ctx))
+    at.selectbox(key="selected_product").set_value(matches[len(matches) // 2])
+
+
+def _edit_product(at, ctx):
+    selected = at.selectbox(key="selected_product").value
+    at.text_input(key=f"edit_textinput_MODEL_{selected}").input("Harness edit")
+    _button(at, "Save Changes").click()
+
+
+def _delete_product(at, ctx):
+    _button(at, "Delete Product").click()
+
+
+def _confirm_delete(at, ctx):
+    at.button(key="confirm_delete_btn").click()
+
+
+def _bulk_filter(at, ctx):
+    at.selectbox(key="bulk_filter_MANUFACT").select(ctx["inventory"]["MANUFACT"].iloc[0])
+
+
+def _bulk_search_edit(at, ctx):
+    at.text_input(key="bulk_filter_framenum_prefix").input(ctx["inventory"]["FRAMENUM"].iloc[0][:4])
+
+
+def _label_list(at, ctx):
+    at.text_area(key="label_barcode_text").input(_barcode_list(ctx))
+
+
+def _label_pdf(at, ctx):
+    at.button(key="label_build_btn").click()
+
+
+def _duplicates_exact(at, ctx):
+    at.checkbox(key="duplicates_normalize").uncheck()
+
+
+def _quick_check(at, ctx):
+    at.text_input(key="stock_check_barcode_input").input(ctx["inventory"]["FRAMENUM"].iloc[3])
+
+
+def _quick_check_list_mode(at, ctx):
+    at.radio(key="stock_check_mode").set_value("A list of barcodes")
+
+
+def _quick_check_list(at, ctx):
+    at.text_area(key="stock_check_batch_text").input(_barcode_list(ctx))
+
+
+def _show_missing(at, ctx):
+    next(box for box in at.checkbox if box.label.startswith("Show missing products")).check()
+
+
+def _similar_frames(at, ctx):
+    at.text_input(key="stocktake_fit_barcode").input(ctx["inventory"]["BARCODE"].iloc[0])
+
+
+def _empty_table(at, ctx):
+    at.button(key="empty_scanned_btn").click()
+
+
+def _seal_and_empty(at, ctx):
+    at.button(key="confirm_empty_scanned_btn").click()
+
+
+def _history_by_manufact(at, ctx):
+    at.selectbox(key="history_by").select("MANUFACT")
+
+
+def _group_by(field):
+    def step(at, ctx):
+        at.selectbox(key="valuation_group_field").select(field)
+    return step
+
+
+# (name, action before the rerun[, repeat]); the first step of every session is
+# the cold load. A step with a repeat runs ctx["repeats"][repeat] times, with
+# ctx["repeat"] counting up. AppTest renders collapsed expanders too, so each
+# expander is "opened" by using its main control; file uploads are not scripted.
+SESSIONS = {
+    "manager": ("Inventory_Manager.py", [
+        ("first load", None),
+        ("rerun", None),
+        ("add product", _add_product, "adds"),
+        ("search product", _search_product),
+        ("select product", _select_product),
+        ("edit product", _edit_product),
+        ("search product again", _search_product),
+        ("select product again", _select_product),
+        ("delete product", _delete_product),
+        ("confirm delete", _confirm_delete),
+        ("bulk filter", _bulk_filter),
+        ("bulk framenum prefix", _bulk_search_edit),
+        ("labels for a list", _label_list),
+        ("label PDF", _label_pdf),
+        ("duplicates exact match", _duplicates_exact),
+        ("quick check", _quick_check),
+        ("quick check list mode", _quick_check_list_mode),
+        ("quick check a list", _quick_check_list),
+        ("rerun after edits", None),
+    ]),
+    "stocktake": ("pages/Stocktake.py", [
+        ("first load", None),
+        ("scan", _scan(_nth_barcode), "scans"),
+        ("scan unknown", _scan(lambda ctx: "900000001")),
+        ("show missing", _show_missing),
+        ("scan with missing shown", _scan(lambda ctx: ctx["inventory"]["BARCODE"].iloc[-1])),
+        ("frames like this one", _similar_frames),
+        ("empty table", _empty_table),
+        ("seal and empty", _seal_and_empty),
+        ("history by MANUFACT", _history_by_manufact),
+        ("rerun", None),
+    ]),
+    "valuation": ("pages/Stock_Valuation.py", [
+        ("first load", None),
+        ("group by MANUFACT", _group_by("MANUFACT")),
+        ("group by FRAMETYPE", _group_by("FRAMETYPE")),
+        ("rerun", None),
+    ]),
+}
+# Full-size counts of the repeated steps; --scale shrinks or grows them
+REPEATS = {"scans": 500, "adds": 50}
+# Saving, the change feed and the write-behind rewrite, timed from inside the
+# app (perf.py spans) because they run below the page or on another thread
+WRITE_SPANS = ["manager.save_inventory", "change_feed.commit", "write_behind.write", "stocktake.seal_snapshot"]
+
+
+def make_workspace(tmpdir, rows, seed):
+    # A copy of the app whose Inventory/ folder holds one synthetic file
+    workspace = os.path.join(tmpdir, f"app_{rows}")
+    shutil.copytree(REPO_ROOT, workspace, ignore=IGNORED)
+    os.makedirs(os.path.join(workspace, "Inventory"))
+    inventory = make_inventory(rows, seed=seed)
+    write_inventory(inventory, os.path.join(workspace, "Inventory", f"synthetic_{rows}.csv"))
+    return workspace, inventory
+
+
+def run_session(workspace, session, ctx, timeout, track_memory):
+    from streamlit.testing.v1 import AppTest
+
+    import perf
+    from write_behind import get_write_behind
+
+    script, steps = SESSIONS[session]
+    at = AppTest.from_file(os.path.join(workspace, script), default_timeout=timeout)
+    was_enabled = perf.is_enabled()
+    perf.set_enabled(True)
+    perf.reset()
+    results = []
+    for name, action, *repeat in steps:
+        times, peak, error = [], 0, None
+        for i in range(ctx["repeats"][repeat[0]] if repeat else 1):
+            ctx["repeat"] = i
+            if action is not None:
+                try:
+                    action(at, ctx)
+                except Exception as e:  # the widget the step needs is not on the page
+                    error = f"{type(e).__name__}: {e}"
+            if track_memory:
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            if error is None:
+                at.run()
+            times.append(time.perf_counter() - start)
+            if track_memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if error is None and len(at.exception):
+                error = at.exception[0].message
+            if error is not None:
+                break
+        results.append(_result(session, name, times, peak / 2 ** 20 if track_memory else None, error))
+
+    # Saves still queued for the background writer are written now, so every
+    # session that saved reports the cost of the rewrite as well
+    start = time.perf_counter()
+    if get_write_behind(ctx["inventory_file"]).flush():
+        results.append(_result(session, "flush queued saves", [time.perf_counter() - start], None, None))
+    for row in perf.stats():
+        if row["span"] in WRITE_SPANS:
+            results.append({
+                "session": session, "step": f"span {row['span']}", "ms": row["max_ms"], "median_ms": row["p50_ms"],
+                "repeats": row["count"], "peak_mb": None, "error": None,
+            })
+    perf.set_enabled(was_enabled)
+    return results
+
+
+def _result(session, step, times, peak_mb, error):
+    # A repeated step is judged by its slowest run; the median shows the typical one
+    return {
+        "session": session,
+        "step": step,
+        "ms": round(max(times) * 1000, 2),
+        "median_ms": round(statistics.median(times) * 1000, 2),
+        "repeats": len(times),
+        "peak_mb": round(peak_mb, 2) if peak_mb is not None else None,
+        "error": error,
+    }
+
+
+def parse_step_budgets(values):
+    budgets = {}
+    for value in values or []:
+        name, _, ms = value.rpartition("=")
+        budgets[name] = float(ms)
+    return budgets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every interaction of scripted app sessions with AppTest.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--sessions", nargs="+", default=list(SESSIONS), choices=list(SESSIONS))
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Latency budget per interaction")
+    parser.add_argument("--step-budget", action="append", metavar="SESSION.STEP=MS",
+                        help='Budget for one step, e.g. "stocktake.first load=5000" (repeatable)')
+    parser.add_argument("--timeout", type=float, default=120, help="AppTest timeout per rerun, in seconds")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (it slows every rerun down)")
+    parser.add_argument("--scans", type=int, default=REPEATS["scans"], help="Barcodes scanned in the stocktake session")
+    parser.add_argument("--adds", type=int, default=REPEATS["adds"], help="Products added in the manager session")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiplies --scans and --adds, e.g. 0.1 for a quick run (at least one of each)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results path (default: benchmarks/results/apptest-<timestamp>.json)")
+    args = parser.parse_args(argv)
+    step_budgets = parse_step_budgets(args.step_budget)
+    track_memory = not args.no_memory
+    repeats = {"scans": max(1, round(args.scans * args.scale)), "adds": max(1, round(args.adds * args.scale))}
+    # Write-path spans are collected in memory; their per-sample log lines are not wanted here
+    os.environ.setdefault("INVENTORY_PERF_LOG", os.devnull)
+
+    results = []
+    if track_memory:
+        tracemalloc.start()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in args.sizes:
+            workspace, inventory = make_workspace(tmpdir, rows, args.seed)
+            ctx = {
+                "inventory": inventory,
+                "inventory_file": os.path.join(workspace, "Inventory", f"synthetic_{rows}.csv"),
+                "repeats": repeats,
+            }
+            print(f"{rows} rows:")
+            for session in args.sessions:
+                for result in run_session(workspace, session, ctx, args.timeout, track_memory):
+                    key = f"{result['session']}.{result['step']}"
+                    result["rows"] = rows
+                    result["budget_ms"] = step_budgets.get(key, args.budget_ms)
+                    result["over_budget"] = result["ms"] > result["budget_ms"]
+                    results.append(result)
+                    memory = f"  peak {result['peak_mb']:8.1f} MB" if result["peak_mb"] is not None else ""
+                    flag = "  <-- over budget" if result["over_budget"] else ""
+                    flag += f"  <-- {result['error']}" if result["error"] else ""
+                    typical = f"  x{result['repeats']}, median {result['median_ms']:.1f} ms" if result["repeats"] > 1 else ""
+                    print(f"  {key:<40} {result['ms']:10.1f} ms{typical}{memory}{flag}")
+    if track_memory:
+        tracemalloc.stop()
+
+    payload = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeats": repeats,
+            "budget_ms": args.budget_ms,
+            "step_budgets": step_budgets,
+            "memory_tracked": track_memory,
+        },
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"apptest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    failures = [r for r in results if r["over_budget"] or r["error"]]
+    if failures:
+        print(f"{len(failures)} interactions failed or went over budget "
+              f"(median {statistics.median(r['ms'] for r in failures):.0f} ms)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+from benchmarks.run import RESULTS_DIR, git_revision
+
+# Load test for the barcode server's /save_barcode route at rising concurrency.
+# Each client thread keeps one HTTP/1.1 connection open and posts barcodes
+# sampled from the product workbook (plus a share of unknown ones):
+#
+#     python serve_barcodes.py --workers 4 &
+#     python -m benchmarks.load_test --url http://localhost:5001 --concurrency 1 4 16 64
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16, 32]
+
+
+def sample_barcodes(excel_path, limit=5000):
+    if not excel_path or not os.path.exists(excel_path):
+        return []
+    import openpyxl
+    wb = openpyxl.load_workbook(excel_path, read_only=True)
+    rows = wb.active.iter_rows(values_only=True)
+    headers = [str(h).lower() for h in next(rows, [])]
+    barcodes = []
+    if "barcode" in headers:
+        col = headers.index("barcode")
+        for row in rows:
+            if col < len(row) and row[col] is not None:
+                barcodes.append(str(row[col]).strip())
+            if len(barcodes) >= limit:
+                break
+    wb.close()
+    return barcodes
+
+
+def _client(url, barcodes, unknown_rate, deadline, latencies, errors, seed):
+    rng = random.Random(seed)
+    parsed = urlparse(url)
+    conn = None
+    while time.perf_counter() < deadline:
+        if rng.random() < unknown_rate or not barcodes:
+            barcode = f"LOADTEST{rng.randint(0, 10 ** 9)}"
+        else:
+            barcode = rng.choice(barcodes)
+        body = json.dumps({"barcode": barcode})
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=10)
+            conn.request("POST", "/save_barcode", body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+            latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            if conn is not None:
+                conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def run_level(url, concurrency, duration, barcodes, unknown_rate, seed):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=_client, args=(url, barcodes, unknown_rate, deadline, latencies, errors, seed + i))
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000 if ordered else 0.0
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "req_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": pct(50),
+        "p99_ms": pct(99),
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test /save_barcode at rising concurrency.")
+    parser.add_argument("--url", default="http://localhost:5001")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--excel", default="inventory.xlsx", help="Workbook to sample barcodes from")
+    parser.add_argument("--unknown-rate", type=float, default=0.05, help="Share of barcodes that are not in the workbook")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    barcodes = sample_barcodes(args.excel)
+    print(f"{len(barcodes)} barcodes sampled from {args.excel}; {args.duration:.0f}s per level against {args.url}")
+    print(f"  {'clients':>7}  {'requests':>8}  {'errors':>6}  {'req/s':>9}  {'p50 ms':>8}  {'p99 ms':>8}")
+    results = []
+    for level in args.concurrency:
+        result = run_level(args.url, level, args.duration, barcodes, args.unknown_rate, args.seed)
+        results.append(result)
+        print(
+            f"  {level:>7}  {result['requests']:>8}  {result['errors']:>6}  {result['req_per_s']:>9.1f}"
+            f"  {result['p50_ms']:>8.2f}  {result['p99_ms']:>8.2f}"
+        )
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"load-{stamp}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "url": args.url,
+                "git": git_revision(),
+                "duration_s": args.duration,
+                "unknown_rate": args.unknown_rate,
+                "results": results,
+            }, f, indent=2)
+        print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
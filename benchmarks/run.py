@@ -0,0 +1,153 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from inventory_utils import (
+    clean_barcode, read_inventory_file, generate_unique_barcode, generate_framecode,
+)
+from stocktake_utils import (
+    normalize_stocktake_inventory, ScannedIndex, build_scanned_table, format_inventory_table,
+)
+from benchmarks.synthetic import make_inventory, make_scan_log, write_inventory
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+# openpyxl writes/reads 100k x 104 workbooks in minutes, so xlsx cases stop here
+XLSX_MAX_ROWS = 10000
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def time_call(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return ""
+
+
+def benchmark_size(rows, scans, repeat, seed, tmpdir, formats):
+    results = []
+
+    def record(name, fn, n_repeat=repeat):
+        timings = time_call(fn, n_repeat)
+        results.append({
+            "name": name,
+            "rows": rows,
+            "repeat": n_repeat,
+            "min_s": min(timings),
+            "median_s": statistics.median(timings),
+            "mean_s": statistics.fmean(timings),
+        })
+        print(f"  {name:<32} {rows:>7} rows  median {statistics.median(timings) * 1000:10.2f} ms")
+
+    raw = make_inventory(rows, seed=seed)
+    scan_log = make_scan_log(raw, scans, seed=seed)
+
+    for fmt in formats:
+        if fmt == "xlsx" and rows > XLSX_MAX_ROWS:
+            continue
+        path = write_inventory(raw, os.path.join(tmpdir, f"inventory_{rows}.{fmt}"))
+        record(f"load_inventory[{fmt}]", lambda: read_inventory_file(path), 1 if fmt == "xlsx" else repeat)
+
+    df = read_inventory_file(os.path.join(tmpdir, f"inventory_{rows}.csv")) if "csv" in formats else raw.copy()
+    record("clean_barcode[column]", lambda: raw["BARCODE"].map(clean_barcode))
+    record("generate_unique_barcode", lambda: generate_unique_barcode(df))
+    record("generate_framecode", lambda: generate_framecode("LUXOTTICA", df))
+
+    stock_df = normalize_stocktake_inventory(df.copy())
+    known = [b for b in scan_log if b in set(stock_df["BARCODE"])]
+    next_scan = known[-1] if known else stock_df["BARCODE"].iloc[0]
+    # A scan against the session's index of the earlier scans, as the page does it
+    scanned_index = ScannedIndex(stock_df).extend(scan_log)
+
+    def stocktake_scan():
+        scanned_index.find_duplicate(next_scan)
+        scanned_index.add(next_scan)
+
+    record("stocktake_scan", stocktake_scan)
+    record("scanned_table_build", lambda: build_scanned_table(stock_df, scan_log), max(1, repeat // 2))
+
+    def export_csv():
+        format_inventory_table(stock_df).to_csv(index=False).encode("utf-8")
+
+    def export_xlsx():
+        buffer = io.BytesIO()
+        format_inventory_table(stock_df).to_excel(buffer, index=False)
+
+    record("export_csv", export_csv, max(1, repeat // 2))
+    if rows <= XLSX_MAX_ROWS:
+        record("export_xlsx", export_xlsx, 1)
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["name"], r["rows"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        old = baseline.get((r["name"], r["rows"]))
+        if old and old["median_s"] > 0:
+            ratio = r["median_s"] / old["median_s"]
+            flag = "  <-- slower" if ratio > 1.2 else ""
+            print(f"  {r['name']:<32} {r['rows']:>7} rows  x{ratio:5.2f}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time inventory hot paths on synthetic 104-column inventories.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--scans", type=int, default=500, help="Barcodes in the synthetic scan log")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx"], choices=["csv", "xlsx"])
+    parser.add_argument("--output", help="JSON results path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in args.sizes:
+            print(f"{rows} rows:")
+            results.extend(benchmark_size(rows, args.scans, args.repeat, args.seed, tmpdir, args.formats))
+
+    payload = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "scans": args.scans,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
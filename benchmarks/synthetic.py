@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from stocktake_utils import VISIBLE_FIELDS
+
+REFERENCE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Inventory", "12.11stockdownload.csv")
+
+# Cardinalities loosely follow the clinic's 12.11 POS download: one location,
+# ~60 manufacturers, a handful of suppliers, mostly single quantities and
+# "$149.00"-style prices.
+MANUFACTURERS = [f"BRAND{i:02d}" for i in range(56)] + ["CLARITY", "SENSES", "STEPPER", "Apollo"]
+SUPPLIERS = ["OPTIQUE LINE", "LUXOTTICA", "SAFILO", "MARCOLIN", "DE RIGO", "CLARITY EYEWEAR"]
+LOCATIONS = ["OPT"]
+FRAMETYPES = ["MEN", "WOMEN", "UNISEX", "KIDS"]
+FCOLOURS = [f"C{i}" for i in range(1, 10)] + ["C", "BLK", "TORT", "GOLD"]
+RRP_VALUES = [80, 99, 120, 149, 169, 199, 229, 249, 289, 310, 349, 399]
+TAXPC_VALUES = ["10", "GST 10%"]
+FRSTATUS_VALUES = ["PO", "PRACTICE OWNED", "CO", "CONSIGNMENT OWNED"]
+AVAILFROM_VALUES = ["/  /", "11/11/2025", "28/10/2025", "29/10/2025", "31/10/2025", "03/11/2025"]
+
+
+def reference_header():
+    if os.path.exists(REFERENCE_FILE):
+        with open(REFERENCE_FILE, encoding="utf-8") as f:
+            return f.readline().strip().split(",")
+    return list(VISIBLE_FIELDS)
+
+
+def _choice(rng, values, n, p=None):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=n, p=p)]
+
+
+def make_inventory(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    header = reference_header()
+    data = {col: np.full(rows, "", dtype=object) for col in header}
+
+    # Keep the 1..15000 barcode pool partly free so generate_unique_barcode terminates
+    barcode_pool = max(15000, rows * 2)
+    data["BARCODE"] = rng.choice(np.arange(1, barcode_pool + 1), size=rows, replace=False).astype(str)
+    data["LOCATION"] = _choice(rng, LOCATIONS, rows)
+    data["PKEY"] = (78541 + np.arange(rows)).astype(str)
+    suppliers = _choice(rng, SUPPLIERS, rows)
+    prefixes = pd.Series(suppliers).str[:3].str.upper()
+    seq = prefixes.groupby(prefixes).cumcount() + 1
+    data["FRAMENUM"] = (prefixes + seq.map(lambda n: f"{n:06d}")).to_numpy(dtype=object)
+    data["QUANTITY"] = _choice(rng, ["1", "2", "3", "5", "0"], rows, p=[0.86, 0.08, 0.03, 0.01, 0.02])
+    data["MANUFACT"] = _choice(rng, MANUFACTURERS, rows)
+    data["MODEL"] = rng.integers(100, 10000, size=rows).astype(str)
+    data["FCOLOUR"] = _choice(rng, FCOLOURS, rows)
+    data["SIZE"] = np.char.add(np.char.add(rng.integers(46, 62, size=rows).astype(str), "-"),
+                               rng.integers(14, 22, size=rows).astype(str)).astype(object)
+    data["SUPPLIER"] = suppliers
+    data["FRAMETYPE"] = _choice(rng, FRAMETYPES, rows)
+    data["TEMPLE"] = _choice(rng, ["130", "135", "140", "145", "150"], rows)
+    data["DEPTH"] = rng.integers(28, 48, size=rows).astype(str)
+    data["DIAG"] = rng.integers(48, 62, size=rows).astype(str)
+    data["BASECURVE"] = _choice(rng, ["", "0"], rows, p=[0.9, 0.1])
+    rrp = _choice(rng, RRP_VALUES, rows).astype(float)
+    data["RRP"] = np.array([f"${v:.2f}" for v in rrp], dtype=object)
+    cost = np.round(rrp * rng.uniform(0.2, 0.5, size=rows), 2)
+    data["EXCOSTPR"] = np.array([f"{v:g}" for v in cost], dtype=object)
+    if "COSTPRICE" in data:
+        data["COSTPRICE"] = np.array([f"${v * 1.1:.2f}" for v in cost], dtype=object)
+    data["TAXPC"] = _choice(rng, TAXPC_VALUES, rows, p=[0.7, 0.3])
+    data["FRSTATUS"] = _choice(rng, FRSTATUS_VALUES, rows, p=[0.6, 0.27, 0.1, 0.03])
+    data["AVAILFROM"] = _choice(rng, AVAILFROM_VALUES, rows, p=[0.7, 0.12, 0.05, 0.05, 0.05, 0.03])
+    for date_col in ("LASTSALE", "FIRSTPUR", "LASTPUR"):
+        if date_col in data:
+            data[date_col] = _choice(rng, AVAILFROM_VALUES, rows)
+    data["UUID"] = np.array([f"{v:032x}" for v in rng.integers(0, 2**63, size=rows)], dtype=object)
+    data["NOTE"] = _choice(rng, ["", "0"], rows, p=[0.88, 0.12])
+    return pd.DataFrame(data, columns=header)
+
+
+def make_scan_log(inventory, scans, seed=0, unknown_rate=0.02, repeat_rate=0.05):
+    # Mostly distinct inventory barcodes, with some repeat scans and unknown codes
+    rng = np.random.default_rng(seed + 1)
+    barcodes = inventory["BARCODE"].astype(str).to_numpy()
+    picks = list(rng.choice(barcodes, size=min(scans, len(barcodes)), replace=False))
+    log = []
+    for b in picks[:scans]:
+        roll = rng.random()
+        if roll < unknown_rate:
+            log.append(str(900000000 + int(rng.integers(0, 99999))))
+        elif roll < unknown_rate + repeat_rate and log:
+            log.append(log[int(rng.integers(0, len(log)))])
+        else:
+            log.append(str(b))
+    return log
+
+
+def write_inventory(inventory, path):
+    if path.lower().endswith(".xlsx"):
+        inventory.to_excel(path, index=False)
+    else:
+        inventory.to_csv(path, index=False)
+    return path
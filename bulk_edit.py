@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from inventory_utils import clean_barcode
+from money import to_cents, format_cents
+
+BULK_FILTER_FIELDS = ["SUPPLIER", "MANUFACT", "LOCATION"]
+BULK_OPERATIONS = ["Set field", "Percent price change", "Relocate", "Delete"]
+PRICE_FIELDS = ["RRP", "EXLISTPR", "LISTPRICE", "EXCOSTPR", "COSTPRICE", "COST PRICE", "AVGCOST", "EXAVGCOST"]
+LOCATION_FIELDS = ["LOCATION", "LOCATION2", "LOCATION3"]
+# Identifiers must stay unique, so they can't be set to one value across many rows
+UNIQUE_FIELDS = ["BARCODE", "FRAMENUM"]
+
+
+def read_barcode_list(uploaded_file=None, text=""):
+    values = []
+    if uploaded_file is not None:
+        name = uploaded_file.name.lower()
+        if name.endswith(".xlsx"):
+            listing = pd.read_excel(uploaded_file, dtype=str)
+        elif name.endswith(".csv"):
+            listing = pd.read_csv(uploaded_file, dtype=str)
+        else:
+            listing = pd.read_csv(uploaded_file, dtype=str, header=None, names=["barcode"])
+        barcode_cols = [c for c in listing.columns if "barcode" in str(c).lower()]
+        column = barcode_cols[0] if barcode_cols else listing.columns[0]
+        values.extend(listing[column].dropna().tolist())
+    if text:
+        values.extend(text.replace(",", "\n").splitlines())
+    cleaned = [clean_barcode(v) for v in values]
+    return list(dict.fromkeys(v for v in cleaned if v))
+
+
+def select_rows(df, filters=None, framenum_prefix="", barcodes=None, barcode_col="BARCODE", framecode_col="FRAMENUM",
+                price_range=None, price_cents=None):
+    # price_range: (field, min_cents, max_cents); either bound may be None.
+    # price_cents: that field already in cents and aligned with df
+    # (inventory_utils.get_price_cents), so it is not parsed again here
+    mask = pd.Series(True, index=df.index)
+    for field, value in (filters or {}).items():
+        if value and field in df.columns:
+            mask &= df[field].fillna("").astype(str).str.strip().str.upper() == str(value).strip().upper()
+    if framenum_prefix and framecode_col in df.columns:
+        mask &= df[framecode_col].fillna("").astype(str).str.upper().str.startswith(framenum_prefix.strip().upper())
+    if barcodes:
+        mask &= df[barcode_col].isin(set(barcodes))
+    if price_range and price_range[0] in df.columns and (price_range[1] is not None or price_range[2] is not None):
+        field, low, high = price_range
+        cents = to_cents(df[field]) if price_cents is None else price_cents
+        in_range = cents.notna()
+        if low is not None:
+            in_range &= cents >= low
+        if high is not None:
+            in_range &= cents <= high
+        mask &= in_range.fillna(False).astype(bool)
+    return mask
+
+
+def apply_bulk_operation(df, mask, operation, field=None, value=None):
+    # Returns (updated_df, removed_rows, errors). Nothing is changed unless the
+    # whole batch validates, so a bad row never leaves a half-applied edit.
+    errors = []
+    selected = df.index[mask]
+    if len(selected) == 0:
+        return df, df.iloc[0:0], ["No products match the selection."]
+
+    if operation == "Delete":
+        return df.drop(selected).reset_index(drop=True), df.loc[selected], []
+
+    updated = df.copy()
+    if operation == "Set field":
+        if field not in df.columns:
+            return df, df.iloc[0:0], [f"Unknown field '{field}'."]
+        if field in UNIQUE_FIELDS and len(selected) > 1:
+            return df, df.iloc[0:0], [f"{field} must be unique and can't be set on {len(selected)} products at once."]
+        new_value = "" if value is None else str(value)
+        if field == "QUANTITY" and not new_value.isdigit():
+            return df, df.iloc[0:0], ["QUANTITY must be a whole number of 0 or more."]
+        if field in PRICE_FIELDS and to_cents([new_value]).isna().iloc[0]:
+            return df, df.iloc[0:0], [f"{field} must be a price."]
+        if field in UNIQUE_FIELDS:
+            new_value = clean_barcode(new_value)
+            others = df.index.difference(selected)
+            if new_value in set(df.loc[others, field].map(clean_barcode)):
+                return df, df.iloc[0:0], [f"Another product already uses {field} '{new_value}'."]
+        updated.loc[selected, field] = new_value
+
+    elif operation == "Percent price change":
+        if field not in df.columns:
+            return df, df.iloc[0:0], [f"Unknown field '{field}'."]
+        try:
+            pct = float(value)
+        except (TypeError, ValueError):
+            return df, df.iloc[0:0], ["Percent change must be a number."]
+        current = df.loc[selected, field].fillna("").astype(str)
+        cents = to_cents(current)
+        bad = cents.isna() & current.str.strip().ne("")
+        if bad.any():
+            bad_codes = df.loc[bad[bad].index, "BARCODE"].tolist()[:10]
+            errors.append(f"{int(bad.sum())} products have an unreadable {field}: {', '.join(bad_codes)}")
+            return df, df.iloc[0:0], errors
+        new_cents = (cents.astype("Float64") * (1 + pct / 100.0)).round().astype("Int64")
+        if (new_cents < 0).any():
+            return df, df.iloc[0:0], ["Percent change would make some prices negative."]
+        formatted = format_cents(new_cents, symbol="", blank="")
+        had_dollar = current.str.strip().str.startswith("$")
+        updated.loc[selected, field] = np.where(had_dollar & formatted.ne(""), "$" + formatted, formatted)
+
+    elif operation == "Relocate":
+        locations = value or {}
+        if not any(locations.values()):
+            return df, df.iloc[0:0], ["Enter at least one location."]
+        for loc_field, loc_value in locations.items():
+            if loc_value and loc_field in df.columns:
+                updated.loc[selected, loc_field] = str(loc_value).strip()
+    else:
+        return df, df.iloc[0:0], [f"Unknown operation '{operation}'."]
+
+    if "Timestamp" in updated.columns:
+        updated.loc[selected, "Timestamp"] = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+    return updated, df.iloc[0:0], errors
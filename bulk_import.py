@@ -0,0 +1,149 @@
+import random
+from datetime import datetime
+
+import pandas as pd
+
+from inventory_utils import clean_barcode, force_all_columns_to_string
+
+# Supplier files use the longer POS export headers; each group lists the names
+# one column can arrive under. The first name that exists in the inventory wins.
+HEADER_ALIASES = [
+    ["BARCODE", "BAR CODE", "EAN"],
+    ["FRAMENUM", "FRAME NO.", "FRAME NO", "FRAMECODE"],
+    ["FRAMEGROUP", "F GROUP"],
+    ["COSTPRICE", "COST PRICE"],
+    ["LISTPRICE", "LIST PRICE"],
+    ["MANUFACT", "MANUFACTURER"],
+    ["FCOLOUR", "F COLOUR", "COLOUR", "COLOR"],
+    ["LOCATION2", "LOCATION 2"],
+    ["REORDQTY", "REORDER QTY"],
+    ["REORDDATE", "REORDATE"],
+    ["QTYONORDER", "QTY ON ORDER"],
+    ["QTYONAPPRO", "QTY ON APPRO"],
+    ["AVAILFROM", "AVAIL FROM"],
+    ["AVAILTILL", "AVAIL TILL"],
+    ["SRVCHARGE", "SRV CHARGE"],
+    ["SUPSTATUS", "SUP STATUS"],
+    ["PSCREATED", "PS CREATED"],
+    ["PSUPDATEAT", "PS UPDATE AT"],
+]
+IMPORT_STATUS_OK = "OK"
+BARCODE_RANGE_MAX = 15000
+
+
+def read_import_file(uploaded_file):
+    if uploaded_file.name.lower().endswith(".xlsx"):
+        incoming = pd.read_excel(uploaded_file, dtype=str)
+    else:
+        incoming = pd.read_csv(uploaded_file, dtype=str)
+    incoming.columns = [str(c).strip() for c in incoming.columns]
+    return incoming.fillna("")
+
+
+def map_import_headers(import_columns, inventory_columns):
+    # Returns ({source header: inventory column}, [unmapped source headers])
+    inventory_lookup = {c.upper(): c for c in inventory_columns}
+    mapping = {}
+    unmapped = []
+    for source in import_columns:
+        key = source.strip().upper()
+        target = inventory_lookup.get(key)
+        if target is None:
+            for group in HEADER_ALIASES:
+                if key in group:
+                    target = next((inventory_lookup[name] for name in group if name in inventory_lookup), None)
+                    break
+        if target is None or target in mapping.values():
+            unmapped.append(source)
+        else:
+            mapping[source] = target
+    return mapping, unmapped
+
+
+def allocate_barcodes(count, used_barcodes, rng=None):
+    # Draw unused numbers from the same 1..15000 pool generate_unique_barcode
+    # uses, moving past it only once the pool is exhausted.
+    rng = rng or random
+    used = {int(b) for b in used_barcodes if str(b).isdigit()}
+    pool = [n for n in range(1, BARCODE_RANGE_MAX + 1) if n not in used]
+    if len(pool) >= count:
+        picked = rng.sample(pool, count)
+    else:
+        start = max(used | {BARCODE_RANGE_MAX}) + 1
+        picked = pool + list(range(start, start + count - len(pool)))
+    return [str(n) for n in picked]
+
+
+def allocate_framecodes(suppliers, existing_framecodes):
+    # Next free {PREFIX}{000001} per supplier, continuing after the highest in use.
+    # The prefix is supplier[:3], so it can be shorter than three characters;
+    # codes are matched on it the way inventory_utils.generate_framecode does.
+    suppliers = pd.Series(suppliers, dtype=object).fillna("").astype(str)
+    prefixes = suppliers.str[:3].str.upper()
+    existing = pd.Series(list(existing_framecodes), dtype=object).fillna("").astype(str)
+    max_by_prefix = {}
+    for prefix in prefixes.unique():
+        matching = existing[existing.str.startswith(prefix)]
+        nums = matching.str[len(prefix):].str.extract(r'(\d{6})')[0].dropna()
+        max_by_prefix[prefix] = int(nums.astype(int).max()) if not nums.empty else 0
+    start = prefixes.map(max_by_prefix).astype(int)
+    offsets = prefixes.groupby(prefixes).cumcount() + 1
+    numbers = start + offsets
+    return (prefixes + numbers.map(lambda n: f"{n:06d}")).tolist()
+
+
+def prepare_import(incoming, df, barcode_col="BARCODE", framecode_col="FRAMENUM",
+                   auto_barcode=True, auto_framecode=True):
+    # Maps, fills and validates a supplier delivery. Returns (preview, mapping, unmapped)
+    # where preview has every inventory column plus IMPORT_STATUS.
+    mapping, unmapped = map_import_headers(list(incoming.columns), list(df.columns))
+    mapped = incoming[list(mapping)].rename(columns=mapping)
+    preview = mapped.reindex(columns=list(df.columns)).fillna("")
+    preview = force_all_columns_to_string(preview)
+    preview[barcode_col] = preview[barcode_col].map(clean_barcode)
+    preview[framecode_col] = preview[framecode_col].map(clean_barcode)
+
+    inventory_barcodes = pd.Index(df[barcode_col].map(clean_barcode))
+    inventory_framecodes = pd.Index(df[framecode_col].map(clean_barcode))
+
+    missing_barcode = preview[barcode_col] == ""
+    if auto_barcode and missing_barcode.any():
+        used = inventory_barcodes.append(pd.Index(preview[barcode_col]))
+        preview.loc[missing_barcode, barcode_col] = allocate_barcodes(int(missing_barcode.sum()), used)
+    missing_framecode = preview[framecode_col] == ""
+    if auto_framecode and missing_framecode.any() and "SUPPLIER" in preview.columns:
+        has_supplier = missing_framecode & (preview["SUPPLIER"].str.strip() != "")
+        if has_supplier.any():
+            used = inventory_framecodes.append(pd.Index(preview.loc[~missing_framecode, framecode_col]))
+            preview.loc[has_supplier, framecode_col] = allocate_framecodes(preview.loc[has_supplier, "SUPPLIER"], used)
+
+    if "QUANTITY" in preview.columns:
+        preview.loc[preview["QUANTITY"].str.strip() == "", "QUANTITY"] = "1"
+    if "AVAILFROM" in preview.columns:
+        preview.loc[preview["AVAILFROM"].str.strip() == "", "AVAILFROM"] = datetime.now().strftime('%Y-%m-%d')
+    if "Timestamp" in preview.columns:
+        preview["Timestamp"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    # Every check is a whole-column hash lookup; the first failing rule wins
+    barcodes = preview[barcode_col]
+    framecodes = preview[framecode_col]
+    checks = [
+        (barcodes == "", "Missing barcode"),
+        (framecodes == "", "Missing framecode"),
+        ((barcodes != "") & barcodes.duplicated(keep=False), "Duplicate barcode in file"),
+        ((framecodes != "") & framecodes.duplicated(keep=False), "Duplicate framecode in file"),
+        (barcodes.isin(inventory_barcodes), "Barcode already in inventory"),
+        (framecodes.isin(inventory_framecodes), "Framecode already in inventory"),
+    ]
+    if "QUANTITY" in preview.columns:
+        checks.append((~preview["QUANTITY"].str.strip().str.isdigit(), "Invalid quantity"))
+    status = pd.Series(IMPORT_STATUS_OK, index=preview.index, dtype=object)
+    for failed, message in reversed(checks):
+        status = status.mask(failed, message)
+    preview.insert(0, "IMPORT_STATUS", status)
+    return preview, mapping, unmapped
+
+
+def rows_to_commit(preview):
+    ok = preview[preview["IMPORT_STATUS"] == IMPORT_STATUS_OK]
+    return ok.drop(columns=["IMPORT_STATUS"])
@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from inventory_utils import file_signature, write_inventory_file
+from inventory_diff import diff_inventory, row_keys
+from perf import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: the in-process lock still serialises sessions
+    fcntl = None
+
+# Every save of an inventory file gets the next version number and appends one
+# JSON line of row-level deltas (keys added, removed and the fields changed) to
+# Inventory/.changes/<file>.jsonl. Sessions remember the version their view was
+# built from, poll the feed by reading only the bytes appended since, and a save
+# made against an older version is rejected instead of overwriting the file.
+# A file replaced outside the app (e.g. a new POS download copied in) shows up
+# as a "reload" event with no row deltas.
+#
+# A save may also be "deferred": the event is appended (with the added rows in
+# full) before the file is rewritten, which write_behind.py does later and then
+# records as a "persisted" event. The deferred events after the last persisted
+# version are therefore enough to redo the rewrite after a crash.
+CHANGES_FOLDER_NAME = ".changes"
+SAVE_EVENT = "save"
+RELOAD_EVENT = "reload"
+PERSISTED_EVENT = "persisted"
+RECENT_EVENTS = 1000
+
+
+class VersionConflict(Exception):
+    def __init__(self, base_version, current_version):
+        super().__init__(
+            f"Inventory is at version {current_version} but this change was made against version {base_version}."
+        )
+        self.base_version = base_version
+        self.current_version = current_version
+
+
+def feed_path(inventory_file):
+    folder = os.path.join(os.path.dirname(inventory_file), CHANGES_FOLDER_NAME)
+    return os.path.join(folder, os.path.basename(inventory_file) + ".jsonl")
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _plain(value):
+    return "" if pd.isnull(value) else str(value)
+
+
+class ChangeFeed:
+    def __init__(self, inventory_file):
+        self.inventory_file = inventory_file
+        self.log_path = feed_path(inventory_file)
+        self._lock = threading.RLock()
+        # Set by write_behind.get_write_behind; a direct write supersedes its queue
+        self.pending_writer = None
+        self._reset()
+
+    def _reset(self):
+        self._offset = 0
+        self.version = 0
+        self.persisted_version = 0
+        self.signature = None
+        self.recent = deque(maxlen=RECENT_EVENTS)
+
+    @contextmanager
+    def _locked(self):
+        # Serialises writers across sessions and, where flock exists, processes
+        with self._lock:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path + ".lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_new_events(self):
+        if not os.path.exists(self.log_path):
+            if self._offset:
+                self._reset()
+            return
+        size = os.path.getsize(self.log_path)
+        if size < self._offset:
+            self._reset()
+        if size == self._offset:
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read(size - self._offset)
+        # Only consume complete lines so a write in progress is picked up next time.
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            return
+        self._offset += end + 1
+        for raw in chunk[:end].splitlines():
+            if not raw.strip():
+                continue
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                continue
+            self.signature = tuple(event["signature"]) if event.get("signature") else None
+            if event["event"] == PERSISTED_EVENT:
+                self.persisted_version = event["version"]
+                continue
+            self.version = event["version"]
+            if not event.get("deferred"):
+                self.persisted_version = self.version
+            self.recent.append(event)
+
+    def _append(self, event):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._read_new_events()
+
+    def _current_signature(self):
+        return file_signature(self.inventory_file) if os.path.exists(self.inventory_file) else None
+
+    def refresh(self):
+        # Cheap poll: reads appended lines, and stats the inventory file to catch
+        # replacements made outside the app. Returns the current version.
+        with self._lock:
+            self._read_new_events()
+            if self._current_signature() != self.signature:
+                with self._locked():
+                    self._refresh_locked()
+            return self.version
+
+    def _refresh_locked(self):
+        # refresh() for callers already holding _locked(): flock is per open file,
+        # so taking it again from the same process would block forever
+        self._read_new_events()
+        signature = self._current_signature()
+        if signature != self.signature:
+            self._append({
+                "event": RELOAD_EVENT,
+                "version": self.version + 1,
+                "at": _now(),
+                "signature": list(signature) if signature else None,
+            })
+        return self.version
+
+    def events_since(self, version):
+        # None when the feed no longer holds every event after `version`
+        with self._lock:
+            events = [e for e in self.recent if e["version"] > version]
+            if events and events[0]["version"] != version + 1:
+                return None
+            if not events and version < self.version:
+                return None
+            return events
+
+    def unpersisted_events(self):
+        # Deferred saves not yet written to the file, or None if some have aged out
+        with self._lock:
+            self._read_new_events()
+            if self.persisted_version >= self.version:
+                return []
+            return self.events_since(self.persisted_version)
+
+    def mark_persisted(self, version):
+        # Caller holds _locked() and has just written the file as of `version`
+        signature = self._current_signature()
+        self._append({
+            "event": PERSISTED_EVENT,
+            "version": version,
+            "at": _now(),
+            "signature": list(signature) if signature else None,
+        })
+
+    def changed_keys_since(self, version):
+        # Row keys touched since `version`, or None if a reload makes every row suspect
+        events = self.events_since(version)
+        if events is None:
+            return None
+        keys = set()
+        for event in events:
+            if event["event"] == RELOAD_EVENT:
+                return None
+            keys.update(event.get("added", []))
+            keys.update(event.get("removed", []))
+            keys.update(event.get("changed", {}))
+        return keys
+
+    def commit(self, base_version, old_df, new_df, write=None, diff=None, deferred=False):
+        # Writes new_df if nobody else has saved since base_version. old_df is the
+        # frame the caller started from at that version. With deferred=True `write`
+        # only queues new_df, and the event is logged with enough to replay it.
+        with span("change_feed.commit"), self._locked():
+            self._refresh_locked()
+            if self.version != base_version:
+                raise VersionConflict(base_version, self.version)
+            if diff is None:
+                diff = diff_inventory(old_df, new_df)
+            if not deferred and self.pending_writer is not None:
+                self.pending_writer.discard()
+            if write is None:
+                write_inventory_file(new_df, self.inventory_file)
+            else:
+                write(new_df)
+            old_keys = row_keys(old_df)
+            changes = diff["changes"]
+            changed = {}
+            for key, field, value in zip(changes["KEY"], changes["FIELD"], changes["NEW"]):
+                changed.setdefault(key, {})[field] = _plain(value)
+            signature = self._current_signature()
+            event = {
+                "event": SAVE_EVENT,
+                "version": self.version + 1,
+                "at": _now(),
+                "signature": list(signature) if signature else None,
+                "added": [str(k) for k in diff["new_keys"][diff["added_positions"]]],
+                "removed": [str(k) for k in old_keys[diff["removed_positions"]]],
+                "changed": changed,
+            }
+            if deferred:
+                added = new_df.iloc[diff["added_positions"]]
+                event["deferred"] = True
+                event["added_rows"] = [
+                    {col: _plain(value) for col, value in zip(added.columns, row)}
+                    for row in added.itertuples(index=False, name=None)
+                ]
+            self._append(event)
+            return self.version
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def get_change_feed(inventory_file):
+    # One feed per inventory file for the whole process, shared by every session.
+    key = os.path.abspath(inventory_file)
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is None:
+            feed = ChangeFeed(inventory_file)
+            _feeds[key] = feed
+    return feed
@@ -0,0 +1,143 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from archive_store import get_archive_index, records_to_frame
+from inventory_utils import clean_barcode, get_derived, inventory_snapshot, read_inventory_file
+from reconcile import expected_quantities
+from stocktake_utils import IDENTIFYING_FIELDS
+
+# Products entered more than once under different barcodes. Every inventory
+# and archive row is reduced to a hash of its IDENTIFYING_FIELDS in one
+# vectorised pass and rows are grouped by that hash, so the whole catalogue is
+# clustered at once instead of compared pair by pair. With normalisation, case
+# and runs of whitespace are ignored and FRAMENUM is compared cleaned. Also
+# runs headless:
+#
+#     python duplicates.py --inventory Inventory/stock.csv --archive archive_inventory_log.jsonl
+INVENTORY_SOURCE = "Inventory"
+ARCHIVE_SOURCE = "Archive"
+# Rows with fewer identifying values than this are too vague to cluster
+MIN_IDENTIFYING = 3
+CLUSTER_COLUMNS = ["CLUSTER"] + IDENTIFYING_FIELDS + ["ROWS", "INVENTORY_ROWS", "ARCHIVE_ROWS", "BARCODES", "QUANTITY"]
+MEMBER_COLUMNS = ["CLUSTER", "SOURCE", "ROW", "BARCODE"] + IDENTIFYING_FIELDS + ["QUANTITY", "ARCHIVED_AT"]
+
+
+def signature_frame(df, normalize=True):
+    # The identifying fields as compared: blank is "", normalised if asked
+    frame = pd.DataFrame(index=df.index)
+    for field in IDENTIFYING_FIELDS:
+        if field not in df.columns:
+            frame[field] = ""
+            continue
+        values = df[field].astype("string").str.strip().fillna("")
+        values = values.mask(values.isin(["nan", "None"]), "")
+        if normalize:
+            values = values.str.replace(r"\s+", " ", regex=True).str.upper()
+            if field == "FRAMENUM":
+                values = values.map(clean_barcode)
+        frame[field] = values.astype(object)
+    return frame
+
+
+def _source_rows(df, source, row_labels):
+    return pd.DataFrame({
+        "SOURCE": source,
+        "ROW": row_labels,
+        "BARCODE": df["BARCODE"].map(clean_barcode).to_numpy() if "BARCODE" in df.columns else "",
+        "QUANTITY": expected_quantities(df).to_numpy() if source == INVENTORY_SOURCE else 0,
+        "ARCHIVED_AT": df["ARCHIVED_AT"].to_numpy() if "ARCHIVED_AT" in df.columns else "",
+    })
+
+
+def cluster_duplicates(inventory, archive=None, normalize=True):
+    # {"clusters": one row per cluster, "members": the rows in each}. A cluster
+    # is two or more rows with the same signature and at least two barcodes.
+    frames = [(inventory.reset_index(drop=True), INVENTORY_SOURCE)]
+    if archive is not None and len(archive):
+        frames.append((archive.reset_index(drop=True), ARCHIVE_SOURCE))
+    signatures, rows = [], []
+    for frame, source in frames:
+        # Inventory rows are numbered as in the spreadsheet, archive rows by archive id
+        labels = (np.arange(len(frame)) + 2).astype(str) if source == INVENTORY_SOURCE else frame.get("ARCHIVE_ID", pd.Series("", index=frame.index)).to_numpy()
+        signatures.append(signature_frame(frame, normalize))
+        rows.append(_source_rows(frame, source, labels))
+    signatures = pd.concat(signatures, ignore_index=True)
+    rows = pd.concat([pd.concat(rows, ignore_index=True), signatures], axis=1)
+
+    known = (signatures != "").sum(axis=1) >= MIN_IDENTIFYING
+    rows = rows[known.to_numpy()]
+    rows["HASH"] = pd.util.hash_pandas_object(rows[IDENTIFYING_FIELDS], index=False).to_numpy()
+    size = rows["HASH"].map(rows["HASH"].value_counts())
+    distinct = rows.loc[rows["BARCODE"] != "", ["HASH", "BARCODE"]].drop_duplicates()["HASH"].value_counts()
+    barcodes = rows["HASH"].map(distinct).fillna(0)
+    members = rows[(size >= 2) & (barcodes >= 2)]
+    if members.empty:
+        return {"clusters": pd.DataFrame(columns=CLUSTER_COLUMNS), "members": pd.DataFrame(columns=MEMBER_COLUMNS)}
+
+    grouped = members.groupby("HASH", sort=False)
+    clusters = grouped[IDENTIFYING_FIELDS].first()
+    clusters["ROWS"] = grouped.size()
+    clusters["INVENTORY_ROWS"] = (members["SOURCE"] == INVENTORY_SOURCE).groupby(members["HASH"], sort=False).sum()
+    clusters["ARCHIVE_ROWS"] = clusters["ROWS"] - clusters["INVENTORY_ROWS"]
+    clusters["BARCODES"] = grouped["BARCODE"].agg(lambda b: ", ".join(sorted(set(b[b != ""]))))
+    clusters["QUANTITY"] = grouped["QUANTITY"].sum()
+    clusters = clusters.sort_values(["ROWS", "QUANTITY"], ascending=False, kind="stable")
+    clusters["CLUSTER"] = np.arange(1, len(clusters) + 1)
+    members = members.assign(CLUSTER=members["HASH"].map(clusters["CLUSTER"]))
+    # Inventory rows in file order, then archive rows
+    members = members.sort_values("CLUSTER", kind="stable")
+    return {
+        "clusters": clusters.reset_index(drop=True).reindex(columns=CLUSTER_COLUMNS),
+        "members": members.reset_index(drop=True).reindex(columns=MEMBER_COLUMNS),
+    }
+
+
+def archive_frame(archive_index):
+    archive_index.refresh()
+    records = [r for rid, r in archive_index.records.items() if rid not in archive_index.restored]
+    return records_to_frame(records)
+
+
+def get_duplicate_clusters(path, archive_index=None, normalize=True, snapshot=None):
+    # One result per inventory version and setting. With the archive included
+    # it is rebuilt when the archive version moves on, replacing the old one.
+    if snapshot is None:
+        snapshot = inventory_snapshot(path)
+    if archive_index is None:
+        return get_derived(path, f"duplicate_clusters_{normalize}", lambda frame: cluster_duplicates(frame, None, normalize), snapshot)
+    slot = get_derived(path, f"duplicate_clusters_{normalize}_archive", lambda frame: {}, snapshot)
+    archive_index.refresh()
+    version = archive_index.version
+    cached = slot.get("result")
+    if cached is None or cached[0] != version:
+        cached = (version, cluster_duplicates(snapshot["df"].copy(deep=False), archive_frame(archive_index), normalize))
+        slot["result"] = cached
+    return cached[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster inventory and archive rows that describe the same product.")
+    parser.add_argument("--inventory", required=True, help="Inventory CSV/XLSX file")
+    parser.add_argument("--archive", default=None, help="Archive log (archive_inventory_log.jsonl)")
+    parser.add_argument("--exact", action="store_true", help="Compare fields exactly instead of ignoring case and spacing")
+    parser.add_argument("--output", default="duplicate_products.csv", help="CSV of the rows in each cluster")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    inventory = read_inventory_file(args.inventory)
+    archive = archive_frame(get_archive_index(args.archive)) if args.archive else None
+    result = cluster_duplicates(inventory, archive, normalize=not args.exact)
+    result["members"].to_csv(args.output, index=False)
+    print(result["clusters"].head(20).to_string(index=False))
+    rows = len(inventory) + (len(archive) if archive is not None else 0)
+    print(f"\n{len(result['clusters'])} clusters over {rows} rows in {time.perf_counter() - start:.2f}s")
+    print(f"  wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+from inventory_utils import clean_barcode, clean_nans, get_derived, get_barcode_index, inventory_snapshot
+from money import first_cents, format_money
+from perf import span
+from reconcile import expected_quantities
+
+# "Frames like this one": the fit measurements of every frame as one float32
+# matrix per inventory version, and a vectorised nearest-neighbour query over
+# it. SIZE "56-18" gives the eye and bridge sizes; TEMPLE, DEPTH, DIAG and
+# BASECURVE are read as numbers. Each difference is divided by how much that
+# measurement may differ before a frame fits noticeably differently, and only
+# the measurements both frames have are compared.
+FIT_FIELDS = ["EYE", "BRIDGE", "TEMPLE", "DEPTH", "DIAG", "BASECURVE"]
+FIT_SCALES = np.array([1.0, 1.0, 5.0, 2.0, 2.0, 1.0], dtype=np.float32)
+# A frame must share at least this many measurements with the one asked about
+MIN_SHARED = 2
+DEFAULT_NEIGHBOURS = 10
+ANY_FRAMETYPE = "Any"
+SAME_FRAMETYPE = "Same as this frame"
+RESULT_COLUMNS = ["BARCODE", "FRAMENUM", "MANUFACT", "MODEL", "FCOLOUR", "SIZE", "TEMPLE",
+                  "DEPTH", "DIAG", "BASECURVE", "FRAMETYPE", "QUANTITY", "RRP"]
+
+
+def _measure(values):
+    # Positive numbers only: POS exports use 0 for "not measured"
+    numbers = pd.to_numeric(pd.Series(values).astype("string").str.strip(), errors="coerce")
+    return numbers.where(numbers > 0).astype("float32")
+
+
+def split_size(values):
+    # "56-18", "56/18", "56 18" or "56□18" -> (eye, bridge)
+    parts = pd.Series(values).astype("string").str.extract(r"^\s*(\d+(?:\.\d+)?)\D+(\d+(?:\.\d+)?)")
+    return _measure(parts[0]), _measure(parts[1])
+
+
+def build_fit_matrix(df):
+    n = len(df)
+    matrix = np.full((n, len(FIT_FIELDS)), np.nan, dtype=np.float32)
+    if "SIZE" in df.columns:
+        eye, bridge = split_size(df["SIZE"])
+        matrix[:, 0] = eye.to_numpy(dtype=np.float32, na_value=np.nan)
+        matrix[:, 1] = bridge.to_numpy(dtype=np.float32, na_value=np.nan)
+    for i, field in enumerate(FIT_FIELDS[2:], start=2):
+        if field in df.columns:
+            matrix[:, i] = _measure(df[field]).to_numpy(dtype=np.float32, na_value=np.nan)
+    if "FRAMETYPE" in df.columns:
+        frametypes = df["FRAMETYPE"].astype("string").str.strip().str.upper().fillna("").to_numpy(dtype=object)
+    else:
+        frametypes = np.full(n, "", dtype=object)
+    return {
+        "matrix": matrix,
+        "in_stock": (expected_quantities(df) > 0).to_numpy(),
+        "frametype": frametypes,
+        "rrp_cents": first_cents(df, ["RRP"]).to_numpy(dtype=np.float64, na_value=np.nan),
+    }
+
+
+def get_fit_matrix(path, snapshot=None):
+    return get_derived(path, "fit_matrix", build_fit_matrix, snapshot)
+
+
+def nearest_frames(fit, position, k=DEFAULT_NEIGHBOURS, frametype=None, price_min=None, price_max=None,
+                   in_stock_only=True):
+    # Positions and distances of the k frames closest to the one at `position`,
+    # nearest first. Prices are in cents; None leaves that side of the band open.
+    matrix = fit["matrix"]
+    mask = np.ones(len(matrix), dtype=bool)
+    mask[position] = False
+    if in_stock_only:
+        mask &= fit["in_stock"]
+    if frametype:
+        mask &= fit["frametype"] == frametype.upper()
+    if price_min is not None:
+        mask &= fit["rrp_cents"] >= price_min
+    if price_max is not None:
+        mask &= fit["rrp_cents"] <= price_max
+    candidates = np.flatnonzero(mask)
+    diff = (matrix[candidates] - matrix[position]) / FIT_SCALES
+    shared = (~np.isnan(diff)).sum(axis=1)
+    distance = np.sqrt(np.nansum(diff * diff, axis=1) / np.maximum(shared, 1))
+    keep = shared >= MIN_SHARED
+    candidates, distance = candidates[keep], distance[keep]
+    if len(candidates) > k:
+        top = np.argpartition(distance, k)[:k]
+        candidates, distance = candidates[top], distance[top]
+    order = np.lexsort((candidates, distance))
+    return candidates[order], distance[order]
+
+
+def similar_frames_table(df, positions, distances):
+    table = df.iloc[positions].reindex(columns=[c for c in RESULT_COLUMNS if c in df.columns]).copy()
+    if "BARCODE" in table.columns:
+        table["BARCODE"] = table["BARCODE"].map(clean_barcode)
+    if "RRP" in table.columns:
+        table["RRP"] = format_money(table["RRP"])
+    table = clean_nans(table)
+    table.insert(0, "DISTANCE", np.round(distances, 2))
+    return table.reset_index(drop=True)
+
+
+def render_similar_frames(st, path, barcode, key, snapshot=None):
+    # Query controls and results for one frame; `key` prefixes the widget keys.
+    # Positions, the fit matrix and the result rows all come from one snapshot.
+    if snapshot is None:
+        snapshot = inventory_snapshot(path)
+    position = get_barcode_index(path, snapshot).get(clean_barcode(barcode))
+    if position is None:
+        st.info("ℹ️ This barcode is not in the inventory.")
+        return
+    fit = get_fit_matrix(path, snapshot)
+    if (~np.isnan(fit["matrix"][position])).sum() < MIN_SHARED:
+        st.info("ℹ️ This frame has too few measurements (SIZE, TEMPLE, DEPTH, DIAG, BASECURVE) to compare.")
+        return
+    cols = st.columns(4)
+    k = cols[0].number_input("Frames to show", min_value=1, max_value=50, value=DEFAULT_NEIGHBOURS, key=f"{key}_k")
+    frametypes = sorted(t for t in set(fit["frametype"]) if t)
+    frametype = cols[1].selectbox("Frame type", [ANY_FRAMETYPE, SAME_FRAMETYPE] + frametypes, key=f"{key}_frametype")
+    price_min = cols[2].number_input("RRP from ($)", min_value=0.0, value=0.0, step=10.0, key=f"{key}_price_min")
+    price_max = cols[3].number_input("RRP up to ($, 0 = no limit)", min_value=0.0, value=0.0, step=10.0, key=f"{key}_price_max")
+    if frametype == ANY_FRAMETYPE:
+        frametype = None
+    elif frametype == SAME_FRAMETYPE:
+        frametype = fit["frametype"][position] or None
+    with span("fit.nearest_frames"):
+        positions, distances = nearest_frames(
+            fit, position, int(k), frametype,
+            price_min=round(price_min * 100) if price_min > 0 else None,
+            price_max=round(price_max * 100) if price_max > 0 else None,
+        )
+    if not len(positions):
+        st.info("ℹ️ No in-stock frames with these filters have comparable measurements.")
+        return
+    st.caption("Closest in-stock frames first; a distance of 1 is about 1 mm of eye or bridge size.")
+    st.dataframe(similar_frames_table(snapshot["df"], positions, distances), width='stretch', hide_index=True)
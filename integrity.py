@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+from inventory_utils import clean_barcode, file_signature, get_derived, inventory_snapshot
+from money import MONEY_FIELDS, to_cents
+from valuation import parse_dates
+
+# Data checks run once per inventory version, all column-wise: duplicate
+# BARCODE/FRAMENUM, prices and dates that do not parse, QUANTITY values out of
+# range, and raw barcodes that only become equal after clean_barcode (e.g.
+# "00123" and "123"). The cleaned BARCODE/FRAMENUM -> rows index behind the
+# duplicate checks is also what the Add/Edit forms look up on submit.
+UNIQUE_FIELDS = ["BARCODE", "FRAMENUM"]
+CHECK_DATE_FIELDS = ["LASTSALE", "LASTSALE2", "FIRSTPUR", "LASTPUR", "AVAILFROM", "AVAILTILL", "REORDDATE", "RETURNBY", "LASTINV"]
+QUANTITY_MAX = 500
+ISSUE_COLUMNS = ["CHECK", "ROW", "BARCODE", "FRAMENUM", "FIELD", "VALUE"]
+CHECKS = [
+    "Duplicate BARCODE", "Duplicate FRAMENUM", "Barcodes merged by cleaning",
+    "Unreadable price", "Unreadable date", "QUANTITY out of range",
+]
+
+
+def _text(values):
+    text = values.astype("string").str.strip()
+    return text.mask(text.isin(["", "nan", "None"]))
+
+
+def build_key_positions(df, fields=UNIQUE_FIELDS):
+    # {field: {cleaned value: [row positions]}}
+    index = {}
+    for field in fields:
+        if field not in df.columns:
+            continue
+        cleaned = df[field].map(clean_barcode)
+        groups = cleaned[cleaned != ""].groupby(cleaned[cleaned != ""], sort=False).indices
+        index[field] = {key: positions.tolist() for key, positions in groups.items()}
+    return index
+
+
+def read_raw_barcodes(path, barcode_col="BARCODE"):
+    # The BARCODE column exactly as written, before numeric parsing and cleaning
+    try:
+        if path.lower().endswith(".xlsx"):
+            raw = pd.read_excel(path, usecols=[barcode_col], dtype=str)
+        else:
+            raw = pd.read_csv(path, usecols=[barcode_col], dtype=str)
+    except (ValueError, KeyError):
+        return None
+    return raw[barcode_col]
+
+
+def _issues(check, df, positions, field, values):
+    positions = np.asarray(positions, dtype=np.int64)
+
+    def column(name):
+        return df[name].to_numpy()[positions] if name in df.columns else ""
+
+    return pd.DataFrame({
+        "CHECK": check,
+        "ROW": positions + 2,  # spreadsheet row, after the header
+        "BARCODE": column("BARCODE"),
+        "FRAMENUM": column("FRAMENUM"),
+        "FIELD": field,
+        "VALUE": values,
+    })
+
+
+def scan_inventory(df, raw_barcodes=None, key_positions=None):
+    frames = []
+    if key_positions is None:
+        key_positions = build_key_positions(df)
+    for field, groups in key_positions.items():
+        dupes = [positions for positions in groups.values() if len(positions) > 1]
+        if dupes:
+            rows = np.concatenate(dupes)
+            frames.append(_issues(f"Duplicate {field}", df, rows, field, df[field].to_numpy()[rows]))
+
+    if raw_barcodes is not None and len(raw_barcodes) == len(df):
+        raw = _text(raw_barcodes).reset_index(drop=True)
+        cleaned = raw.fillna("").map(clean_barcode)
+        distinct_raw = raw.groupby(cleaned).transform("nunique")
+        merged = np.flatnonzero((distinct_raw > 1).to_numpy() & raw.notna().to_numpy())
+        if len(merged):
+            frames.append(_issues("Barcodes merged by cleaning", df, merged, "BARCODE", raw.to_numpy()[merged]))
+
+    for field in MONEY_FIELDS:
+        if field not in df.columns:
+            continue
+        text = _text(df[field])
+        bad = np.flatnonzero((text.notna() & to_cents(text).isna()).to_numpy())
+        if len(bad):
+            frames.append(_issues("Unreadable price", df, bad, field, text.to_numpy()[bad]))
+
+    for field in CHECK_DATE_FIELDS:
+        if field not in df.columns:
+            continue
+        text = _text(df[field])
+        text = text.mask(text.str.fullmatch(r"[/\s-]*").fillna(False))
+        bad = np.flatnonzero((text.notna() & parse_dates(text, field).isna()).to_numpy())
+        if len(bad):
+            frames.append(_issues("Unreadable date", df, bad, field, text.to_numpy()[bad]))
+
+    if "QUANTITY" in df.columns:
+        text = _text(df["QUANTITY"])
+        qty = pd.to_numeric(text, errors="coerce")
+        bad = np.flatnonzero((text.notna() & (qty.isna() | (qty < 0) | (qty > QUANTITY_MAX) | (qty % 1 != 0))).to_numpy())
+        if len(bad):
+            frames.append(_issues("QUANTITY out of range", df, bad, "QUANTITY", text.to_numpy()[bad]))
+
+    issues = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ISSUE_COLUMNS)
+    counts = issues["CHECK"].value_counts()
+    summary = pd.DataFrame({
+        "CHECK": CHECKS,
+        "ISSUES": [int(counts.get(check, 0)) for check in CHECKS],
+        "ROWS": [int(issues.loc[issues["CHECK"] == check, "ROW"].nunique()) for check in CHECKS],
+    })
+    return {"issues": issues, "summary": summary}
+
+
+def get_key_positions(path, snapshot=None):
+    return get_derived(path, "key_positions", build_key_positions, snapshot)
+
+
+def snapshot_raw_barcodes(path, snapshot):
+    # The raw BARCODE column of the file behind `snapshot`, or None when the file
+    # holds some other version. A frame saved but not yet written is already in
+    # the saved form, whose barcodes are cleaned, so it has nothing to compare.
+    if snapshot.get("pending"):
+        return None
+    try:
+        if file_signature(path) != snapshot["signature"]:
+            return None
+        raw = read_raw_barcodes(path)
+        if file_signature(path) != snapshot["signature"]:
+            return None
+    except OSError:
+        return None
+    return raw
+
+
+def get_integrity(path, snapshot=None):
+    snapshot = snapshot if snapshot is not None else inventory_snapshot(path)
+    return get_derived(
+        path, "integrity_scan",
+        lambda frame: scan_inventory(frame, snapshot_raw_barcodes(path, snapshot), get_key_positions(path, snapshot)),
+        snapshot,
+    )
+
+
+def duplicate_rows(path, field, value, exclude_position=None, snapshot=None):
+    # Row positions (other than exclude_position) whose cleaned `field` equals value
+    positions = get_key_positions(path, snapshot).get(field, {}).get(clean_barcode(value), [])
+    return [p for p in positions if p != exclude_position]
@@ -0,0 +1,173 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from inventory_utils import (
+    read_inventory_file, write_inventory_file, prepare_for_save, update_inventory_cache, file_signature,
+)
+
+# Compares a fresh POS download with the inventory file it replaces. Every row
+# is keyed by PKEY, falling back to UUID and then BARCODE, and hashed once; the
+# two key sets are joined in a single pass, and only rows whose hash differs
+# are compared field by field. The hashes of the current file are kept in a
+# small snapshot next to it so the next comparison can skip rehashing it.
+KEY_FIELDS = ["PKEY", "UUID", "BARCODE"]
+SNAPSHOT_FOLDER_NAME = ".snapshots"
+CHANGE_COLUMNS = ["KEY", "BARCODE", "FRAMENUM", "FIELD", "OLD", "NEW"]
+
+
+def snapshot_path(inventory_file):
+    folder = os.path.join(os.path.dirname(inventory_file), SNAPSHOT_FOLDER_NAME)
+    return os.path.join(folder, os.path.basename(inventory_file) + ".hashes.pkl.gz")
+
+
+def _blank(values):
+    return values.isna() | values.astype(str).str.strip().isin(["", "nan", "None"])
+
+
+def row_keys(df):
+    # First non-blank of KEY_FIELDS, prefixed with its field name; repeated keys
+    # get an occurrence suffix so every row stays addressable.
+    keys = pd.Series("", index=df.index, dtype=object)
+    for field in reversed(KEY_FIELDS):
+        if field in df.columns:
+            values = df[field].astype(str).str.strip()
+            keys = keys.where(_blank(df[field]), field + ":" + values)
+    keys = keys.where(keys != "", "ROW:" + pd.Series(range(len(df)), index=df.index).astype(str))
+    occurrence = keys.groupby(keys).cumcount()
+    return keys.where(occurrence == 0, keys + "#" + occurrence.astype(str)).to_numpy()
+
+
+def row_hashes(df, columns):
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def load_snapshot(inventory_file):
+    path = snapshot_path(inventory_file)
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_pickle(path, compression="gzip")
+    except Exception:
+        return None
+
+
+def save_snapshot(inventory_file, keys, hashes, columns):
+    path = snapshot_path(inventory_file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    pd.to_pickle({
+        "signature": file_signature(inventory_file),
+        "columns": list(columns),
+        "keys": keys,
+        "hashes": hashes,
+    }, tmp_path, compression="gzip")
+    os.replace(tmp_path, path)
+
+
+def read_download(uploaded_file):
+    # Parsed exactly like an inventory file so unchanged rows hash the same
+    return read_inventory_file(uploaded_file, name=uploaded_file.name)
+
+
+def diff_inventory(old_df, new_df, inventory_file=None):
+    columns = sorted(set(old_df.columns) & set(new_df.columns))
+    snapshot = load_snapshot(inventory_file) if inventory_file and os.path.exists(inventory_file) else None
+    if (snapshot is not None and snapshot["signature"] == file_signature(inventory_file)
+            and snapshot["columns"] == columns and len(snapshot["keys"]) == len(old_df)):
+        old_keys, old_hashes = snapshot["keys"], snapshot["hashes"]
+    else:
+        old_keys, old_hashes = row_keys(old_df), row_hashes(old_df, columns)
+        if inventory_file and os.path.exists(inventory_file):
+            save_snapshot(inventory_file, old_keys, old_hashes, columns)
+    new_keys, new_hashes = row_keys(new_df), row_hashes(new_df, columns)
+
+    # One hash join: the new position of every old row, or -1 if it was removed
+    new_pos_of_old = pd.Index(new_keys).get_indexer(old_keys)
+    kept = new_pos_of_old >= 0
+    old_kept = np.flatnonzero(kept)
+    new_kept = new_pos_of_old[kept]
+    differs = old_hashes[old_kept] != new_hashes[new_kept]
+    changed_old, changed_new = old_kept[differs], new_kept[differs]
+    removed = np.flatnonzero(~kept)
+    added_mask = np.ones(len(new_df), dtype=bool)
+    added_mask[new_kept] = False
+    added = np.flatnonzero(added_mask)
+
+    changes = _changed_fields(old_df, new_df, columns, old_keys, changed_old, changed_new)
+    return {
+        "added": new_df.iloc[added],
+        "removed": old_df.iloc[removed],
+        "changes": changes,
+        "changed_rows": len(changed_old),
+        "unchanged_rows": int(len(old_kept) - len(changed_old)),
+        "added_columns": [c for c in new_df.columns if c not in old_df.columns],
+        "removed_columns": [c for c in old_df.columns if c not in new_df.columns],
+        # positions used to apply the download without re-reading or re-indexing
+        "removed_positions": removed,
+        "changed_positions": (changed_old, changed_new),
+        "added_positions": added,
+        "new_positions": new_pos_of_old,
+        "new_keys": new_keys,
+        "new_hashes": new_hashes,
+        "columns": columns,
+    }
+
+
+def _changed_fields(old_df, new_df, columns, old_keys, changed_old, changed_new):
+    if not len(changed_old):
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+    old_values = old_df.iloc[changed_old][columns].to_numpy()
+    new_values = new_df.iloc[changed_new][columns].to_numpy()
+    rows, cols = np.nonzero((old_values != new_values) & ~(pd.isna(old_values) & pd.isna(new_values)))
+    old_sub = old_df.iloc[changed_old]
+
+    def column_or_blank(frame, name):
+        return frame[name].to_numpy()[rows] if name in frame.columns else ""
+
+    return pd.DataFrame({
+        "KEY": old_keys[changed_old][rows],
+        "BARCODE": column_or_blank(old_sub, "BARCODE"),
+        "FRAMENUM": column_or_blank(old_sub, "FRAMENUM"),
+        "FIELD": np.asarray(columns, dtype=object)[cols],
+        "OLD": old_values[rows, cols],
+        "NEW": new_values[rows, cols],
+    })
+
+
+def change_report(diff):
+    # Added/removed/changed rows as one long table for download
+    frames = [diff["changes"].assign(CHANGE="CHANGED")]
+    for change, rows in (("ADDED", diff["added"]), ("REMOVED", diff["removed"])):
+        frames.append(pd.DataFrame({
+            "CHANGE": change,
+            "BARCODE": rows["BARCODE"].to_numpy() if "BARCODE" in rows.columns else "",
+            "FRAMENUM": rows["FRAMENUM"].to_numpy() if "FRAMENUM" in rows.columns else "",
+        }))
+    return pd.concat(frames, ignore_index=True).reindex(columns=["CHANGE"] + CHANGE_COLUMNS).fillna("")
+
+
+def apply_download(inventory_file, old_df, new_df, diff):
+    # Existing rows keep their order (taking the download's values), removed rows
+    # drop out and new rows go on the end. The file is rewritten once, in the
+    # saved form every other save writes; the cache keeps the parsed frame (what
+    # a re-read returns) and it, the barcode index and the hash snapshot are
+    # updated from the diff.
+    new_positions = diff["new_positions"]
+    order = np.concatenate([new_positions[new_positions >= 0], diff["added_positions"]])
+    merged = new_df.iloc[order].reset_index(drop=True)
+    write_inventory_file(prepare_for_save(merged), inventory_file)
+
+    touched = []
+    if "BARCODE" in old_df.columns:
+        old_barcodes = old_df["BARCODE"].to_numpy()
+        touched.extend(old_barcodes[diff["removed_positions"]])
+        touched.extend(old_barcodes[diff["changed_positions"][0]])
+    if "BARCODE" in new_df.columns:
+        new_barcodes = new_df["BARCODE"].to_numpy()
+        touched.extend(new_barcodes[diff["changed_positions"][1]])
+        touched.extend(new_barcodes[diff["added_positions"]])
+    update_inventory_cache(inventory_file, merged, diff["removed_positions"], touched)
+    save_snapshot(inventory_file, diff["new_keys"][order], diff["new_hashes"][order], diff["columns"])
+    return merged
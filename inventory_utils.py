@@ -0,0 +1,266 @@
+import functools
+import itertools
+import os
+import random
+import threading
+
+import numpy as np
+import pandas as pd
+
+from money import format_money, to_cents
+
+# Sessions share the cached frames below. Copy-on-Write (always on from pandas 3)
+# lets each session hold a shallow copy and only copies the columns it edits.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+def clean_nans(df):
+    return df.replace([pd.NA, 'nan'], '', regex=True)
+
+
+def force_all_columns_to_string(df):
+    for col in df.columns:
+        df[col] = df[col].astype(str)
+    return df
+
+
+def clean_barcode(val):
+    if pd.isnull(val) or val == "":
+        return ""
+    s = str(val).strip().replace('\u200b','').replace('\u00A0','')
+    try:
+        f = float(s)
+        s = str(int(f))
+    except (ValueError, OverflowError):  # not a number, or "inf"/"12e456"
+        pass
+    return s
+
+
+def format_rrp(val):
+    try:
+        f = float(str(val).replace("$", "").strip())
+        return f"${f:.2f}"
+    except Exception:
+        return "$0.00"
+
+
+def write_inventory_file(df, path):
+    if path.lower().endswith('.xlsx'):
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def prepare_for_save(df, barcode_col="BARCODE"):
+    # The form every save writes: blanks instead of NaN, string columns, cleaned
+    # barcodes and RRP as "$149.00"
+    df = clean_nans(df)
+    df = force_all_columns_to_string(df)
+    if barcode_col in df.columns:
+        df[barcode_col] = df[barcode_col].map(clean_barcode)
+    if "RRP" in df.columns:
+        df["RRP"] = format_money(df["RRP"])
+    return df
+
+
+def read_inventory_file(path, name=None):
+    # path may also be an open file (e.g. an upload); name then gives its type
+    name = (name or path).lower()
+    if name.endswith('.xlsx'):
+        df = pd.read_excel(path)
+    elif name.endswith('.csv'):
+        df = pd.read_csv(path)
+    else:
+        raise ValueError(f"Unsupported inventory file type: {name}")
+    return normalize_inventory_frame(df)
+
+
+def normalize_inventory_frame(df):
+    # The shape every reader sees: string columns, cleaned BARCODE first, bare RRP
+    df = force_all_columns_to_string(df)
+    df.rename(columns={"FRAME NO.": "FRAMENUM"}, inplace=True)
+    if "BARCODE" in df.columns:
+        df["BARCODE"] = df["BARCODE"].map(clean_barcode)
+        cols = list(df.columns)
+        cols.insert(0, cols.pop(cols.index("BARCODE")))
+        df = df[cols]
+    if "RRP" in df.columns:
+        df["RRP"] = df["RRP"].apply(lambda x: str(x).replace("$", "").strip())
+    return df
+
+
+# --- Process-wide parsed inventory cache, keyed by file path and invalidated on mtime/size ---
+_inventory_cache = {}
+_inventory_cache_lock = threading.Lock()
+# One lock per file, held while it is parsed, so a session and the warm-up
+# thread loading it at the same time share one parse and one cache entry
+_inventory_load_locks = {}
+_pending_versions = itertools.count(1)
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _new_entry(signature, df):
+    barcodes = df["BARCODE"] if "BARCODE" in df.columns else pd.Series(dtype=str)
+    return {
+        "signature": signature,
+        "df": df,
+        # first row position for each cleaned barcode, mirroring the pages' .iloc[0]
+        "barcode_index": {b: i for i, b in reversed(list(enumerate(barcodes))) if b},
+    }
+
+
+def _cached_entry(path):
+    key = os.path.abspath(path)
+    with _inventory_cache_lock:
+        entry = _inventory_cache.get(key)
+    # A frame saved but not yet written out (see write_behind.py) is newer than the file
+    if entry is not None and entry.get("pending"):
+        return entry
+    signature = file_signature(path)
+    if entry is not None and entry["signature"] == signature:
+        return entry
+    with _inventory_cache_lock:
+        load_lock = _inventory_load_locks.setdefault(key, threading.Lock())
+    with load_lock:
+        with _inventory_cache_lock:
+            entry = _inventory_cache.get(key)
+        if entry is not None and (entry.get("pending") or entry["signature"] == signature):
+            return entry
+        entry = _new_entry(signature, read_inventory_file(path))
+        with _inventory_cache_lock:
+            _inventory_cache[key] = entry
+    return entry
+
+
+def load_inventory_cached(path):
+    # Callers edit their frame in place; a shallow copy keeps those edits out of
+    # the shared frame without duplicating its data
+    return _cached_entry(path)["df"].copy(deep=False)
+
+
+def inventory_snapshot(path):
+    # The cache entry behind one frame (snapshot["df"]). Views taken through it
+    # (get_derived(..., snapshot=...)) line up row for row with that frame, even
+    # after another session's save has replaced the cached one.
+    return _cached_entry(path)
+
+
+def inventory_version(path, snapshot=None):
+    # A frame served before its write keeps its pending version once written, so
+    # views keyed on it are not rebuilt when the file catches up
+    entry = snapshot if snapshot is not None else _cached_entry(path)
+    return entry.get("version") or entry["signature"]
+
+
+def get_derived(path, name, build, snapshot=None):
+    # Views derived from one inventory version (normalised frames, formatted
+    # tables, export bytes, aggregates) are built once and shared by every session
+    entry = snapshot if snapshot is not None else _cached_entry(path)
+    with _inventory_cache_lock:
+        derived = entry.setdefault("derived", {})
+        if name in derived:
+            return derived[name]
+    value = build(entry["df"].copy(deep=False))
+    with _inventory_cache_lock:
+        return derived.setdefault(name, value)
+
+
+def get_price_cents(path, field, snapshot=None):
+    # One money column of this version in whole cents, for filters and totals
+    return get_derived(path, f"cents:{field}", lambda frame: to_cents(frame[field]), snapshot)
+
+
+def get_barcode_index(path, snapshot=None):
+    return (snapshot if snapshot is not None else _cached_entry(path))["barcode_index"]
+
+
+def update_inventory_cache(path, df, removed_positions=(), touched_barcodes=()):
+    # Called after df has been written to path. Rather than re-reading the file,
+    # the cached frame is swapped for df and the barcode index is patched: entries
+    # shift past removed rows and only the touched barcodes are located again.
+    key = os.path.abspath(path)
+    df = df.reset_index(drop=True)
+    with _inventory_cache_lock:
+        entry = _inventory_cache.get(key)
+    if entry is None or "BARCODE" not in df.columns:
+        return _cached_entry(path)
+    index = entry["barcode_index"]
+    if len(removed_positions):
+        removed = np.sort(np.asarray(removed_positions, dtype=np.int64))
+        positions = np.fromiter(index.values(), dtype=np.int64, count=len(index))
+        index = dict(zip(index.keys(), (positions - np.searchsorted(removed, positions)).tolist()))
+    else:
+        index = dict(index)
+    touched = {b for b in touched_barcodes if b}
+    for b in touched:
+        index.pop(b, None)
+    if touched:
+        hits = df["BARCODE"][df["BARCODE"].isin(touched)]
+        hits = hits[~hits.duplicated()]
+        index.update(zip(hits.values, hits.index.tolist()))
+    entry = {"signature": file_signature(path), "df": df, "barcode_index": index}
+    with _inventory_cache_lock:
+        _inventory_cache[key] = entry
+    return entry
+
+
+def remember_pending_inventory(path, df):
+    # Serve df to every session before it reaches the file; returns the entry so
+    # the writer can mark that exact version as written afterwards
+    frame = df.reset_index(drop=True).replace("", np.nan)
+    entry = _new_entry(None, normalize_inventory_frame(frame))
+    entry["pending"] = True
+    entry["version"] = ("pending", next(_pending_versions))
+    with _inventory_cache_lock:
+        _inventory_cache[os.path.abspath(path)] = entry
+    return entry
+
+
+def mark_inventory_written(path, entry):
+    # The pending entry now matches the file; later saves will have replaced it
+    with _inventory_cache_lock:
+        if _inventory_cache.get(os.path.abspath(path)) is entry:
+            entry["signature"] = file_signature(path)
+            entry["pending"] = False
+
+
+def forget_pending_inventory(path):
+    # The queued frame will not be written; go back to reading the file
+    with _inventory_cache_lock:
+        entry = _inventory_cache.get(os.path.abspath(path))
+        if entry is not None and entry.get("pending"):
+            del _inventory_cache[os.path.abspath(path)]
+
+
+@functools.lru_cache(maxsize=1)
+def size_options():
+    return [f"{i:02d}-{j:02d}" for i in range(100) for j in range(100)]
+
+
+def generate_unique_barcode(df):
+    while True:
+        barcode_val = f"{random.randint(1, 15000):05d}"
+        barcode_val_clean = clean_barcode(barcode_val)
+        if "BARCODE" not in df.columns or barcode_val_clean not in df["BARCODE"].map(clean_barcode).values:
+            return barcode_val_clean
+
+
+def generate_framecode(supplier, df):
+    prefix = supplier[:3].upper()
+    frame_col = "FRAMENUM"
+    if frame_col not in df.columns:
+        return prefix + "000001"
+    framecodes = df[frame_col].dropna().astype(str)
+    matching = framecodes[framecodes.str.startswith(prefix)]
+    nums = matching.str[len(prefix):].str.extract(r'(\d{6})')[0].dropna()
+    if not nums.empty:
+        max_num = int(nums.max())
+        next_num = max_num + 1
+    else:
+        next_num = 1
+    return f"{prefix}{next_num:06d}"
@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from inventory_utils import clean_barcode
+from money import format_money
+from reconcile import expected_quantities
+
+# Printable sheets of Code128 labels. Barcode images are rendered in worker
+# processes one page at a time into a scratch folder, one small PNG per
+# distinct barcode, and each is embedded in the PDF once. The folder is removed
+# once the PDF has been written, since fpdf2 reads image files again at output
+# time. Works with fpdf 1.7 and fpdf2. Sizes are in millimetres.
+LABEL_LAYOUTS = {
+    "A4 - 24 per sheet (3 x 8, 70 x 37 mm)": {
+        "page": "A4", "columns": 3, "rows": 8, "label_width": 70.0, "label_height": 37.0,
+        "margin_left": 0.0, "margin_top": 0.5, "gap_x": 0.0, "gap_y": 0.0,
+    },
+    "A4 - 40 per sheet (4 x 10, 48.5 x 25.4 mm)": {
+        "page": "A4", "columns": 4, "rows": 10, "label_width": 48.5, "label_height": 25.4,
+        "margin_left": 8.0, "margin_top": 21.5, "gap_x": 0.0, "gap_y": 0.0,
+    },
+    "A4 - 65 per sheet (5 x 13, 38.1 x 21.2 mm)": {
+        "page": "A4", "columns": 5, "rows": 13, "label_width": 38.1, "label_height": 21.2,
+        "margin_left": 4.7, "margin_top": 10.7, "gap_x": 2.5, "gap_y": 0.0,
+    },
+    "Label roll (1 x 1, 50 x 25 mm)": {
+        "page": (50.0, 25.0), "columns": 1, "rows": 1, "label_width": 50.0, "label_height": 25.0,
+        "margin_left": 0.0, "margin_top": 0.0, "gap_x": 0.0, "gap_y": 0.0,
+    },
+}
+DEFAULT_LAYOUT = "A4 - 40 per sheet (4 x 10, 48.5 x 25.4 mm)"
+# Below this many labels on a page the pool costs more than it saves
+POOL_MIN_LABELS = 8
+
+
+def labels_per_page(layout):
+    return layout["columns"] * layout["rows"]
+
+
+def label_rows(df, mask, one_per_unit=False, barcode_col="BARCODE"):
+    # The selected products in inventory order, repeated QUANTITY times if asked
+    selected = df[mask]
+    selected = selected[selected[barcode_col].map(clean_barcode) != ""]
+    if one_per_unit:
+        selected = selected.loc[selected.index.repeat(expected_quantities(selected).clip(lower=1))]
+    return selected.reset_index(drop=True)
+
+
+def _latin1(text):
+    # The core PDF fonts only cover Latin-1
+    return str(text).encode("latin-1", "replace").decode("latin-1")
+
+
+def label_lines(rows, barcode_col="BARCODE"):
+    # (barcode, caption lines) per label, built column-wise
+    def column(name):
+        if name not in rows.columns:
+            return pd.Series("", index=rows.index)
+        values = rows[name].fillna("").astype(str).str.strip()
+        return values.mask(values == "nan", "")
+
+    barcodes = rows[barcode_col].map(clean_barcode)
+    title = (column("MANUFACT") + " " + column("MODEL")).str.strip()
+    detail = (column("FRAMENUM").map(clean_barcode) + "  " + column("SIZE")).str.strip()
+    price = format_money(rows["RRP"]) if "RRP" in rows.columns else pd.Series("", index=rows.index)
+    return list(zip(barcodes, zip(title, detail, price)))
+
+
+def render_barcode_png(job):
+    # Runs in a worker process: writes one PNG and returns its path (or None)
+    code, path = job
+    try:
+        import barcode
+        from barcode.writer import ImageWriter
+        CODE128 = barcode.get_barcode_class('code128')
+        with open(path, "wb") as f:
+            CODE128(code, writer=ImageWriter(mode="L", dpi=300)).write(
+                f, options={"write_text": False, "quiet_zone": 1.0, "module_height": 8.0},
+            )
+        return path
+    except Exception:
+        return None
+
+
+def _render_page(jobs, pool):
+    if pool is None or len(jobs) < POOL_MIN_LABELS:
+        return [render_barcode_png(job) for job in jobs]
+    return list(pool.map(render_barcode_png, jobs))
+
+
+def _draw_label(pdf, layout, x, y, image_path, code, lines):
+    width, height = layout["label_width"], layout["label_height"]
+    pad = min(2.0, width * 0.05)
+    text_height = min(3.2, height / 7)
+    font_size = text_height * 2.4
+    pdf.set_font("Helvetica", "B", font_size)
+    pdf.set_xy(x + pad, y + pad)
+    pdf.cell(width - 2 * pad, text_height, _latin1(lines[0]), 0, 0, "C")
+    image_top = y + pad + text_height
+    image_height = height - 2 * pad - 4 * text_height
+    if image_path:
+        pdf.image(image_path, x + pad, image_top, width - 2 * pad, max(image_height, 1.0))
+    pdf.set_font("Helvetica", "", font_size)
+    for i, text in enumerate((code, lines[1], lines[2])):
+        pdf.set_xy(x + pad, image_top + image_height + i * text_height)
+        pdf.cell(width - 2 * pad, text_height, _latin1(text), 0, 0, "C")
+
+
+def pdf_bytes(pdf):
+    # fpdf 1.7 returns the document as a latin-1 str, fpdf2 as a bytearray
+    out = pdf.output(dest="S")
+    return bytes(out) if isinstance(out, (bytes, bytearray)) else out.encode("latin-1")
+
+
+def build_label_pdf(rows, layout, start_position=1, workers=None, barcode_col="BARCODE"):
+    # Returns (pdf bytes, barcodes that could not be rendered). start_position
+    # skips labels already peeled off the first sheet.
+    from fpdf import FPDF
+
+    page_format = layout["page"]
+    pdf = FPDF(unit="mm", format=page_format)
+    pdf.set_auto_page_break(False)
+    pdf.set_margins(0, 0, 0)
+    per_page = labels_per_page(layout)
+    labels = label_lines(rows, barcode_col)
+    slot = max(0, min(start_position - 1, per_page - 1))
+    failed = []
+    scratch = tempfile.mkdtemp(prefix="labels_")
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 and len(labels) >= POOL_MIN_LABELS else None
+    try:
+        # A barcode repeated on several labels is rendered and embedded once
+        rendered = {}
+        i = 0
+        while i < len(labels):
+            page = labels[i:i + per_page - slot]
+            new_codes = list(dict.fromkeys(code for code, _ in page if code not in rendered))
+            jobs = [(code, os.path.join(scratch, f"{len(rendered) + n}.png")) for n, code in enumerate(new_codes)]
+            rendered.update(zip(new_codes, _render_page(jobs, pool)))
+            pdf.add_page()
+            for code, lines in page:
+                col, row = slot % layout["columns"], slot // layout["columns"]
+                x = layout["margin_left"] + col * (layout["label_width"] + layout["gap_x"])
+                y = layout["margin_top"] + row * (layout["label_height"] + layout["gap_y"])
+                path = rendered[code]
+                if path is None and code not in failed:
+                    failed.append(code)
+                _draw_label(pdf, layout, x, y, path, code, lines)
+                slot += 1
+            i += len(page)
+            slot = 0
+        if not labels:
+            pdf.add_page()
+        return pdf_bytes(pdf), failed
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        shutil.rmtree(scratch, ignore_errors=True)
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+from inventory_utils import clean_barcode, get_barcode_index, get_derived
+from inventory_diff import row_keys
+from money import format_money
+
+# When a scan is not a BARCODE it is often another code printed on the frame
+# or its tag: the supplier's barcode, their stock code, our FRAMENUM or the POS
+# keys. Each of these fields gets a value -> BARCODE map, built once per
+# inventory version. A value shared by products with different barcodes is
+# left out rather than guessed.
+RESOLVE_FIELDS = ["SUPBARCODE", "ISTOCKCODE", "FRAMENUM", "PKEY", "UUID"]
+# The product picker searches these by prefix, case-insensitively; MODEL also
+# matches from the start of each of its words
+SEARCH_FIELDS = ["BARCODE", "FRAMENUM", "MODEL"]
+SEARCH_LIMIT = 50
+# Product fields shown by lookup_table
+LOOKUP_COLUMNS = ["BARCODE", "FRAMENUM", "MANUFACT", "MODEL", "FCOLOUR", "SIZE", "FRAMETYPE", "QUANTITY", "RRP"]
+
+
+def build_key_index(df, barcode_col="BARCODE"):
+    index = {}
+    if barcode_col not in df.columns:
+        return index
+    barcodes = df[barcode_col].map(clean_barcode)
+    for field in RESOLVE_FIELDS:
+        if field not in df.columns:
+            continue
+        keys = pd.DataFrame({"key": df[field].map(clean_barcode), "barcode": barcodes})
+        keys = keys[(keys["key"] != "") & (keys["key"] != "nan") & (keys["barcode"] != "")].drop_duplicates()
+        ambiguous = keys["key"].duplicated(keep=False)
+        index[field] = dict(zip(keys["key"][~ambiguous], keys["barcode"][~ambiguous]))
+    return index
+
+
+def get_key_index(path, snapshot=None):
+    return get_derived(path, "key_index", build_key_index, snapshot)
+
+
+def resolve_barcode(path, cleaned, snapshot=None):
+    # (barcode, field it matched on), or (None, None) when nothing matches
+    if not cleaned:
+        return None, None
+    if cleaned in get_barcode_index(path, snapshot):
+        return cleaned, "BARCODE"
+    for field, keys in get_key_index(path, snapshot).items():
+        barcode = keys.get(cleaned)
+        if barcode is not None:
+            return barcode, field
+    return None, None
+
+
+def resolve_many(path, values, snapshot=None):
+    # One pass over a list of cleaned codes: a frame of VALUE, BARCODE, MATCHED_ON
+    values = pd.Series(list(values), dtype=object)
+    barcode_index = get_barcode_index(path, snapshot)
+    barcodes = values.where(values.isin(barcode_index.keys()))
+    matched_on = pd.Series(None, index=values.index, dtype=object).where(barcodes.isna(), "BARCODE")
+    for field, keys in get_key_index(path, snapshot).items():
+        todo = barcodes.isna()
+        if not todo.any():
+            break
+        hits = values[todo].map(keys)
+        barcodes = barcodes.fillna(hits)
+        matched_on = matched_on.where(hits.reindex(values.index).isna(), field)
+    return pd.DataFrame({"VALUE": values, "BARCODE": barcodes, "MATCHED_ON": matched_on})
+
+
+def lookup_table(path, df, values, columns=LOOKUP_COLUMNS, snapshot=None):
+    # One row per value: resolved in a single pass, product fields taken by
+    # position from df (the frame of `snapshot`, or the cached one) and prices
+    # formatted
+    resolved = resolve_many(path, values, snapshot)
+    positions = resolved["BARCODE"].map(get_barcode_index(path, snapshot))
+    found = positions.notna().to_numpy()
+    table = pd.DataFrame({
+        "SCANNED": resolved["VALUE"],
+        "STATUS": np.where(found, "Found", "Not found"),
+        "MATCHED_ON": resolved["MATCHED_ON"].fillna(""),
+    })
+    rows = df.iloc[positions[found].astype(np.int64).to_numpy()]
+    for col in columns:
+        column = pd.Series("", index=table.index, dtype=object)
+        if col in df.columns:
+            column[found] = rows[col].fillna("").astype(str).to_numpy()
+        table[col] = column.mask(column == "nan", "")
+    for col in ("BARCODE", "FRAMENUM", "QUANTITY"):
+        if col in table.columns:
+            table[col] = table[col].map(clean_barcode)
+    if "RRP" in table.columns:
+        table["RRP"] = format_money(table["RRP"]).where(found, "")
+    return table, positions[found].astype(np.int64).to_numpy()
+
+
+def _search_terms(df, field):
+    if field in ("BARCODE", "FRAMENUM"):
+        values = df[field].map(clean_barcode)
+    else:
+        values = df[field].astype(str).str.strip()
+    values = pd.Series(values.to_numpy(dtype=object), index=np.arange(len(df))).str.lower()
+    values = values[~values.isin(["", "nan", "none"])]
+    if field == "MODEL":
+        words = values.str.split().explode()
+        values = pd.concat([values, words[words != values.reindex(words.index)]])
+    return values.dropna()
+
+
+def build_prefix_index(df):
+    # Every search term sorted once, with the row key of the product it belongs
+    # to; a prefix is then the slice between two binary searches
+    keys = row_keys(df)
+    parts = [_search_terms(df, field) for field in SEARCH_FIELDS if field in df.columns]
+    terms = pd.concat(parts) if parts else pd.Series(dtype=object)
+    order = np.argsort(terms.to_numpy(dtype=str), kind="stable")
+    terms = terms.iloc[order]
+
+    def column(name):
+        return df[name].map(clean_barcode).to_numpy() if name in df.columns else np.full(len(df), "")
+
+    models = df["MODEL"].fillna("").astype(str).to_numpy() if "MODEL" in df.columns else np.full(len(df), "")
+    labels = [
+        f"{barcode} - {framenum}" + (f" - {model}" if model.strip() and model != "nan" else "")
+        for barcode, framenum, model in zip(column("BARCODE"), column("FRAMENUM"), models)
+    ]
+    return {
+        "terms": terms.to_numpy(dtype=str),
+        "keys": keys[terms.index.to_numpy()],
+        "row_keys": keys,
+        "positions": {k: i for i, k in enumerate(keys)},
+        "labels": dict(zip(keys, labels)),
+    }
+
+
+def get_prefix_index(path, snapshot=None):
+    return get_derived(path, "prefix_index", build_prefix_index, snapshot)
+
+
+def search_products(index, text, limit=SEARCH_LIMIT):
+    # Row keys of up to `limit` products with a term starting with `text`, in
+    # term order; with no text, the first products in file order
+    prefix = str(text).strip().lower()
+    if not prefix:
+        return list(index["row_keys"][:limit])
+    terms = index["terms"]
+    lo = np.searchsorted(terms, prefix, side="left")
+    hi = np.searchsorted(terms, prefix + "\U0010ffff", side="left")
+    # Terms of one product can sit close together, so look a little past `limit`
+    hits = index["keys"][lo:min(hi, lo + limit * 4)]
+    return list(dict.fromkeys(hits))[:limit]
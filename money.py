@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# Prices arrive as strings such as "$149.00", "149" or "". They are parsed
+# once into whole cents (nullable Int64) so sums, sorts, comparisons and
+# percentage changes are plain integer arithmetic. Strings like "$149.00" are
+# only produced again when a table is shown or exported.
+MONEY_FIELDS = [
+    "RRP", "EXLISTPR", "LISTPRICE", "EXCOSTPR", "COSTPRICE", "COST PRICE", "EXPREVCOST", "PREVCOST",
+    "EXAVGCOST", "AVGCOST", "DPRECOST", "DPREEXCOST", "WSALEET", "WSALEIT", "SRVCHARGE",
+    "EXLISTSRV", "LISTSRV", "EXRRPSRV", "RRPSRV",
+]
+# Unit cost, in order of preference; POS downloads often only fill EXCOSTPR
+COST_FIELDS = ["COSTPRICE", "COST PRICE", "AVGCOST", "EXCOSTPR", "EXAVGCOST"]
+# Larger amounts (and "inf") are not prices, and are not whole numbers of cents
+# once parsed as floats
+MAX_CENTS = 2 ** 53
+
+
+def to_cents(values):
+    text = pd.Series(values).astype("string").str.replace(r"[\s$,]", "", regex=True)
+    cents = (pd.to_numeric(text, errors="coerce") * 100).round()
+    return cents.where(cents.abs() < MAX_CENTS).astype("Int64")
+
+
+def format_cents(cents, symbol="$", blank="$0.00"):
+    # Vectorised "$1234.56"; missing values become `blank`
+    cents = pd.Series(cents).astype("Int64")
+    missing = cents.isna()
+    values = cents.fillna(0).astype(np.int64)
+    magnitude = values.abs()
+    text = (
+        np.where(values < 0, "-", "") + symbol
+        + (magnitude // 100).astype(str) + "." + (magnitude % 100).astype(str).str.zfill(2)
+    )
+    return text.where(~missing, blank)
+
+
+def format_cents_value(cents, symbol="$", blank="$0.00"):
+    # One amount, for labels and captions; same output as format_cents
+    if cents is None or pd.isna(cents):
+        return blank
+    cents = int(cents)
+    return f"{'-' if cents < 0 else ''}{symbol}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+def format_money(values):
+    # Column version of inventory_utils.format_rrp: unreadable prices show as $0.00
+    return format_cents(to_cents(values))
+
+
+def first_cents(df, fields):
+    # Row-wise first readable price among `fields`
+    cents = pd.Series(pd.NA, index=df.index, dtype="Int64")
+    for field in fields:
+        if field in df.columns:
+            cents = cents.fillna(to_cents(df[field]))
+    return cents
+
+
+def total_cents(cents, quantities):
+    return int((cents.fillna(0).astype(np.int64) * quantities).sum())
@@ -0,0 +1,127 @@
+import streamlit as st
+import pandas as pd
+import os
+import sys
+import time
+from datetime import date
+
+st.set_page_config(layout="wide")  # Always use wide mode
+_rerun_start = time.perf_counter()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import perf
+from perf import span
+from inventory_utils import get_derived, inventory_snapshot
+from money import format_cents
+from valuation import (
+    GROUP_FIELDS, AGEING_BASES, build_valuation_frame, value_by, ageing_by,
+)
+
+# --- Load inventory ---
+INVENTORY_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Inventory")
+inventory_files = []
+if os.path.exists(INVENTORY_FOLDER):
+    inventory_files = [
+        f for f in os.listdir(INVENTORY_FOLDER)
+        if f.lower().endswith(('.xlsx', '.csv')) and not f.startswith("archive_inventory")
+    ]
+
+if not inventory_files:
+    st.error("No inventory files found in the Inventory/ folder.")
+    st.stop()
+
+selected_file = inventory_files[0]
+if len(inventory_files) > 1:
+    selected_file = st.selectbox("Select inventory file to use:", inventory_files)
+INVENTORY_FILE = os.path.join(INVENTORY_FOLDER, selected_file)
+
+
+# Every table below is built once per inventory version and shared by every
+# session; changing a selectbox only picks a different cached result. One
+# snapshot is taken per run, so the totals, groups and ageing tables all come
+# from the same version, and each table is built from that version's
+# valuation frame.
+def valuation_frame(snapshot):
+    return get_derived(INVENTORY_FILE, "valuation_frame", build_valuation_frame, snapshot)
+
+
+def valuation_by(snapshot, field):
+    return get_derived(
+        INVENTORY_FILE, f"valuation_by_{field}", lambda frame: value_by(valuation_frame(snapshot), field), snapshot,
+    )
+
+
+def valuation_ageing(snapshot, field, basis, today):
+    return get_derived(
+        INVENTORY_FILE, f"valuation_ageing_{field}_{basis}_{today.isoformat()}",
+        lambda frame: ageing_by(valuation_frame(snapshot), field, basis, today), snapshot,
+    )
+
+
+def money_columns(table, columns):
+    shown = table.copy()
+    for col in columns:
+        shown[col] = format_cents(shown[col]).to_numpy()
+    return shown
+
+
+st.title("Stock Valuation")
+
+with span("valuation.build"):
+    snapshot = inventory_snapshot(INVENTORY_FILE)
+    frame = valuation_frame(snapshot)
+
+total_units = int(frame["UNITS"].sum())
+total_cost = int(frame["COST_CENTS"].sum())
+total_rrp = int(frame["RRP_CENTS"].sum())
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Units in stock", f"{total_units:,}")
+col2.metric("Value at cost", format_cents([total_cost]).iloc[0])
+col3.metric("Value at retail", format_cents([total_rrp]).iloc[0])
+col4.metric("Products without a cost price", f"{int(frame['UNIT_COST'].isna().sum()):,}")
+
+group_field = st.selectbox("Group by", GROUP_FIELDS, key="valuation_group_field")
+
+# --- Value by group ---
+st.subheader(f"Value by {group_field}")
+with span("valuation.group"):
+    grouped = valuation_by(snapshot, group_field)
+st.bar_chart(
+    (grouped.set_index(group_field)[["COST_CENTS", "RRP_CENTS"]] / 100)
+    .rename(columns={"COST_CENTS": "At cost", "RRP_CENTS": "At retail"})
+    .head(25)
+)
+shown = money_columns(grouped, ["COST_CENTS", "RRP_CENTS"]).rename(columns={
+    "COST_CENTS": "VALUE AT COST", "RRP_CENTS": "VALUE AT RETAIL",
+    "NO_COST": "NO COST PRICE", "MARGIN_PCT": "MARGIN %",
+})
+st.dataframe(shown, hide_index=True, width='stretch')
+st.download_button(
+    label=f"Download Value by {group_field} (CSV)",
+    data=shown.to_csv(index=False).encode('utf-8'),
+    file_name=f"stock_value_by_{group_field.lower()}.csv",
+    mime="text/csv",
+    key="valuation_csv",
+)
+
+# --- Ageing ---
+st.subheader("Stock ageing")
+basis = st.selectbox("Age stock by", list(AGEING_BASES), key="valuation_ageing_basis")
+st.caption("Days since " + ", then ".join(AGEING_BASES[basis]) + "; products with none of these dates are under 'No date'.")
+with span("valuation.ageing"):
+    ageing_value, ageing_units = valuation_ageing(snapshot, group_field, basis, date.today())
+st.bar_chart(ageing_value.sum().rename("At retail") / 100)
+ageing_shown = pd.concat(
+    [money_columns(ageing_value, ageing_value.columns), ageing_units.add_suffix(" (units)")], axis=1,
+).reset_index()
+st.dataframe(ageing_shown, hide_index=True, width='stretch')
+st.download_button(
+    label="Download Stock Ageing (CSV)",
+    data=ageing_shown.to_csv(index=False).encode('utf-8'),
+    file_name=f"stock_ageing_by_{group_field.lower()}.csv",
+    mime="text/csv",
+    key="valuation_ageing_csv",
+)
+
+perf.render_panel(st)
+perf.record("valuation.rerun", time.perf_counter() - _rerun_start)
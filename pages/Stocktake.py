@@ -1,14 +1,31 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
 import io
+import sys
+import time
 from datetime import datetime
 
 st.set_page_config(layout="wide")  # Always use wide mode
-
-# Barcode image generation
-import barcode
-from barcode.writer import ImageWriter
+_rerun_start = time.perf_counter()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import perf
+from perf import span
+from inventory_utils import clean_barcode, get_derived, get_barcode_index, get_price_cents, inventory_snapshot, inventory_version
+from money import format_cents_value
+from stocktake_utils import (
+    normalize_stocktake_inventory, format_inventory_table, ScannedIndex,
+)
+from stocktake_session import (
+    ALL_LOCATIONS, partition_label, partition_scan_file, partition_locations,
+    get_partition, get_unfound_log, reconcile_partitions,
+)
+from lookup_index import resolve_barcode, resolve_many
+from integrity import get_key_positions
+from frame_fit import render_similar_frames
+from stocktake_history import SHRINKAGE_FIELDS, seal_stocktake, list_snapshots, shrinkage
 
 # --- Custom CSS for button colors ---
 st.markdown("""
@@ -46,109 +63,23 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-def clean_barcode(val):
-    try:
-        if pd.isnull(val) or val == "":
-            return ""
-        s = str(val).strip().replace('\u200b', '').replace('\u00A0', '')
-        f = float(s)
-        s = str(int(f))
-        return s
-    except:
-        return str(val).strip()
-
-
-def force_all_columns_to_string(df):
-    for col in df.columns:
-        df[col] = df[col].astype(str)
-    return df
-
-
-def clean_nans(df):
-    return df.replace([pd.NA, 'nan'], '', regex=True)
-
-
-def format_rrp(val):
-    try:
-        f = float(str(val).replace("$", "").strip())
-        return f"${f:.2f}"
-    except Exception:
-        return "$0.00"
-
-
-def clean_for_display(df):
-    df = df.copy()
-    if "BARCODE" in df.columns:
-        df["BARCODE"] = df["BARCODE"].apply(
-            lambda x: str(int(float(x))) if pd.notnull(x)
-            and str(x).replace('.', '', 1).isdigit()
-            and float(x).is_integer() else x
-        )
-    if "QUANTITY" in df.columns:
-        df["QUANTITY"] = df["QUANTITY"].apply(
-            lambda x: str(int(float(x))) if pd.notnull(x)
-            and str(x).replace('.', '', 1).isdigit()
-            and float(x).is_integer() else x
-        )
-    df = df.replace("nan", "").replace(pd.NA, "")
-    return df
-
-
-# --- Exact header list requested ---
-VISIBLE_FIELDS = [
-    "BARCODE", "LOCATION", "LOCATION2", "PKEY", "PKEY0", "FRAMENUM", "FRAMENUM0", "SXFRAME",
-    "QUANTITY", "MANUFACT", "MODEL", "FCOLOUR", "SIZE", "FRDESC", "LOCATION3", "STKTAKE",
-    "CHANGE", "QTYAPPRO", "QTY3", "SUPBARCODE", "ISTOCKCODE", "SUPPLIER", "SUPPLIER2",
-    "FRAMETYPE", "FRAMEGROUP", "TEMPLE", "DEPTH", "DIAG", "BASECURVE", "SUNGRX", "FROTHER",
-    "FROTHER2", "REORDDATE", "REORDER", "REORDQTY", "RRP", "EXLISTPR", "LISTPRICE", "EXCOSTPR",
-    "COSTPRICE", "EXPREVCOST", "PREVCOST", "EXAVGCOST", "AVGCOST", "DPRECOST", "DPREEXCOST",
-    "WSALEET", "WSALEIT", "APPORDER", "LASTSALE2", "LASTSALE", "FIRSTPUR", "LASTPUR", "RETURNBY",
-    "DQTY", "REFRESH", "LASTINV", "DISPC", "TAXPC", "FRSTATUS", "FRSTATUS2", "QTYONORDER",
-    "QTYONAPPRO", "PHOTOEXT", "PHOTONAME", "LIFESTYLE", "LIFECYCLE", "RELEASE", "AVAILFROM",
-    "AVAILTILL", "FRANGE", "SPH1", "SPH2", "CYL1", "CYL2", "MINPD", "BASEC", "SRVCHARGE",
-    "EXLISTSRV", "LISTSRV", "EXRRPSRV", "RRPSRV", "MODKEY", "ORDERAGAIN", "PROSUPPLY",
-    "PSSUPFIT", "PSCREATED", "PSUPDATEAT", "USER", "MODIFIED", "DELFLAG", "XFER", "PROVISION",
-    "PVINACTIVE", "LOGSTR", "FGID", "SUPSTATUS", "LLABORDER", "LDOWNLOAD", "UUID", "NOTE", "PHOTO"
-]
-
-
 # --- Shared scanned/unfound CSV paths ---
 SCANNED_FILE = os.path.join(os.path.dirname(__file__), "..", "scanned_barcodes.csv")
 UNFOUND_FILE = os.path.join(os.path.dirname(__file__), "..", "unfound_barcodes.csv")
-
-
-def load_scanned_barcodes():
-    if os.path.exists(SCANNED_FILE):
-        try:
-            return pd.read_csv(SCANNED_FILE)["barcode"].astype(str).tolist()
-        except Exception:
-            return []
-    return []
-
-
-def save_scanned_barcodes(barcodes):
-    pd.DataFrame({"barcode": barcodes}).to_csv(SCANNED_FILE, index=False)
-
-
-def load_unfound_barcodes():
-    if os.path.exists(UNFOUND_FILE):
-        return pd.read_csv(UNFOUND_FILE, dtype={"barcode": str})
-    return pd.DataFrame(columns=["barcode", "timestamp"])
-
-
-def save_unfound_barcodes(df):
-    df.to_csv(UNFOUND_FILE, index=False)
-
-
-def empty_unfound_barcodes():
-    pd.DataFrame(columns=["barcode", "timestamp"]).to_csv(UNFOUND_FILE, index=False)
+# Per-location scan logs when the stocktake is scoped to locations
+SESSION_FOLDER = os.path.join(os.path.dirname(__file__), "..", "stocktake_sessions")
+# Sealed snapshots of completed stocktakes
+HISTORY_FOLDER = os.path.join(SESSION_FOLDER, "history")
 
 
 # --- Load inventory ---
 INVENTORY_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Inventory")
 inventory_files = []
 if os.path.exists(INVENTORY_FOLDER):
-    inventory_files = [f for f in os.listdir(INVENTORY_FOLDER) if f.lower().endswith(('.xlsx', '.csv'))]
+    inventory_files = [
+        f for f in os.listdir(INVENTORY_FOLDER)
+        if f.lower().endswith(('.xlsx', '.csv')) and not f.startswith("archive_inventory")
+    ]
 
 if not inventory_files:
     st.error("No inventory files found in the Inventory/ folder.")
@@ -160,42 +91,82 @@ if len(inventory_files) > 1:
 INVENTORY_FILE = os.path.join(INVENTORY_FOLDER, selected_file)
 
 
+def build_stocktake_frame(frame):
+    return normalize_stocktake_inventory(frame) if "BARCODE" in frame.columns else frame
+
+
 def load_inventory():
+    # df_snapshot is the cache entry behind the frame, so the barcode index,
+    # partitions and formatted table below all come from the same version
+    global df_snapshot
     if os.path.exists(INVENTORY_FILE):
-        if INVENTORY_FILE.lower().endswith('.xlsx'):
-            df = pd.read_excel(INVENTORY_FILE)
-        elif INVENTORY_FILE.lower().endswith('.csv'):
-            df = pd.read_csv(INVENTORY_FILE)
-        else:
+        if not INVENTORY_FILE.lower().endswith(('.xlsx', '.csv')):
             st.error("Unsupported inventory file type.")
             st.stop()
-        df = force_all_columns_to_string(df)
-        return df
+        # One normalised frame per inventory version, shared by every session
+        df_snapshot = inventory_snapshot(INVENTORY_FILE)
+        return get_derived(INVENTORY_FILE, "stocktake_frame", build_stocktake_frame, df_snapshot)
     else:
         st.error(f"Inventory file '{INVENTORY_FILE}' not found.")
         st.stop()
 
 
-df = load_inventory()
+with span("stocktake.load_inventory"):
+    df = load_inventory()
 barcode_col = "BARCODE"
 if barcode_col not in df.columns:
     st.error(f"No {barcode_col} column found in your inventory file!")
     st.stop()
 
-# Normalize some common alternate names (extend as needed)
-COLUMN_NAME_MAP = {
-    "F GROUP": "FRAMEGROUP",
-    "COST PRICE": "COSTPRICE",
-}
-df = df.rename(columns={k: v for k, v in COLUMN_NAME_MAP.items() if k in df.columns})
-
-# Ensure barcode column cleaned to string representation
-df[barcode_col] = df[barcode_col].map(clean_barcode).astype(str)
+barcode_index = get_barcode_index(INVENTORY_FILE, df_snapshot)
 
 st.title("Stocktake - Scan Barcodes")
 
-# --- Load scanned barcodes and session defaults ---
-scanned_barcodes = load_scanned_barcodes()
+# --- Stocktake scope: whole clinic, or one partition per location ---
+scope = st.multiselect(
+    "Count locations (leave empty for the whole clinic)",
+    partition_locations(df),
+    key="stocktake_scope",
+)
+locations = scope or [ALL_LOCATIONS]
+inventory_key = (os.path.abspath(INVENTORY_FILE), inventory_version(INVENTORY_FILE, df_snapshot))
+with span("stocktake.partitions"):
+    partitions = {
+        loc: get_partition(inventory_key, df, loc, partition_scan_file(SESSION_FOLDER, loc, SCANNED_FILE), barcode_col, scope=locations)
+        for loc in locations
+    }
+active_location = locations[0]
+if len(locations) > 1:
+    active_location = st.selectbox("Counting in", locations, format_func=partition_label, key="stocktake_active_location")
+active_partition = partitions[active_location]
+# The scans so far, indexed once per session and then kept up to date scan by
+# scan (and on removals) instead of being re-derived from the logs each rerun
+scanned_index_key = (inventory_key, tuple(locations))
+scanned_state = st.session_state.get("scanned_index")
+if scanned_state is None or scanned_state[0] != scanned_index_key:
+    rows_by_barcode = get_key_positions(INVENTORY_FILE, df_snapshot).get(barcode_col, {})
+    scanned_state = (scanned_index_key, ScannedIndex(df, barcode_col, rows_by_barcode))
+    st.session_state["scanned_index"] = scanned_state
+scanned_index = scanned_state[1]
+with span("stocktake.scanned_index_sync"):
+    scanned_index.sync(partitions)
+unfound_log = get_unfound_log(UNFOUND_FILE)
+
+# --- Progress per partition (kept up to date scan by scan) ---
+for loc, partition in partitions.items():
+    prog = partition.progress()
+    fraction = prog["counted_units"] / prog["expected_units"] if prog["expected_units"] else 0.0
+    st.progress(
+        min(fraction, 1.0),
+        text=(
+            f"{prog['location']}: {prog['counted_units']} / {prog['expected_units']} units · "
+            f"{format_cents_value(partition.counted_cents)} / {format_cents_value(partition.expected_cents)} · "
+            f"{prog['missing_products']} products not yet seen · "
+            f"{prog['unexpected_scans']} unexpected scans"
+        ),
+    )
+
+# --- Session defaults ---
 
 if "last_unfound_barcode" not in st.session_state:
     st.session_state["last_unfound_barcode"] = None
@@ -209,50 +180,27 @@ if "confirm_clear_unfound_barcodes" not in st.session_state:
 if "pending_duplicate" not in st.session_state:
     st.session_state["pending_duplicate"] = None
 
-# IDENTIFYING FIELDS used to detect same product (adjust as needed)
-IDENTIFYING_FIELDS = ["FRAMENUM", "MODEL", "MANUFACT", "SIZE", "FCOLOUR", "FRAMETYPE"]
-
-
 # --- Scan input using a form (clears on submit) ---
 with st.form("stocktake_scan_form", clear_on_submit=True):
     scanned_barcode = st.text_input("Scan or enter barcode", key="stocktake_scan_input")
     submit = st.form_submit_button("Add Scanned Barcode")
     if submit:
         cleaned = clean_barcode(scanned_barcode)
+        if cleaned and cleaned not in barcode_index:
+            # Not a BARCODE: try the supplier barcode, stock code, FRAMENUM and POS keys
+            with span("stocktake.resolve_scan"):
+                resolved, matched_on = resolve_barcode(INVENTORY_FILE, cleaned, df_snapshot)
+            if resolved is not None:
+                st.info(f"{matched_on} {cleaned} matched barcode {resolved}.")
+                cleaned = resolved
         if cleaned == "":
             st.warning("Please scan or enter a barcode.")
             st.session_state["last_unfound_barcode"] = None
             st.session_state["pending_duplicate"] = None
-        elif cleaned in df[barcode_col].values:
-            # Build signature for the newly scanned inventory row
-            product_row = df[df[barcode_col] == cleaned].iloc[0]
-
-            def make_signature(row):
-                return tuple(str(row.get(f, "")).strip() for f in IDENTIFYING_FIELDS)
-
-            new_sig = make_signature(product_row)
-
-            # Build signatures for already scanned products (only those with barcodes present in inventory)
-            scanned_sigs = {}
-            for b in scanned_barcodes:
-                if b in df[barcode_col].values:
-                    r = df[df[barcode_col] == b].iloc[0]
-                    scanned_sigs[b] = make_signature(r)
-
-            # Find a matching scanned barcode by signature if any
-            duplicate_found = False
-            matching_b = None
-            for b, sig in scanned_sigs.items():
-                if sig == new_sig:
-                    duplicate_found = True
-                    matching_b = b
-                    break
-
-            # If the exact barcode string is already present, treat as duplicate too
-            if cleaned in scanned_barcodes:
-                duplicate_found = True
-                if matching_b is None:
-                    matching_b = cleaned
+        elif cleaned in barcode_index:
+            with span("stocktake.scan_lookup"):
+                matching_b, new_sig = scanned_index.find_duplicate(cleaned)
+            duplicate_found = matching_b is not None
 
             if duplicate_found:
                 # Store pending duplicate so confirmation UI can render outside the form
@@ -264,8 +212,7 @@ with st.form("stocktake_scan_form", clear_on_submit=True):
                 st.warning("Product already scanned or a product with the same framecode/details exists among scanned items. Confirm below to increment quantity.")
             else:
                 # Normal add (no duplicate)
-                scanned_barcodes.append(str(cleaned))
-                save_scanned_barcodes(scanned_barcodes)
+                active_partition.add_scan(str(cleaned))
                 st.success(f"Added barcode: {cleaned}")
                 st.session_state["last_unfound_barcode"] = None
                 st.session_state["last_success_barcode"] = cleaned
@@ -288,8 +235,8 @@ if st.session_state.get("pending_duplicate"):
     st.markdown("### Duplicate product detected")
     # Render a compact table preview for clarity (replaces raw dict/json view)
     try:
-        new_row = df[df[barcode_col] == pending_barcode].iloc[0]
-        existing_row = df[df[barcode_col] == matching_barcode].iloc[0] if matching_barcode in df[barcode_col].values else None
+        new_row = df.iloc[barcode_index[pending_barcode]]
+        existing_row = df.iloc[barcode_index[matching_barcode]] if matching_barcode in barcode_index else None
         col_new, col_existing = st.columns([1, 1])
         with col_new:
             st.markdown("**New scan**")
@@ -322,8 +269,7 @@ if st.session_state.get("pending_duplicate"):
     c1, c2 = st.columns([1, 1])
     with c1:
         if st.button("Add anyway (increment quantity)", key=f"confirm_force_add_{pending_barcode}"):
-            scanned_barcodes.append(str(pending_barcode))
-            save_scanned_barcodes(scanned_barcodes)
+            active_partition.add_scan(str(pending_barcode))
             st.success(f"Added barcode: {pending_barcode} — quantity incremented for the matching product.")
             st.session_state["last_success_barcode"] = pending_barcode
             st.session_state["pending_duplicate"] = None
@@ -344,22 +290,26 @@ if st.session_state.get("pending_duplicate"):
 # --- Show details for last successful barcode scanned (persists after rerun, compact layout) ---
 if st.session_state.get("last_success_barcode"):
     last_barcode = st.session_state["last_success_barcode"]
-    if last_barcode in df[barcode_col].values:
-        product_row = df[df[barcode_col] == last_barcode].iloc[0]
+    if last_barcode in barcode_index:
+        product_row = df.iloc[barcode_index[last_barcode]]
+        rrp_cents = get_price_cents(INVENTORY_FILE, "RRP", df_snapshot).iloc[barcode_index[last_barcode]] if "RRP" in df.columns else None
         framecode = product_row.get("FRAMENUM", "N/A")
         model = product_row.get("MODEL", "N/A")
         manufact = product_row.get("MANUFACT", "N/A")
         colour = product_row.get("FCOLOUR", "N/A")
         frametype = product_row.get("FRAMETYPE", "N/A")
         size = product_row.get("SIZE", "N/A")
-        rrp = product_row.get("RRP", "N/A")
         img_col, details_col = st.columns([1, 3])
         with img_col:
             try:
+                # Imported on first use so PIL isn't loaded before the page first draws
+                import barcode
+                from barcode.writer import ImageWriter
                 CODE128 = barcode.get_barcode_class('code128')
-                barcode_img = CODE128(str(last_barcode), writer=ImageWriter())
-                buffer = io.BytesIO()
-                barcode_img.write(buffer)
+                with span("stocktake.barcode_image"):
+                    barcode_img = CODE128(str(last_barcode), writer=ImageWriter())
+                    buffer = io.BytesIO()
+                    barcode_img.write(buffer)
                 buffer.seek(0)
                 st.image(buffer, caption="", width=120)
             except Exception:
@@ -374,7 +324,7 @@ if st.session_state.get("last_success_barcode"):
                 f"<b>Colour:</b> {colour} &nbsp; | &nbsp; "
                 f"<b>Frametype:</b> {frametype} &nbsp; | &nbsp; "
                 f"<b>Size:</b> {size} &nbsp; | &nbsp; "
-                f"<b>RRP:</b> {rrp}"
+                f"<b>RRP:</b> {format_cents_value(rrp_cents)}"
                 f"</div>", unsafe_allow_html=True
             )
     else:
@@ -385,11 +335,7 @@ if st.session_state.get("last_success_barcode"):
 if st.session_state.get("last_unfound_barcode", None):
     cleaned = st.session_state["last_unfound_barcode"]
     if st.button("Add to Unfound Barcodes Table", key=f"add_unfound_{cleaned}"):
-        unfound_df = load_unfound_barcodes()
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        new_row = pd.DataFrame([{"barcode": cleaned, "timestamp": now}])
-        unfound_df = pd.concat([unfound_df, new_row], ignore_index=True)
-        save_unfound_barcodes(unfound_df)
+        unfound_log.add(cleaned, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
         st.success(f"Barcode {cleaned} added to unfound table.")
         st.session_state["last_unfound_barcode"] = None
         if hasattr(st, "rerun"):
@@ -398,6 +344,20 @@ if st.session_state.get("last_unfound_barcode", None):
             st.experimental_rerun()
 
 
+# --- Frames with a similar fit to a scanned one ---
+with st.expander("🔎 Frames Like This One"):
+    fit_barcode = clean_barcode(st.text_input(
+        "Barcode (or another product code)", key="stocktake_fit_barcode",
+        placeholder=st.session_state.get("last_success_barcode") or "",
+    )) or clean_barcode(st.session_state.get("last_success_barcode") or "")
+    if fit_barcode and fit_barcode not in barcode_index:
+        fit_barcode = resolve_barcode(INVENTORY_FILE, fit_barcode, df_snapshot)[0] or fit_barcode
+    if fit_barcode:
+        render_similar_frames(st, INVENTORY_FILE, fit_barcode, "stocktake_fit", df_snapshot)
+    else:
+        st.caption("Scan a frame or enter its barcode to see in-stock frames with a similar fit.")
+
+
 # --- Empty Table Functionality with Confirmation Prompt for scanned barcodes ---
 st.markdown("#### Manage Scanned Products Table")
 clear_col, prompt_col = st.columns([1, 6], gap="small")
@@ -407,12 +367,17 @@ with clear_col:
 
 if st.session_state.get("confirm_clear_scanned_barcodes", False):
     with prompt_col:
-        st.warning("Are you sure you want to **empty the scanned products table**? This cannot be undone.")
+        st.warning(f"Are you sure you want to **empty the scanned products table** for {', '.join(partition_label(loc) for loc in locations)}? This cannot be undone.")
+        seal_first = st.checkbox("Save this count to the stocktake history first", value=True, key="seal_before_empty")
         yes_col, no_col = st.columns([1, 1])
         with yes_col:
             if st.button("Yes, Empty Table", key="confirm_empty_scanned_btn"):
-                scanned_barcodes = []
-                save_scanned_barcodes(scanned_barcodes)
+                if seal_first and any(p.log.barcodes for p in partitions.values()):
+                    with span("stocktake.seal_snapshot"):
+                        sealed = seal_stocktake(HISTORY_FOLDER, df, list(partitions.values()), INVENTORY_FILE, inventory_key[1], barcode_col)
+                    st.session_state["sealed_snapshot_message"] = f"Count saved to the stocktake history as {sealed['id']}."
+                for partition in partitions.values():
+                    partition.clear()
                 st.session_state["confirm_clear_scanned_barcodes"] = False
                 st.success("Scanned products table emptied.")
                 if hasattr(st, "rerun"):
@@ -424,105 +389,133 @@ if st.session_state.get("confirm_clear_scanned_barcodes", False):
                 st.session_state["confirm_clear_scanned_barcodes"] = False
 
 
+if st.session_state.get("sealed_snapshot_message"):
+    st.success(st.session_state.pop("sealed_snapshot_message"))
+
+
+# --- Sealed stocktakes: shrinkage across past counts ---
+with st.expander("📚 Stocktake History"):
+    snapshots = list_snapshots(HISTORY_FOLDER)
+    if not snapshots:
+        st.caption("No counts saved yet. A count is saved here when the scanned products table is emptied.")
+    else:
+        st.dataframe(pd.DataFrame([{
+            "SEALED_AT": s["sealed_at"],
+            "LOCATIONS": ", ".join(s["partitions"]),
+            "SCANS": s["scans"],
+            "EXPECTED_UNITS": s["expected_units"],
+            "COUNTED_UNITS": s["counted_units"],
+            "SHORT_UNITS": s["short_units"],
+            "SHORT_VALUE": format_cents_value(s["short_cents"]),
+        } for s in reversed(snapshots)]), width='stretch', hide_index=True)
+        history_cols = st.columns(4)
+        history_by = history_cols[0].selectbox("Shrinkage by", SHRINKAGE_FIELDS, key="history_by")
+        history_last = history_cols[1].number_input(
+            "Last N counts (0 = all)", min_value=0, value=0, key="history_last",
+        )
+        history_manufacturers = history_cols[2].multiselect(
+            "Manufacturers", sorted({m for s in snapshots for m in s.get("manufact", [])}), key="history_manufact",
+        )
+        history_prefix = history_cols[3].text_input("FRAMENUM starts with", key="history_framenum_prefix").strip()
+        with span("stocktake.history_query"):
+            history_table = shrinkage(
+                HISTORY_FOLDER, history_by, int(history_last) or None, history_manufacturers, history_prefix or None,
+            )
+        if history_table.empty:
+            st.info("No shrinkage in these counts.")
+        else:
+            st.dataframe(history_table, width='stretch', hide_index=True)
+            st.download_button(
+                label="Download Shrinkage (CSV)",
+                data=history_table.to_csv(index=False).encode('utf-8'),
+                file_name=f"stocktake_shrinkage_by_{history_by.lower()}.csv",
+                mime="text/csv",
+                key="history_csv",
+            )
+
+
 # --- Optional: Show missing items ---
-def format_inventory_table(input_df):
-    df_disp = input_df.copy()
-    # Ensure all columns exist, and cast to string
-    for col in df_disp.columns:
-        df_disp[col] = df_disp[col].astype(str)
-    if "BARCODE" in df_disp.columns:
-        df_disp["BARCODE"] = df_disp["BARCODE"].map(clean_barcode)
-    if "RRP" in df_disp.columns:
-        df_disp["RRP"] = df_disp["RRP"].apply(format_rrp).astype(str)
-    # Reindex to the exact VISIBLE_FIELDS order, creating missing columns with empty strings
-    df_disp = df_disp.reindex(columns=VISIBLE_FIELDS).fillna("").replace("nan", "").replace(pd.NA, "")
-    return df_disp
+def table_download(cache, fmt, name):
+    # Export bytes are only built when a download button is pressed, once per table
+    if fmt not in cache:
+        with span(f"stocktake.{name}_{fmt}_export"):
+            if fmt == "excel":
+                buffer = io.BytesIO()
+                cache["table"].to_excel(buffer, index=False)
+                cache[fmt] = buffer.getvalue()
+            else:
+                cache[fmt] = cache["table"].to_csv(index=False).encode('utf-8')
+    return cache[fmt]
 
 
 if st.checkbox("Show missing products (in inventory but not scanned)"):
-    missing_df = df[~df[barcode_col].isin(scanned_barcodes)]
+    # Each partition keeps its missing set up to date scan by scan, and the rows
+    # are taken from a table formatted once per inventory version. A scan only
+    # re-selects rows; the CSV and Excel files are built when downloaded.
+    missing_key = (inventory_key, tuple((loc, id(p), p.version) for loc, p in partitions.items()))
+    cached_missing = st.session_state.get("missing_table_cache")
+    if cached_missing is None or cached_missing["key"] != missing_key:
+        with span("stocktake.missing_table_build"):
+            formatted_inventory = get_derived(
+                INVENTORY_FILE, "stocktake_formatted",
+                lambda frame: format_inventory_table(build_stocktake_frame(frame)), df_snapshot,
+            )
+            missing_labels = partitions[locations[0]].missing_rows()
+            for partition in list(partitions.values())[1:]:
+                missing_labels = np.union1d(missing_labels, partition.missing_rows())
+            cached_missing = {"key": missing_key, "table": formatted_inventory.loc[missing_labels]}
+        st.session_state["missing_table_cache"] = cached_missing
+    missing_table = cached_missing["table"]
     st.markdown("### Missing Products")
-    st.dataframe(format_inventory_table(missing_df), width='stretch')
-    if not missing_df.empty:
+    with span("stocktake.missing_table_render"):
+        st.dataframe(missing_table, width='stretch')
+    if not missing_table.empty:
         st.download_button(
             label="Download Missing Table (CSV)",
-            data=format_inventory_table(missing_df).to_csv(index=False).encode('utf-8'),
+            data=lambda cache=cached_missing: table_download(cache, "csv", "missing"),
             file_name="stocktake_missing.csv",
             mime="text/csv"
         )
-        excel_buffer_missing = io.BytesIO()
-        format_inventory_table(missing_df).to_excel(excel_buffer_missing, index=False)
-        excel_buffer_missing.seek(0)
         st.download_button(
             label="Download Missing Table (Excel)",
-            data=excel_buffer_missing,
+            data=lambda cache=cached_missing: table_download(cache, "excel", "missing"),
             file_name="stocktake_missing.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
 
 
 # --- Table of scanned products as ONE table, most recent scan on top ---
-ordered_barcodes = list(reversed(scanned_barcodes))
-present_barcodes = [b for b in ordered_barcodes if b in df[barcode_col].values]
-scanned_df = df[df[barcode_col].isin(present_barcodes)].copy()
+with span("stocktake.scanned_table_build"):
+    scanned_df, display_df = scanned_index.table()
 
 if not scanned_df.empty:
-    # Preserve the scanning order by assigning an order index
-    scanned_df = scanned_df.assign(
-        __order=scanned_df[barcode_col].apply(lambda x: present_barcodes.index(x))
-    ).sort_values('__order').drop(columns='__order')
-
-    # Compute scanned-counts per identifying signature (we use FRAMENUM as main key; fallback to BARCODE)
-    def get_key_for_row(row):
-        val = str(row.get("FRAMENUM", "")).strip()
-        return val if val != "" else str(row.get(barcode_col, "")).strip()
-
-    # Count how many scanned barcodes map to each key
-    key_counts = {}
-    for b in scanned_barcodes:
-        if b in df[barcode_col].values:
-            row = df[df[barcode_col] == b].iloc[0]
-            k = get_key_for_row(row)
-            key_counts[k] = key_counts.get(k, 0) + 1
-
-    # Prepare display dataframe and inject computed QUANTITY
-    display_df = clean_for_display(scanned_df)
-    display_df = display_df.reindex(columns=VISIBLE_FIELDS).fillna("").replace("nan", "").replace(pd.NA, "")
-
-    if "QUANTITY" in display_df.columns:
-        computed_qtys = []
-        for _, r in scanned_df.iterrows():
-            k = get_key_for_row(r)
-            computed_qtys.append(str(key_counts.get(k, r.get("QUANTITY", ""))))
-        display_df["QUANTITY"] = computed_qtys
-
     st.markdown("### Scanned Products Table")
-    st.dataframe(display_df, width='stretch', hide_index=True)
+    with span("stocktake.scanned_table_render"):
+        st.dataframe(display_df, width='stretch', hide_index=True)
 
     # Remove functionality: select barcode and remove with button
     remove_options = display_df["BARCODE"].tolist()
     if remove_options:
         remove_barcode = st.selectbox("Select a barcode to remove", remove_options)
         if st.button("Remove Selected"):
-            scanned_barcodes = [b for b in scanned_barcodes if b != remove_barcode]
-            save_scanned_barcodes(scanned_barcodes)
+            scanned_index.remove(remove_barcode)
+            for partition in partitions.values():
+                partition.remove_barcode(remove_barcode)
             if hasattr(st, "rerun"):
                 st.rerun()
             elif hasattr(st, "experimental_rerun"):
                 st.experimental_rerun()
 
+    # Formatted and exported only when downloaded, like the missing table
     st.download_button(
         label="Download Scanned Table (CSV)",
-        data=format_inventory_table(scanned_df).to_csv(index=False).encode('utf-8'),
+        data=lambda frame=scanned_df: table_download({"table": format_inventory_table(frame)}, "csv", "scanned"),
         file_name="stocktake_scanned.csv",
         mime="text/csv"
     )
-    excel_buffer = io.BytesIO()
-    format_inventory_table(scanned_df).to_excel(excel_buffer, index=False)
-    excel_buffer.seek(0)
     st.download_button(
         label="Download Scanned Table (Excel)",
-        data=excel_buffer,
+        data=lambda frame=scanned_df: table_download({"table": format_inventory_table(frame)}, "excel", "scanned"),
         file_name="stocktake_scanned.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
@@ -530,6 +523,27 @@ else:
     st.info("No scanned products to display.")
 
 
+# --- Reconcile every partition in scope in parallel and merge the reports ---
+if st.button("Reconcile partitions", key="reconcile_partitions_btn"):
+    with span("stocktake.reconcile_partitions"):
+        st.session_state["partition_reports"] = reconcile_partitions(df, list(partitions.values()), barcode_col)
+
+if st.session_state.get("partition_reports"):
+    reports = st.session_state["partition_reports"]
+    st.markdown("### Partition Reconciliation")
+    st.dataframe(reports["summary"], width='stretch', hide_index=True)
+    report_cols = st.columns(4)
+    for col, name in zip(report_cols, ["matched", "missing", "unexpected", "variance"]):
+        with col:
+            st.download_button(
+                label=f"Download {name.title()} ({len(reports[name])})",
+                data=reports[name].to_csv(index=False).encode('utf-8'),
+                file_name=f"stocktake_{name}.csv",
+                mime="text/csv",
+                key=f"download_partition_{name}",
+            )
+
+
 # --- Unfound Barcodes Table at the Bottom w/ empty functionality ---
 st.markdown("### Unfound Barcodes Table")
 
@@ -545,7 +559,7 @@ if st.session_state.get("confirm_clear_unfound_barcodes", False):
         yes_unfound_col, no_unfound_col = st.columns([1, 1])
         with yes_unfound_col:
             if st.button("Yes, Empty Unfound Table", key="confirm_empty_unfound_btn"):
-                empty_unfound_barcodes()
+                unfound_log.clear()
                 st.session_state["confirm_clear_unfound_barcodes"] = False
                 st.success("Unfound barcodes table emptied.")
                 if hasattr(st, "rerun"):
@@ -556,10 +570,32 @@ if st.session_state.get("confirm_clear_unfound_barcodes", False):
             if st.button("Cancel", key="cancel_empty_unfound_btn"):
                 st.session_state["confirm_clear_unfound_barcodes"] = False
 
-unfound_df = load_unfound_barcodes()
+unfound_df = unfound_log.table()
 if not unfound_df.empty:
-    unfound_df = unfound_df[::-1]  # Show most recent first
+    # The backlog is re-resolved in one pass only when the inventory or the log changes
+    resolution_key = (inventory_key, unfound_log.version())
+    cached_resolution = st.session_state.get("unfound_resolution")
+    if cached_resolution is None or cached_resolution[0] != resolution_key:
+        with span("stocktake.resolve_unfound"):
+            resolution = resolve_many(INVENTORY_FILE, unfound_df["barcode"], df_snapshot)
+        st.session_state["unfound_resolution"] = (resolution_key, resolution)
+    else:
+        resolution = cached_resolution[1]
+    unfound_df["now_matches"] = resolution["BARCODE"].fillna("").to_numpy()
+    unfound_df["matched_on"] = resolution["MATCHED_ON"].fillna("").to_numpy()
     st.dataframe(unfound_df, width='stretch', hide_index=True)
+    resolved_df = unfound_df[unfound_df["now_matches"] != ""]
+    if not resolved_df.empty:
+        st.info(f"{len(resolved_df)} unfound barcodes now match products in the inventory.")
+        if st.button(f"Count {int(resolved_df['count'].sum())} resolved scans in {partition_label(active_location)}", key="count_resolved_unfound_btn"):
+            for barcode, count in zip(resolved_df["now_matches"], resolved_df["count"]):
+                for _ in range(int(count)):
+                    active_partition.add_scan(str(barcode))
+            unfound_log.remove(resolved_df["barcode"])
+            if hasattr(st, "rerun"):
+                st.rerun()
+            elif hasattr(st, "experimental_rerun"):
+                st.experimental_rerun()
     st.download_button(
         label="Download Unfound Table (CSV)",
         data=unfound_df.to_csv(index=False).encode('utf-8'),
@@ -568,3 +604,6 @@ if not unfound_df.empty:
     )
 else:
     st.info("No unfound barcodes yet.")
+
+perf.render_panel(st)
+perf.record("stocktake.rerun", time.perf_counter() - _rerun_start)
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+# Lightweight timing spans shared by the Streamlit pages and barcode_server.py.
+# Collection is off unless INVENTORY_PERF=1 or someone starts it from the
+# sidebar panel; while off, span() hands back one shared no-op object and
+# records nothing.
+RING_SIZE = 500
+logger = logging.getLogger("inventory.perf")
+
+_enabled = os.environ.get("INVENTORY_PERF", "") == "1"
+_lock = threading.Lock()
+_spans = {}
+_handler_added = False
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def _ensure_log_handler():
+    global _handler_added
+    if _handler_added or logger.handlers:
+        return
+    log_path = os.environ.get("INVENTORY_PERF_LOG")
+    handler = logging.FileHandler(log_path) if log_path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    _handler_added = True
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(value):
+    global _enabled
+    _enabled = bool(value)
+    if _enabled:
+        _ensure_log_handler()
+
+
+if _enabled:
+    _ensure_log_handler()
+
+
+def span(name):
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def record(name, seconds):
+    if not _enabled:
+        return
+    with _lock:
+        buf = _spans.get(name)
+        if buf is None:
+            buf = _spans[name] = deque(maxlen=RING_SIZE)
+        buf.append(seconds)
+    logger.info(json.dumps({"ts": round(time.time(), 3), "span": name, "ms": round(seconds * 1000, 3)}))
+
+
+def _percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, int(round(pct / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+
+def stats():
+    with _lock:
+        snapshot = {name: list(buf) for name, buf in _spans.items()}
+    rows = []
+    for name, values in sorted(snapshot.items()):
+        ordered = sorted(values)
+        rows.append({
+            "span": name,
+            "count": len(values),
+            "last_ms": round(values[-1] * 1000, 2),
+            "p50_ms": round(_percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(_percentile(ordered, 95) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        })
+    return rows
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+
+
+def render_panel(st):
+    # Opt-in sidebar panel. Showing it is per session; collection is for the
+    # whole process and only changes when a start/stop button is pressed.
+    if not st.sidebar.checkbox("⏱ Performance panel", key="perf_panel_enabled"):
+        return
+    if not _enabled:
+        st.sidebar.caption("Timing is off for every session.")
+        if st.sidebar.button("Start collecting timings", key="perf_start_btn"):
+            set_enabled(True)
+            st.rerun()
+        return
+    rows = stats()
+    if rows:
+        st.sidebar.dataframe(rows, hide_index=True)
+    else:
+        st.sidebar.caption("No timings yet; interact with the page to collect some.")
+    reset_col, stop_col = st.sidebar.columns(2)
+    if reset_col.button("Reset timings", key="perf_reset_btn"):
+        reset()
+    if stop_col.button("Stop collecting", key="perf_stop_btn"):
+        set_enabled(False)
+        st.rerun()
@@ -0,0 +1,204 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from inventory_utils import clean_barcode, read_inventory_file
+
+# Headless stock reconciliation: no Streamlit import, so it can run from cron
+# or a terminal against files in Inventory/ and exported scan logs.
+REPORTS = ["matched", "missing", "unexpected", "variance"]
+REPORT_COLUMNS = ["PARTITION", "BARCODE", "FRAMENUM", "MANUFACT", "MODEL", "SIZE", "FCOLOUR",
+                  "LOCATION", "EXPECTED", "COUNTED", "VARIANCE", "RRP"]
+# Partition of the scans whose barcode is in none of the inventory files
+NO_INVENTORY = "(not in any inventory)"
+
+
+def read_scan_log(path):
+    # Returns a frame with a cleaned "barcode" column and, if the log has one, "location"
+    lower = path.lower()
+    if lower.endswith(".xlsx"):
+        log = pd.read_excel(path, dtype=str)
+    elif lower.endswith(".txt"):
+        log = pd.read_csv(path, dtype=str, header=None, names=["barcode"])
+    else:
+        log = pd.read_csv(path, dtype=str)
+    barcode_cols = [c for c in log.columns if "barcode" in str(c).lower()]
+    location_cols = [c for c in log.columns if str(c).strip().lower() == "location"]
+    scans = pd.DataFrame({"barcode": log[barcode_cols[0] if barcode_cols else log.columns[0]].map(clean_barcode)})
+    if location_cols:
+        scans["location"] = log[location_cols[0]].fillna("").astype(str).str.strip()
+    return scans[scans["barcode"] != ""]
+
+
+def expected_quantities(inventory):
+    # A blank or unreadable QUANTITY still means the frame is expected on the shelf
+    if "QUANTITY" not in inventory.columns:
+        return pd.Series(1, index=inventory.index)
+    return pd.to_numeric(inventory["QUANTITY"], errors="coerce").fillna(1).clip(lower=0).astype(int)
+
+
+def reconcile_inventory(inventory, scan_counts, partition="", barcode_col="BARCODE"):
+    # scan_counts: Series of scan counts indexed by cleaned barcode
+    inventory = inventory.copy()
+    barcodes = inventory[barcode_col].map(clean_barcode)
+    inventory[barcode_col] = barcodes
+    expected = expected_quantities(inventory)
+    # Rows sharing a barcode share its scans: they fill the rows in file order up
+    # to each row's EXPECTED, and the last row takes any surplus
+    scanned = barcodes.map(scan_counts).fillna(0).astype(int)
+    counted = (scanned - (expected.groupby(barcodes).cumsum() - expected)).clip(lower=0)
+    last_row = ~barcodes.duplicated(keep="last")
+    inventory["EXPECTED"] = expected
+    inventory["COUNTED"] = counted.where(last_row, np.minimum(counted, expected))
+    inventory["VARIANCE"] = inventory["COUNTED"] - inventory["EXPECTED"]
+    inventory["PARTITION"] = partition
+
+    unexpected_counts = scan_counts[~scan_counts.index.isin(set(inventory[barcode_col]))]
+    unexpected = pd.DataFrame({
+        "PARTITION": partition,
+        barcode_col: unexpected_counts.index.astype(str),
+        "COUNTED": unexpected_counts.values.astype(int),
+    })
+    columns = [c for c in REPORT_COLUMNS if c in inventory.columns]
+    return {
+        "matched": inventory.loc[inventory["COUNTED"] > 0, columns],
+        "missing": inventory.loc[inventory["COUNTED"] == 0, columns],
+        "unexpected": unexpected,
+        "variance": inventory.loc[inventory["VARIANCE"] != 0, columns],
+    }
+
+
+def _reconcile_partition(job):
+    # Runs in a worker process. Partitions by file load their own inventory so
+    # the parse itself is spread across cores.
+    start = time.perf_counter()
+    inventory = job.get("inventory")
+    if inventory is None:
+        inventory = read_inventory_file(job["path"])
+    reports = reconcile_inventory(inventory, job["scan_counts"], partition=job["partition"])
+    summary = {
+        "PARTITION": job["partition"],
+        "ROWS": len(inventory),
+        "MATCHED": len(reports["matched"]),
+        "MISSING": len(reports["missing"]),
+        "UNEXPECTED": len(reports["unexpected"]),
+        "VARIANCE_ROWS": len(reports["variance"]),
+        "SECONDS": round(time.perf_counter() - start, 3),
+    }
+    return reports, summary
+
+
+def _file_barcodes(path):
+    # Just the BARCODE column, so files reconciled by file are still parsed in the workers
+    reader = pd.read_excel if path.lower().endswith(".xlsx") else pd.read_csv
+    try:
+        barcodes = reader(path, usecols=["BARCODE"], dtype=str)["BARCODE"]
+    except ValueError:  # no BARCODE column
+        return set()
+    return set(barcodes.map(clean_barcode))
+
+
+def scan_owners(scans, barcodes_by_path):
+    # The inventory file each scan belongs to: the first one holding its barcode,
+    # or None when no file does
+    owners = pd.Series(None, index=pd.Index(scans["barcode"].unique()), dtype=object)
+    for path, barcodes in barcodes_by_path.items():
+        owners[owners.isna() & owners.index.isin(barcodes)] = path
+    return scans["barcode"].map(owners)
+
+
+def build_jobs(inventory_paths, scans, by="file", location_col="LOCATION"):
+    # Every scan is counted against one inventory file only, and scans found in
+    # no file are reported as unexpected once, in the NO_INVENTORY partition(s)
+    jobs = []
+    has_scan_locations = "location" in scans.columns
+    inventories = {} if by == "file" else {path: read_inventory_file(path) for path in inventory_paths}
+    owners = scan_owners(scans, {
+        path: set(inventories[path]["BARCODE"]) if path in inventories else _file_barcodes(path)
+        for path in inventory_paths
+    })
+    for path in inventory_paths:
+        owned = scans[owners == path]
+        if by == "file":
+            jobs.append({"partition": os.path.basename(path), "path": path, "scan_counts": owned["barcode"].value_counts()})
+            continue
+        inventory = inventories[path]
+        locations = inventory[location_col].fillna("").astype(str).str.strip() if location_col in inventory.columns else pd.Series("", index=inventory.index)
+        barcode_location = dict(zip(inventory["BARCODE"], locations))
+        scan_locations = owned["barcode"].map(barcode_location)
+        if has_scan_locations:
+            scan_locations = owned["location"].where(owned["location"] != "", scan_locations)
+        scan_locations = scan_locations.fillna("")
+        for location in sorted(set(locations) | set(scan_locations)):
+            part_scans = owned.loc[scan_locations == location, "barcode"]
+            label = f"{os.path.basename(path)}:{location or '(none)'}"
+            jobs.append({
+                "partition": label,
+                "inventory": inventory[locations == location],
+                "scan_counts": part_scans.value_counts(),
+            })
+
+    unowned = scans[owners.isna()]
+    if len(unowned):
+        no_rows = pd.DataFrame({"BARCODE": pd.Series(dtype=object)})
+        if by == "location" and has_scan_locations:
+            groups = unowned.groupby(unowned["location"].fillna(""), sort=True)["barcode"]
+            for location, part_scans in groups:
+                jobs.append({"partition": f"{NO_INVENTORY}:{location or '(none)'}", "inventory": no_rows,
+                             "scan_counts": part_scans.value_counts()})
+        else:
+            jobs.append({"partition": NO_INVENTORY, "inventory": no_rows, "scan_counts": unowned["barcode"].value_counts()})
+    return jobs
+
+
+def run_jobs(jobs, workers=None):
+    if workers == 1 or len(jobs) <= 1:
+        return [_reconcile_partition(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_reconcile_partition, jobs))
+
+
+def write_reports(results, output_dir, fmt="csv"):
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    merged = {name: pd.concat([r[name] for r, _ in results], ignore_index=True) for name in REPORTS}
+    merged["summary"] = pd.DataFrame([s for _, s in results])
+    for name, frame in merged.items():
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        if fmt == "xlsx":
+            frame.to_excel(path, index=False)
+        else:
+            frame.to_csv(path, index=False)
+        written.append(path)
+    return written, merged["summary"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile inventory files against stocktake scan logs without Streamlit.")
+    parser.add_argument("--inventory", nargs="+", required=True, help="Inventory CSV/XLSX files (e.g. Inventory/*.csv)")
+    parser.add_argument("--scans", nargs="+", required=True, help="Scan logs (CSV/XLSX/TXT) with a barcode column")
+    parser.add_argument("--by", choices=["file", "location"], default="file", help="One worker per inventory file or per LOCATION")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--output-dir", default="reconciliation_reports")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    scans = pd.concat([read_scan_log(p) for p in args.scans], ignore_index=True)
+    jobs = build_jobs(args.inventory, scans, by=args.by)
+    results = run_jobs(jobs, workers=args.workers)
+    written, summary = write_reports(results, args.output_dir, fmt=args.format)
+    print(summary.to_string(index=False))
+    print(f"\n{len(scans)} scans, {len(jobs)} partitions in {time.perf_counter() - start:.2f}s")
+    for path in written:
+        print(f"  wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
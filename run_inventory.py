@@ -1,2 +1,9 @@
+import os
 import streamlit.web.bootstrap
-streamlit.web.bootstrap.run('Inventory_Manager.py', '', [], None)
\ No newline at end of file
+from warmup import start_warmup, inventory_paths
+
+# Parse the inventory and build the barcode index while the server starts, so
+# the first visitor doesn't pay for it. INVENTORY_READY_FILE is written once done.
+INVENTORY_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Inventory")
+start_warmup(inventory_paths(INVENTORY_FOLDER), ready_file=os.environ.get("INVENTORY_READY_FILE"))
+streamlit.web.bootstrap.run('Inventory_Manager.py', False, [], {})
@@ -0,0 +1,110 @@
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import barcode_server
+
+# Production entry point for barcode_server.py. The product index is loaded
+# once in the parent, then the parent forks worker processes that share the
+# listening socket (and, copy-on-write, the index) and each serve requests on
+# a thread per connection. Workers that die are replaced. Where fork is not
+# available (Windows) a single threaded server is used.
+#
+#     python serve_barcodes.py --port 5001 --workers 4
+
+
+def default_workers():
+    return max(2, min(8, os.cpu_count() or 1))
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # A log line per request costs more than the lookup itself; /metrics has the counts
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve_worker(host, port, fd=None, access_log=False):
+    handler = WSGIRequestHandler if access_log else QuietRequestHandler
+    server = make_server(host, port, barcode_server.app, threaded=True, request_handler=handler, fd=fd)
+    # shutdown() waits for serve_forever to return, so it must run on another thread
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    server.serve_forever()
+
+
+def _spawn(host, port, fd, access_log):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            serve_worker(host, port, fd, access_log)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def serve(host, port, workers, access_log=False):
+    start = time.perf_counter()
+    index = barcode_server.load_product_index()
+    barcode_server.preloaded = True
+    print(f"Loaded {len(index)} products from {barcode_server.EXCEL_PATH} in {time.perf_counter() - start:.2f}s", flush=True)
+    if workers <= 1 or not hasattr(os, "fork"):
+        print(f"Serving on http://{host}:{port} (threaded)", flush=True)
+        serve_worker(host, port, access_log=access_log)
+        return
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    children = {_spawn(host, port, sock.fileno(), access_log) for _ in range(workers)}
+    print(f"Serving on http://{host}:{port} ({workers} workers, threaded)", flush=True)
+
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited; starting a replacement", file=sys.stderr, flush=True)
+            children.add(_spawn(host, port, sock.fileno(), access_log))
+    sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve barcode_server.py with pre-forked, threaded workers.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (0.0.0.0 for every interface)")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--workers", type=int, default=default_workers(), help="Worker processes (1 = a single threaded process)")
+    parser.add_argument("--access-log", action="store_true", help="Log every request to stderr")
+    parser.add_argument("--excel", default=None, help=f"Product workbook (default: {barcode_server.EXCEL_PATH})")
+    args = parser.parse_args(argv)
+    if args.excel:
+        barcode_server.EXCEL_PATH = args.excel
+    serve(args.host, args.port, args.workers, args.access_log)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,19 +3,40 @@
 # Activate your virtual environment
 source venv/bin/activate
 
-# Start the Flask server in the background
-python barcode_server.py &
+FLASK_URL="http://localhost:5001"
+STREAMLIT_URL="http://localhost:8501"
+READY_TIMEOUT="${READY_TIMEOUT:-60}"
+export INVENTORY_READY_FILE="${INVENTORY_READY_FILE:-.streamlit_ready.json}"
+rm -f "$INVENTORY_READY_FILE"
 
-# Wait for Flask to start
-sleep 3
+# Poll a readiness check until it passes or READY_TIMEOUT seconds elapse
+wait_until() {
+    local name="$1"; shift
+    local deadline=$((SECONDS + READY_TIMEOUT))
+    until "$@" > /dev/null 2>&1; do
+        if [ "$SECONDS" -ge "$deadline" ]; then
+            echo "$name not ready after ${READY_TIMEOUT}s" >&2
+            return 1
+        fi
+        sleep 0.2
+    done
+}
 
-# Start Streamlit apps on ports 8501 and 8502 in the background, suppressing auto-browser launch
-streamlit run Inventory_Manager.py --server.port 8501 --server.headless true &
+START_NS=$(date +%s%N)
+elapsed() { echo "$(( ($(date +%s%N) - START_NS) / 1000000 )) ms"; }
 
-# Wait for Streamlit apps to start
-sleep 5
+# Start the barcode server in the background (pre-forked workers share the product index
+# loaded before forking); /ready turns 200 once it is serving
+python serve_barcodes.py --port 5001 &
+
+# Start Streamlit in the background (run_inventory.py warms the inventory cache before serving)
+STREAMLIT_SERVER_PORT=8501 STREAMLIT_SERVER_HEADLESS=true python run_inventory.py &
+
+wait_until "barcode_server" curl -fs "$FLASK_URL/ready" && echo "barcode_server ready after $(elapsed)"
+wait_until "Streamlit" curl -fs "$STREAMLIT_URL/_stcore/health" && echo "Streamlit serving after $(elapsed)"
+wait_until "Inventory warm-up" test -f "$INVENTORY_READY_FILE" && echo "Inventory warm after $(elapsed): $(cat "$INVENTORY_READY_FILE")"
 
 # Open all desired pages in browser (each only once)
 open "http://localhost:8501/"
 
-wait
\ No newline at end of file
+wait
@@ -0,0 +1,207 @@
+import functools
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from money import format_cents, to_cents
+from stocktake_session import partition_label, reconcile_partitions
+
+try:
+    import pyarrow  # noqa: F401
+    SNAPSHOT_EXTENSION = ".parquet"
+except ImportError:  # gzip-compressed pickles hold the same frames, read whole
+    SNAPSHOT_EXTENSION = ".pkl.gz"
+
+# Completed stocktakes, sealed before their scan logs are emptied. Each
+# snapshot is two compressed column-oriented files, one line per product
+# (expected, counted, variance, unit price) and one per scan, plus a line in
+# manifest.jsonl with the totals, the inventory version counted against and
+# the MANUFACT values and FRAMENUM range it holds. Queries across snapshots
+# check the manifest first and only open the snapshots that can match; with
+# pyarrow installed the files are Parquet and the filters are pushed into the
+# reader too. Snapshot files are never rewritten, so loaded ones are cached.
+MANIFEST_NAME = "manifest.jsonl"
+LINE_COLUMNS = ["PARTITION", "BARCODE", "FRAMENUM", "MANUFACT", "MODEL", "SIZE", "FCOLOUR", "LOCATION",
+                "EXPECTED", "COUNTED", "VARIANCE", "UNIT_CENTS"]
+TEXT_COLUMNS = ["PARTITION", "BARCODE", "FRAMENUM", "MANUFACT", "MODEL", "SIZE", "FCOLOUR", "LOCATION"]
+SHRINKAGE_FIELDS = ["FRAMENUM", "MANUFACT"]
+
+_manifest_cache = {}
+_manifest_lock = threading.Lock()
+
+
+def snapshot_lines(df, partitions, barcode_col="BARCODE"):
+    # Every expected product and every unexpected scan of the partitions, one row each
+    reports = reconcile_partitions(df, partitions, barcode_col, workers=1)
+    lines = pd.concat([reports["matched"], reports["missing"]], ignore_index=True)
+    unexpected = reports["unexpected"].assign(EXPECTED=0)
+    unexpected["VARIANCE"] = unexpected["COUNTED"]
+    lines = pd.concat([lines, unexpected], ignore_index=True)
+    lines["UNIT_CENTS"] = to_cents(lines["RRP"]).fillna(0).astype(np.int64) if "RRP" in lines.columns else 0
+    lines = lines.reindex(columns=LINE_COLUMNS)
+    for col in TEXT_COLUMNS:
+        text = lines[col].astype("string").fillna("").str.strip()
+        lines[col] = text.mask(text == "nan", "").astype("category")
+    for col in ["EXPECTED", "COUNTED", "VARIANCE"]:
+        lines[col] = lines[col].fillna(0).astype(np.int32)
+    return lines
+
+
+def snapshot_scans(partitions):
+    frames = [pd.DataFrame({"PARTITION": partition_label(p.location), "BARCODE": list(p.log.barcodes)}) for p in partitions]
+    scans = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["PARTITION", "BARCODE"])
+    scans["SEQ"] = np.arange(len(scans), dtype=np.int32)
+    return scans.astype({"PARTITION": "category", "BARCODE": "category"})
+
+
+def _write_frame(frame, path):
+    tmp_path = path + ".tmp"
+    if SNAPSHOT_EXTENSION == ".parquet":
+        frame.to_parquet(tmp_path, index=False, compression="zstd")
+    else:
+        frame.to_pickle(tmp_path, compression="gzip")
+    os.replace(tmp_path, path)
+
+
+def _snapshot_path(folder, snapshot_id, table, extension=SNAPSHOT_EXTENSION):
+    return os.path.join(folder, f"{snapshot_id}.{table}{extension}")
+
+
+def seal_stocktake(folder, df, partitions, inventory_file, inventory_version, barcode_col="BARCODE"):
+    # Writes the snapshot files first and the manifest line last, so a snapshot
+    # is only listed once it is complete. Returns its manifest entry.
+    os.makedirs(folder, exist_ok=True)
+    sealed_at = datetime.now()
+    snapshot_id = sealed_at.strftime("%Y%m%d-%H%M%S")
+    suffix = 1
+    while os.path.exists(_snapshot_path(folder, snapshot_id, "lines")):
+        suffix += 1
+        snapshot_id = f"{sealed_at.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+    lines = snapshot_lines(df, partitions, barcode_col)
+    scans = snapshot_scans(partitions)
+    _write_frame(lines, _snapshot_path(folder, snapshot_id, "lines"))
+    _write_frame(scans, _snapshot_path(folder, snapshot_id, "scans"))
+
+    short = (-lines["VARIANCE"]).clip(lower=0).astype(np.int64)
+    framenums = lines["FRAMENUM"].astype(str)
+    framenums = framenums[framenums != ""]
+    entry = {
+        "id": snapshot_id,
+        "sealed_at": sealed_at.strftime('%Y-%m-%d %H:%M:%S'),
+        "format": SNAPSHOT_EXTENSION,
+        "inventory_file": os.path.basename(inventory_file),
+        "inventory_version": [str(v) for v in inventory_version],
+        "partitions": [partition_label(p.location) for p in partitions],
+        "scans": len(scans),
+        "products": int((lines["EXPECTED"] > 0).sum()),
+        "expected_units": int(lines["EXPECTED"].sum()),
+        "counted_units": int(lines["COUNTED"].sum()),
+        "short_units": int(short.sum()),
+        "short_cents": int((short * lines["UNIT_CENTS"]).sum()),
+        "manufact": sorted(v for v in lines["MANUFACT"].astype(str).unique() if v),
+        "framenum_range": [framenums.min(), framenums.max()] if len(framenums) else None,
+    }
+    with open(os.path.join(folder, MANIFEST_NAME), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return entry
+
+
+def list_snapshots(folder):
+    # Manifest entries, oldest first; re-read only when the manifest has grown
+    path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    with _manifest_lock:
+        cached = _manifest_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for raw in f:
+            try:
+                entries.append(json.loads(raw))
+            except ValueError:
+                continue
+    with _manifest_lock:
+        _manifest_cache[path] = (signature, entries)
+    return entries
+
+
+@functools.lru_cache(maxsize=128)
+def _load_lines(path, columns, manufacturers):
+    if path.endswith(".parquet"):
+        filters = [("MANUFACT", "in", list(manufacturers))] if manufacturers else None
+        return pd.read_parquet(path, columns=list(columns), filters=filters)
+    lines = pd.read_pickle(path, compression="gzip")
+    if manufacturers:
+        lines = lines[lines["MANUFACT"].isin(manufacturers)]
+    return lines[list(columns)]
+
+
+def _may_match(entry, manufacturers, framenum_prefix):
+    # Decided from the manifest alone, without opening the snapshot
+    if manufacturers and not set(manufacturers) & set(entry.get("manufact", [])):
+        return False
+    if framenum_prefix:
+        bounds = entry.get("framenum_range")
+        if not bounds or bounds[1] < framenum_prefix or bounds[0][:len(framenum_prefix)] > framenum_prefix:
+            return False
+    return True
+
+
+def query_lines(folder, last=None, manufacturers=None, framenum_prefix=None,
+                columns=("FRAMENUM", "MANUFACT", "MODEL", "EXPECTED", "COUNTED", "VARIANCE", "UNIT_CENTS")):
+    # Lines of the last `last` snapshots matching the filters, with SNAPSHOT and SEALED_AT
+    entries = list_snapshots(folder)
+    if last:
+        entries = entries[-last:]
+    manufacturers = tuple(sorted(manufacturers)) if manufacturers else None
+    frames = []
+    for entry in entries:
+        if not _may_match(entry, manufacturers, framenum_prefix):
+            continue
+        path = _snapshot_path(folder, entry["id"], "lines", entry.get("format", SNAPSHOT_EXTENSION))
+        if not os.path.exists(path):
+            continue
+        lines = _load_lines(path, tuple(columns), manufacturers)
+        if framenum_prefix:
+            lines = lines[lines["FRAMENUM"].astype(str).str.startswith(framenum_prefix)]
+        frames.append(lines.assign(SNAPSHOT=entry["id"], SEALED_AT=entry["sealed_at"]))
+    if not frames:
+        return pd.DataFrame(columns=list(columns) + ["SNAPSHOT", "SEALED_AT"])
+    return pd.concat([f.astype({c: str for c in f.columns if f[c].dtype == "category"}) for f in frames], ignore_index=True)
+
+
+def shrinkage(folder, by="FRAMENUM", last=None, manufacturers=None, framenum_prefix=None):
+    # Units short (expected but not counted) per `by` value: one column per
+    # count, then the totals across them, largest value lost first
+    lines = query_lines(folder, last, manufacturers, framenum_prefix)
+    if lines.empty:
+        return pd.DataFrame(columns=[by, "COUNTS_SHORT", "SHORT_UNITS", "SHORT_VALUE"])
+    lines = lines[lines[by] != ""]
+    lines["SHORT"] = (-lines["VARIANCE"]).clip(lower=0)
+    lines["SHORT_CENTS"] = lines["SHORT"].astype(np.int64) * lines["UNIT_CENTS"]
+    # One column per snapshot, oldest first: two counts sealed in the same second
+    # stay apart, and are labelled with their snapshot id to tell them apart
+    per_count = lines.pivot_table(index=by, columns="SNAPSHOT", values="SHORT", aggfunc="sum", fill_value=0)
+    sealed = lines.drop_duplicates("SNAPSHOT").set_index("SNAPSHOT")["SEALED_AT"]
+    per_count = per_count.reindex(columns=sealed.index, fill_value=0)
+    shared = sealed.duplicated(keep=False)
+    per_count.columns = sealed.where(~shared, sealed + " (" + sealed.index + ")").to_numpy()
+    totals = lines.groupby(by).agg(SHORT_UNITS=("SHORT", "sum"), SHORT_CENTS=("SHORT_CENTS", "sum"))
+    totals["COUNTS_SHORT"] = (per_count > 0).sum(axis=1)
+    if by != "MANUFACT":
+        totals.insert(0, "MANUFACT", lines.groupby(by)["MANUFACT"].first())
+        totals.insert(1, "MODEL", lines.groupby(by)["MODEL"].first())
+    table = totals.join(per_count).sort_values(["SHORT_CENTS", "SHORT_UNITS"], ascending=False, kind="stable")
+    table = table[table["SHORT_UNITS"] > 0]
+    table.insert(table.columns.get_loc("SHORT_CENTS"), "SHORT_VALUE", format_cents(table["SHORT_CENTS"]).to_numpy())
+    return table.drop(columns="SHORT_CENTS").reset_index()
@@ -0,0 +1,360 @@
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from inventory_utils import clean_barcode
+from money import to_cents
+from reconcile import expected_quantities, run_jobs
+
+# A stocktake can be scoped to one or more locations. Each location is a
+# partition with its own append-only scan log and expected set, and keeps its
+# progress counters up to date one scan at a time. ALL_LOCATIONS is the
+# whole-clinic partition that uses the original scanned_barcodes.csv.
+ALL_LOCATIONS = "__ALL__"
+LOCATION_FIELDS = ["LOCATION", "LOCATION2", "LOCATION3"]
+
+
+def partition_label(location):
+    return "Whole clinic" if location == ALL_LOCATIONS else location
+
+
+def partition_scan_file(session_folder, location, default_file):
+    if location == ALL_LOCATIONS:
+        return default_file
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", location).strip("_") or "blank"
+    return os.path.join(session_folder, f"scanned_{slug}.csv")
+
+
+def partition_locations(df):
+    values = set()
+    for col in LOCATION_FIELDS:
+        if col in df.columns:
+            values.update(v.strip() for v in df[col].fillna("").astype(str) if v.strip() and v.strip() != "nan")
+    return sorted(values)
+
+
+def location_mask(df, location, scope=None):
+    # Rows expected in `location`. When several locations are counted at once
+    # (`scope`), a row whose LOCATION, LOCATION2 and LOCATION3 name more than one
+    # of them is expected only in the first it names, so no row is counted twice.
+    if location == ALL_LOCATIONS:
+        return pd.Series(True, index=df.index)
+    scope = set(scope or ()) | {location}
+    first = pd.Series("", index=df.index)
+    for col in reversed(LOCATION_FIELDS):
+        if col in df.columns:
+            values = df[col].fillna("").astype(str).str.strip()
+            first = values.where(values.isin(scope), first)
+    return first == location
+
+
+def unit_cents(df):
+    if "RRP" not in df.columns:
+        return pd.Series(0, index=df.index, dtype="int64")
+    return to_cents(df["RRP"]).fillna(0).astype("int64")
+
+
+class ScanLog:
+    # CSV with a single "barcode" column. New scans are appended; the log is
+    # only rewritten (to a new file, renamed into place) when scans are removed.
+    def __init__(self, path):
+        self.path = path
+        self.barcodes = []
+        self._offset = 0
+        self._inode = None
+
+    def refresh(self):
+        # Returns (added, reset): newly appended barcodes, or reset=True when the
+        # file was rewritten/removed and the caller must rebuild from self.barcodes.
+        if not os.path.exists(self.path):
+            reset = self._inode is not None
+            self.barcodes, self._offset, self._inode = [], 0, None
+            return [], reset
+        st = os.stat(self.path)
+        reset = self._inode is not None and (st.st_ino != self._inode or st.st_size < self._offset)
+        if reset:
+            self.barcodes, self._offset = [], 0
+        self._inode = st.st_ino
+        if st.st_size == self._offset:
+            return [], reset
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read(st.st_size - self._offset)
+        # Only consume complete lines so a write in progress is picked up next time
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            return [], reset
+        added = []
+        for i, raw in enumerate(chunk[:end].splitlines()):
+            value = raw.decode("utf-8").strip()
+            if self._offset == 0 and i == 0 and value.lower() == "barcode":
+                continue
+            value = clean_barcode(value)
+            if value:
+                added.append(value)
+        self._offset += end + 1
+        self.barcodes.extend(added)
+        return added, reset
+
+    def append(self, barcode):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(("barcode\n" if new_file else "") + f"{barcode}\n")
+
+    def rewrite(self, barcodes):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        pd.DataFrame({"barcode": list(barcodes)}).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+
+class UnfoundLog:
+    # unfound_barcodes.csv ("barcode,timestamp"), appended one line per scan and
+    # read incrementally like ScanLog. Repeats are folded into one row per
+    # barcode with a count and first/last seen times.
+    COLUMNS = ["barcode", "timestamp"]
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.counts = Counter()
+        self.first_seen = {}
+        self.last_seen = {}
+        self._offset = 0
+        self._inode = None
+
+    def refresh(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                self._reset()
+                return
+            st = os.stat(self.path)
+            if self._inode is not None and (st.st_ino != self._inode or st.st_size < self._offset):
+                self._reset()
+            self._inode = st.st_ino
+            if st.st_size == self._offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read(st.st_size - self._offset)
+            end = chunk.rfind(b"\n")
+            if end < 0:
+                return
+            for i, raw in enumerate(chunk[:end].splitlines()):
+                barcode, _, timestamp = raw.decode("utf-8").strip().partition(",")
+                if self._offset == 0 and i == 0 and barcode.lower() == "barcode":
+                    continue
+                barcode = clean_barcode(barcode)
+                if not barcode:
+                    continue
+                self.counts[barcode] += 1
+                self.first_seen.setdefault(barcode, timestamp)
+                self.last_seen[barcode] = timestamp
+            self._offset += end + 1
+
+    def add(self, barcode, timestamp):
+        with self._lock:
+            new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write((",".join(self.COLUMNS) + "\n" if new_file else "") + f"{barcode},{timestamp}\n")
+        self.refresh()
+
+    def remove(self, barcodes):
+        # Rewrites the log without `barcodes` (tmp file renamed into place)
+        self.refresh()
+        barcodes = set(barcodes)
+        with self._lock:
+            if not barcodes & set(self.counts):
+                return
+            frame = pd.read_csv(self.path, dtype=str).reindex(columns=self.COLUMNS)
+            frame = frame[~frame["barcode"].map(clean_barcode).isin(barcodes)]
+            tmp_path = f"{self.path}.tmp"
+            frame.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, self.path)
+        self.refresh()
+
+    def clear(self):
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            pd.DataFrame(columns=self.COLUMNS).to_csv(tmp_path, index=False)
+            os.replace(tmp_path, self.path)
+        self.refresh()
+
+    def version(self):
+        return (self._inode, self._offset)
+
+    def table(self):
+        # One row per barcode, most recently seen first
+        with self._lock:
+            frame = pd.DataFrame({
+                "barcode": list(self.counts),
+                "count": list(self.counts.values()),
+                "first_seen": [self.first_seen[b] for b in self.counts],
+                "last_seen": [self.last_seen[b] for b in self.counts],
+            })
+        return frame.sort_values("last_seen", ascending=False, kind="stable").reset_index(drop=True)
+
+
+class Partition:
+    def __init__(self, location, expected_df, scan_file, barcode_col="BARCODE"):
+        self.location = location
+        self.barcode_col = barcode_col
+        self.log = ScanLog(scan_file)
+        self._lock = threading.Lock()
+        barcodes = expected_df[barcode_col]
+        qty = expected_quantities(expected_df)
+        cents = unit_cents(expected_df)
+        first = ~barcodes.duplicated()
+        # Rows sharing a barcode are expected together, as reconcile counts them
+        self.expected_qty = qty.groupby(barcodes, sort=False).sum().to_dict()
+        self.unit_cents = dict(zip(barcodes[first], cents[first].tolist()))
+        self.expected_units = int(qty.sum())
+        self.expected_cents = int((qty * cents).sum())
+        self.expected_index = expected_df.index
+        # Row labels of every expected product, so the missing rows can be taken
+        # from a pre-formatted table without scanning the inventory
+        self.rows_by_barcode = {
+            barcode: expected_df.index[positions].to_numpy()
+            for barcode, positions in barcodes.groupby(barcodes, sort=False).indices.items()
+        }
+        self._reset_counts()
+        self.refresh()
+
+    def _reset_counts(self):
+        self.counted = Counter()
+        self.counted_units = 0
+        self.counted_cents = 0
+        self.unexpected_scans = 0
+        # Expected barcodes with nothing counted yet, kept in step with the counts
+        self.missing = set(self.expected_qty)
+        self.version = getattr(self, "version", 0) + 1
+        # Times the log was found rewritten, so readers of log.barcodes can tell
+        self.resets = getattr(self, "resets", -1) + 1
+
+    def _apply(self, barcode, delta):
+        # O(1): only units up to the expected quantity count towards progress
+        before = self.counted[barcode]
+        after = before + delta
+        if after <= 0:
+            self.counted.pop(barcode, None)
+            after = 0
+        else:
+            self.counted[barcode] = after
+        self.version += 1
+        expected = self.expected_qty.get(barcode)
+        if expected is None:
+            self.unexpected_scans += after - before
+            return
+        if before == 0 and after > 0:
+            self.missing.discard(barcode)
+        elif after == 0 and before > 0:
+            self.missing.add(barcode)
+        progress = min(after, expected) - min(before, expected)
+        self.counted_units += progress
+        self.counted_cents += progress * self.unit_cents.get(barcode, 0)
+
+    def refresh(self):
+        with self._lock:
+            added, reset = self.log.refresh()
+            if reset:
+                self._reset_counts()
+                added = list(self.log.barcodes)
+            for barcode in added:
+                self._apply(barcode, 1)
+
+    def add_scan(self, barcode):
+        with self._lock:
+            self.log.append(barcode)
+        self.refresh()
+
+    def remove_barcode(self, barcode):
+        self.refresh()
+        with self._lock:
+            if barcode not in self.counted:
+                return
+            self.log.rewrite([b for b in self.log.barcodes if b != barcode])
+        self.refresh()
+
+    def clear(self):
+        with self._lock:
+            self.log.rewrite([])
+        self.refresh()
+
+    def missing_rows(self):
+        # Sorted row labels of the expected products not yet counted
+        with self._lock:
+            labels = [self.rows_by_barcode[b] for b in self.missing]
+        return np.sort(np.concatenate(labels)) if labels else np.array([], dtype=np.int64)
+
+    def progress(self):
+        return {
+            "location": partition_label(self.location),
+            "counted_units": self.counted_units,
+            "expected_units": self.expected_units,
+            "counted_value": self.counted_cents / 100,
+            "expected_value": self.expected_cents / 100,
+            "unexpected_scans": self.unexpected_scans,
+            "missing_products": len(self.missing),
+        }
+
+
+_partitions = {}
+_partitions_lock = threading.Lock()
+
+
+def get_partition(inventory_key, df, location, scan_file, barcode_col="BARCODE", scope=None):
+    # Shared by every session. Only the partition for the current inventory
+    # version and scope is kept per (location, scan file); a save or a new scope
+    # replaces it, so older versions' partitions are freed. `scope` is every
+    # location being counted, which decides the rows this one expects.
+    scope = tuple(sorted(set(scope or ()) - {ALL_LOCATIONS}))
+    key = (location, os.path.abspath(scan_file))
+    with _partitions_lock:
+        version, partition = _partitions.get(key, (None, None))
+    if version != (inventory_key, scope):
+        partition = Partition(location, df[location_mask(df, location, scope)], scan_file, barcode_col)
+        with _partitions_lock:
+            _partitions[key] = ((inventory_key, scope), partition)
+    else:
+        partition.refresh()
+    return partition
+
+
+_unfound_logs = {}
+
+
+def get_unfound_log(path):
+    key = os.path.abspath(path)
+    with _partitions_lock:
+        log = _unfound_logs.get(key)
+        if log is None:
+            log = UnfoundLog(path)
+            _unfound_logs[key] = log
+    log.refresh()
+    return log
+
+
+def reconcile_partitions(df, partitions, barcode_col="BARCODE", workers=None):
+    # One reconciliation job per partition, run in parallel and merged; each
+    # partition reconciles the rows it expects, so no row is in two jobs
+    jobs = [{
+        "partition": partition_label(p.location),
+        "inventory": df.loc[p.expected_index],
+        "scan_counts": pd.Series(dict(p.counted), dtype=int),
+    } for p in partitions]
+    results = run_jobs(jobs, workers=workers)
+    merged = {name: pd.concat([r[name] for r, _ in results], ignore_index=True) for name in results[0][0]}
+    merged["summary"] = pd.DataFrame([s for _, s in results])
+    return merged
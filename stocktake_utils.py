@@ -0,0 +1,255 @@
+from collections import Counter
+
+import pandas as pd
+
+from inventory_utils import clean_barcode
+from money import format_money
+
+# --- Exact header list requested ---
+VISIBLE_FIELDS = [
+    "BARCODE", "LOCATION", "LOCATION2", "PKEY", "PKEY0", "FRAMENUM", "FRAMENUM0", "SXFRAME",
+    "QUANTITY", "MANUFACT", "MODEL", "FCOLOUR", "SIZE", "FRDESC", "LOCATION3", "STKTAKE",
+    "CHANGE", "QTYAPPRO", "QTY3", "SUPBARCODE", "ISTOCKCODE", "SUPPLIER", "SUPPLIER2",
+    "FRAMETYPE", "FRAMEGROUP", "TEMPLE", "DEPTH", "DIAG", "BASECURVE", "SUNGRX", "FROTHER",
+    "FROTHER2", "REORDDATE", "REORDER", "REORDQTY", "RRP", "EXLISTPR", "LISTPRICE", "EXCOSTPR",
+    "COSTPRICE", "EXPREVCOST", "PREVCOST", "EXAVGCOST", "AVGCOST", "DPRECOST", "DPREEXCOST",
+    "WSALEET", "WSALEIT", "APPORDER", "LASTSALE2", "LASTSALE", "FIRSTPUR", "LASTPUR", "RETURNBY",
+    "DQTY", "REFRESH", "LASTINV", "DISPC", "TAXPC", "FRSTATUS", "FRSTATUS2", "QTYONORDER",
+    "QTYONAPPRO", "PHOTOEXT", "PHOTONAME", "LIFESTYLE", "LIFECYCLE", "RELEASE", "AVAILFROM",
+    "AVAILTILL", "FRANGE", "SPH1", "SPH2", "CYL1", "CYL2", "MINPD", "BASEC", "SRVCHARGE",
+    "EXLISTSRV", "LISTSRV", "EXRRPSRV", "RRPSRV", "MODKEY", "ORDERAGAIN", "PROSUPPLY",
+    "PSSUPFIT", "PSCREATED", "PSUPDATEAT", "USER", "MODIFIED", "DELFLAG", "XFER", "PROVISION",
+    "PVINACTIVE", "LOGSTR", "FGID", "SUPSTATUS", "LLABORDER", "LDOWNLOAD", "UUID", "NOTE", "PHOTO"
+]
+
+# Normalize some common alternate names (extend as needed)
+COLUMN_NAME_MAP = {
+    "F GROUP": "FRAMEGROUP",
+    "COST PRICE": "COSTPRICE",
+}
+
+# IDENTIFYING FIELDS used to detect same product (adjust as needed)
+IDENTIFYING_FIELDS = ["FRAMENUM", "MODEL", "MANUFACT", "SIZE", "FCOLOUR", "FRAMETYPE"]
+
+
+def normalize_stocktake_inventory(df, barcode_col="BARCODE"):
+    df = df.rename(columns={k: v for k, v in COLUMN_NAME_MAP.items() if k in df.columns})
+    # Ensure barcode column cleaned to string representation
+    df[barcode_col] = df[barcode_col].map(clean_barcode).astype(str)
+    return df
+
+
+def clean_for_display(df):
+    df = df.copy()
+    if "BARCODE" in df.columns:
+        df["BARCODE"] = df["BARCODE"].apply(
+            lambda x: str(int(float(x))) if pd.notnull(x)
+            and str(x).replace('.', '', 1).isdigit()
+            and float(x).is_integer() else x
+        )
+    if "QUANTITY" in df.columns:
+        df["QUANTITY"] = df["QUANTITY"].apply(
+            lambda x: str(int(float(x))) if pd.notnull(x)
+            and str(x).replace('.', '', 1).isdigit()
+            and float(x).is_integer() else x
+        )
+    df = df.replace("nan", "").replace(pd.NA, "")
+    return df
+
+
+def format_inventory_table(input_df):
+    df_disp = input_df.copy()
+    # Ensure all columns exist, and cast to string
+    for col in df_disp.columns:
+        df_disp[col] = df_disp[col].astype(str)
+    if "BARCODE" in df_disp.columns:
+        df_disp["BARCODE"] = df_disp["BARCODE"].map(clean_barcode)
+    if "RRP" in df_disp.columns:
+        df_disp["RRP"] = format_money(df_disp["RRP"])
+    # Reindex to the exact VISIBLE_FIELDS order, creating missing columns with empty strings
+    df_disp = df_disp.reindex(columns=VISIBLE_FIELDS).fillna("").replace("nan", "").replace(pd.NA, "")
+    return df_disp
+
+
+def make_signature(row):
+    return tuple(str(row.get(f, "")).strip() for f in IDENTIFYING_FIELDS)
+
+
+def get_key_for_row(row, barcode_col="BARCODE"):
+    # Scanned counts are keyed by FRAMENUM; fallback to BARCODE
+    val = str(row.get("FRAMENUM", "")).strip()
+    return val if val != "" else str(row.get(barcode_col, "")).strip()
+
+
+def barcode_rows(df, barcode_col="BARCODE"):
+    # {barcode: [row positions]}, the layout of integrity.get_key_positions
+    barcodes = df[barcode_col]
+    groups = barcodes[barcodes != ""].groupby(barcodes[barcodes != ""], sort=False).indices
+    return {barcode: positions.tolist() for barcode, positions in groups.items()}
+
+
+class ScannedIndex:
+    # What the scan form and the scanned products table need from the scans so
+    # far, kept up to date one scan at a time: how often each barcode was
+    # scanned, the scanned barcodes per product signature (first scanned
+    # first), the count per FRAMENUM (or BARCODE) key and each barcode's latest
+    # scan. Products are looked up by position through `rows_by_barcode`, so
+    # neither a scan nor a rerun filters the whole inventory.
+    def __init__(self, df, barcode_col="BARCODE", rows_by_barcode=None):
+        self.df = df
+        self.barcode_col = barcode_col
+        self.rows_by_barcode = rows_by_barcode if rows_by_barcode is not None else barcode_rows(df, barcode_col)
+        self._products = {}  # barcode -> (signature, key of its first row, [(position, row key)])
+        self._columns = {}
+        self._seen = {}  # location -> (partition, its resets, scans applied, Counter of them)
+        self._table = None
+        self.changes = 0
+        self._reset()
+
+    def _reset(self):
+        self.counts = Counter()
+        self.by_signature = {}
+        self.key_counts = Counter()
+        self.last_scan = {}
+        self._sequence = 0
+        self.changes += 1
+
+    def _text(self, field, position):
+        # str(row.get(field, "")).strip() for the row at `position`
+        column = self._columns.get(field)
+        if column is None:
+            if field not in self.df.columns:
+                return ""
+            column = self._columns[field] = self.df[field].to_numpy()
+        return str(column[position]).strip()
+
+    def _product(self, barcode):
+        product = self._products.get(barcode)
+        if product is None:
+            positions = self.rows_by_barcode.get(barcode)
+            if positions is None:
+                return None
+            # Same as make_signature and get_key_for_row on each row
+            signature = tuple(self._text(f, positions[0]) for f in IDENTIFYING_FIELDS)
+            keys = [self._text("FRAMENUM", p) or self._text(self.barcode_col, p) for p in positions]
+            product = self._products[barcode] = (signature, keys[0], list(zip(positions, keys)))
+        return product
+
+    def add(self, barcode):
+        self.counts[barcode] += 1
+        self.changes += 1
+        product = self._product(barcode)
+        if product is None:
+            return
+        signature, key, _ = product
+        self._sequence += 1
+        self.last_scan[barcode] = self._sequence
+        self.by_signature.setdefault(signature, {}).setdefault(barcode, None)
+        self.key_counts[key] += 1
+
+    def remove(self, barcode):
+        # Drops every scan of barcode, as Partition.remove_barcode does
+        scans = self.counts.pop(barcode, 0)
+        if not scans:
+            return
+        self.changes += 1
+        product = self._product(barcode)
+        if product is None:
+            return
+        signature, key, _ = product
+        del self.last_scan[barcode]
+        same = self.by_signature[signature]
+        del same[barcode]
+        if not same:
+            del self.by_signature[signature]
+        self.key_counts[key] -= scans
+        if self.key_counts[key] <= 0:
+            del self.key_counts[key]
+        for location, (partition, resets, applied, counted) in self._seen.items():
+            if counted[barcode]:
+                # Expected back from sync() as this partition's rewritten log
+                self._seen[location] = (partition, resets, applied - counted.pop(barcode), counted)
+
+    def sync(self, partitions):
+        # Applies the scans appended to each partition's log since the last call.
+        # A log rewritten by anything but remove() above, or a different set of
+        # partitions, rebuilds the index from the logs.
+        if set(partitions) != set(self._seen):
+            self._rebuild(partitions)
+            return
+        for location, partition in partitions.items():
+            seen_partition, resets, applied, counted = self._seen[location]
+            barcodes = partition.log.barcodes
+            if seen_partition is not partition or len(barcodes) < applied or (
+                resets != partition.resets and len(barcodes) != applied
+            ):
+                self._rebuild(partitions)
+                return
+            for barcode in barcodes[applied:]:
+                self.add(barcode)
+                counted[barcode] += 1
+            self._seen[location] = (partition, partition.resets, len(barcodes), counted)
+
+    def _rebuild(self, partitions):
+        self._reset()
+        self._seen = {}
+        for location, partition in partitions.items():
+            barcodes = list(partition.log.barcodes)
+            for barcode in barcodes:
+                self.add(barcode)
+            self._seen[location] = (partition, partition.resets, len(barcodes), Counter(barcodes))
+
+    def extend(self, barcodes):
+        for barcode in barcodes:
+            self.add(barcode)
+        return self
+
+    def find_duplicate(self, cleaned):
+        # Returns (matching scanned barcode or None, signature of the new scan)
+        new_sig = self._product(cleaned)[0]
+        # The first scanned product with the same signature, if any
+        same = self.by_signature.get(new_sig)
+        matching_b = next(iter(same)) if same else None
+        # If the exact barcode string is already present, treat as duplicate too
+        if matching_b is None and cleaned in self.counts:
+            matching_b = cleaned
+        return matching_b, new_sig
+
+    def table(self):
+        # (scanned_df, display_df) with the most recent scan on top; rebuilt only
+        # after the scans have changed
+        if self._table is not None and self._table[0] == self.changes:
+            return self._table[1]
+        positions, keys = [], []
+        for barcode in sorted(self.last_scan, key=self.last_scan.get, reverse=True):
+            for position, key in self._products[barcode][2]:
+                positions.append(position)
+                keys.append(key)
+        scanned_df = self.df.iloc[positions].copy()
+        if scanned_df.empty:
+            result = (scanned_df, scanned_df)
+        else:
+            # Prepare display dataframe and inject computed QUANTITY
+            display_df = clean_for_display(scanned_df)
+            display_df = display_df.reindex(columns=VISIBLE_FIELDS).fillna("").replace("nan", "").replace(pd.NA, "")
+            if "QUANTITY" in display_df.columns:
+                if "QUANTITY" in scanned_df.columns:
+                    fallback = scanned_df["QUANTITY"].map(str).tolist()
+                else:
+                    fallback = [""] * len(keys)
+                display_df["QUANTITY"] = [
+                    str(self.key_counts[k]) if k in self.key_counts else q for k, q in zip(keys, fallback)
+                ]
+            result = (scanned_df, display_df)
+        self._table = (self.changes, result)
+        return result
+
+
+def find_scan_duplicate(df, scanned_barcodes, cleaned, barcode_col="BARCODE"):
+    # Returns (matching scanned barcode or None, signature of the new scan)
+    return ScannedIndex(df, barcode_col).extend(scanned_barcodes).find_duplicate(cleaned)
+
+
+def build_scanned_table(df, scanned_barcodes, barcode_col="BARCODE"):
+    # Returns (scanned_df, display_df) with the most recent scan on top
+    return ScannedIndex(df, barcode_col).extend(scanned_barcodes).table()
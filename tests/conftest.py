@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The modules live at the repo root, as the pages import them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def inventory_file(tmp_path):
+    folder = tmp_path / "Inventory"
+    folder.mkdir()
+    path = folder / "stock.csv"
+    pd.DataFrame({
+        "BARCODE": ["1001", "1002", "1003"],
+        "FRAMENUM": ["ABC000001", "ABC000002", "XYZ000001"],
+        "MANUFACT": ["Acme", "Acme", "Zed"],
+        "MODEL": ["A1", "A2", "Z1"],
+        "QUANTITY": ["2", "1", "3"],
+        "RRP": ["$149.00", "$99.50", "$200.00"],
+    }).to_csv(path, index=False)
+    return str(path)
@@ -0,0 +1,58 @@
+import json
+
+import pandas as pd
+
+import archive_store
+from archive_store import ArchiveIndex, records_to_frame
+
+
+def _rows():
+    return [
+        {"BARCODE": "00123", "FRAMENUM": "abc000001", "MODEL": "A1", "QUANTITY": 2},
+        {"BARCODE": "456", "FRAMENUM": "XYZ000001", "MODEL": "Z1", "QUANTITY": None},
+    ]
+
+
+def test_archived_rows_read_back_from_a_fresh_index(tmp_path, monkeypatch):
+    log_path = str(tmp_path / "archive.jsonl")
+    monkeypatch.setattr(archive_store, "_now", lambda: "2024-03-01 10:00:00")
+    first, second = ArchiveIndex(log_path).archive_rows(_rows(), reason="DAMAGED")
+
+    index = ArchiveIndex(log_path)
+    assert index.count() == 2
+    record = index.get(first)
+    assert record["ARCHIVE_REASON"] == "DAMAGED" and record["QUANTITY"] == "2"
+    assert index.get(second)["QUANTITY"] == ""
+    # Barcodes and framecodes are matched cleaned, framecodes in any case
+    assert [r["ARCHIVE_ID"] for r in index.query(barcode="123")] == [first]
+    assert [r["ARCHIVE_ID"] for r in index.query(framenum="ABC000001")] == [first]
+    assert len(index.query(date_from="2024-03-01", date_to="2024-03-01")) == 2
+    assert index.query(date_from="2024-03-02") == []
+
+    # A restore is a new line; the index picks it up without re-reading the rest
+    index.mark_restored(first)
+    assert index.count() == 1
+    assert [r["ARCHIVE_ID"] for r in index.query()] == [second]
+
+    frame = records_to_frame(index.query(), columns=["BARCODE", "MODEL"])
+    assert list(frame.columns) == ["ARCHIVE_ID", "ARCHIVED_AT", "ARCHIVE_REASON", "BARCODE", "MODEL"]
+
+
+def test_legacy_workbook_is_the_fallback_history(tmp_path):
+    legacy_path = str(tmp_path / "archive_inventory.xlsx")
+    pd.DataFrame({"BARCODE": ["789"], "FRAME NO.": ["OLD000001"]}).to_excel(legacy_path, index=False)
+    log_path = str(tmp_path / "archive.jsonl")
+
+    index = ArchiveIndex(log_path, legacy_path)
+    (legacy,) = index.query(framenum="OLD000001")
+    assert legacy["ARCHIVE_REASON"] == "LEGACY" and legacy["BARCODE"] == "789"
+
+    # A half-written line is left for later; a replaced log is read from the start
+    with open(log_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"event": "archive", "id": "a", "at": "2024-01-01 09:00:00", "row": {"BARCODE": "1"}}) + "\n")
+        f.write('{"event": "archive", "id": "b"')
+    assert index.count() == 2
+    with open(log_path, "w", encoding="utf-8") as f:
+        f.write("")
+    assert index.count() == 1
+    assert ArchiveIndex(str(tmp_path / "missing.jsonl")).count() == 0
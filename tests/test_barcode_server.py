@@ -0,0 +1,19 @@
+import pytest
+
+import barcode_server
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(barcode_server, "EXCEL_PATH", str(tmp_path / "inventory.xlsx"))
+    monkeypatch.setattr(barcode_server, "_product_indexes", {})
+    return barcode_server.app.test_client()
+
+
+def test_ready_once_preloaded_even_without_a_workbook(client, monkeypatch):
+    monkeypatch.setattr(barcode_server, "preloaded", False)
+    assert client.get("/ready").status_code == 503
+    assert barcode_server.load_product_index() == {}
+    monkeypatch.setattr(barcode_server, "preloaded", True)
+    response = client.get("/ready")
+    assert response.status_code == 200 and response.get_json()["ready"]
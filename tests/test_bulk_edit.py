@@ -0,0 +1,77 @@
+import io
+
+import pandas as pd
+
+from bulk_edit import apply_bulk_operation, read_barcode_list, select_rows
+from inventory_diff import diff_inventory
+
+
+def _stock():
+    return pd.DataFrame({
+        "BARCODE": ["1001", "1002", "1003", "1004"],
+        "FRAMENUM": ["ABC000001", "ABC000002", "XYZ000001", "XYZ000002"],
+        "MANUFACT": ["Acme", "acme ", "Zed", "Zed"],
+        "LOCATION": ["Front", "Front", "Back", "Back"],
+        "QUANTITY": ["2", "1", "3", "1"],
+        "RRP": ["$149.00", "99.50", "$200.00", ""],
+    })
+
+
+def test_selection_combines_filters_prefix_list_and_price():
+    df = _stock()
+    assert select_rows(df, {"MANUFACT": "ACME"}).tolist() == [True, True, False, False]
+    assert select_rows(df, framenum_prefix="xyz").tolist() == [False, False, True, True]
+    assert select_rows(df, barcodes=["1002", "1004", "9999"]).tolist() == [False, True, False, True]
+    # Blank prices are outside every range
+    assert select_rows(df, price_range=("RRP", 10000, 20000)).tolist() == [True, False, True, False]
+    assert select_rows(df, {"LOCATION": "Back"}, price_range=("RRP", None, 15000)).tolist() == [False, False, False, False]
+
+
+def test_barcode_lists_are_cleaned_and_deduplicated():
+    upload = io.BytesIO(b"Item,Barcode\nx,00123\ny,456\nz,123\n")
+    upload.name = "list.csv"
+    assert read_barcode_list(upload, "789, 456\n\n") == ["123", "456", "789"]
+
+
+def test_applied_changes_show_up_as_field_changes_of_the_selected_rows():
+    df = _stock()
+    mask = select_rows(df, {"MANUFACT": "Acme"})
+
+    updated, removed, errors = apply_bulk_operation(df, mask, "Percent price change", "RRP", 10)
+    assert not errors and removed.empty
+    # The "$" is kept where the price had one; other rows are untouched
+    assert updated["RRP"].tolist() == ["$163.90", "109.45", "$200.00", ""]
+    diff = diff_inventory(df, updated)
+    assert diff["changed_rows"] == 2 and diff["unchanged_rows"] == 2
+    assert diff["changes"][["BARCODE", "FIELD", "OLD", "NEW"]].values.tolist() == [
+        ["1001", "RRP", "$149.00", "$163.90"], ["1002", "RRP", "99.50", "109.45"],
+    ]
+
+    updated, _, errors = apply_bulk_operation(df, mask, "Relocate", value={"LOCATION": " Back "})
+    assert not errors and updated["LOCATION"].tolist() == ["Back"] * 4
+
+    updated, _, errors = apply_bulk_operation(df, mask, "Set field", "QUANTITY", "0")
+    assert not errors and updated["QUANTITY"].tolist() == ["0", "0", "3", "1"]
+
+    updated, removed, errors = apply_bulk_operation(df, mask, "Delete")
+    assert not errors and removed["BARCODE"].tolist() == ["1001", "1002"]
+    assert updated["BARCODE"].tolist() == ["1003", "1004"] and list(updated.index) == [0, 1]
+
+
+def test_a_batch_that_does_not_validate_changes_nothing():
+    df = _stock()
+    everything = pd.Series(True, index=df.index)
+    one = select_rows(df, barcodes=["1003"])
+    for mask, operation, field, value in [
+        (everything, "Set field", "BARCODE", "5000"),
+        (one, "Set field", "FRAMENUM", " ABC000001"),
+        (everything, "Set field", "QUANTITY", "-1"),
+        (everything, "Set field", "RRP", "free"),
+        (one, "Percent price change", "RRP", -150),
+        (everything, "Percent price change", "MANUFACT", 5),
+        (everything, "Relocate", None, {"LOCATION": ""}),
+        (everything & False, "Delete", None, None),
+    ]:
+        updated, removed, errors = apply_bulk_operation(df, mask, operation, field, value)
+        assert errors, (operation, field, value)
+        assert updated is df and removed.empty
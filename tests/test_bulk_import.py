@@ -0,0 +1,72 @@
+import io
+import random
+
+import pandas as pd
+
+from bulk_import import (
+    IMPORT_STATUS_OK, allocate_barcodes, allocate_framecodes, map_import_headers, prepare_import,
+    read_import_file, rows_to_commit,
+)
+
+
+def _inventory():
+    return pd.DataFrame({
+        "BARCODE": ["1001", "1002"],
+        "FRAMENUM": ["LUX000004", "AB000007"],
+        "SUPPLIER": ["LUXOTTICA", "AB"],
+        "COSTPRICE": ["$50.00", "$20.00"],
+        "QUANTITY": ["1", "2"],
+    })
+
+
+def _upload(text):
+    upload = io.BytesIO(text.encode("utf-8"))
+    upload.name = "delivery.csv"
+    return read_import_file(upload)
+
+
+def test_headers_map_through_aliases_once():
+    mapping, unmapped = map_import_headers(["Frame No.", "COST PRICE", "Colour", "CostPrice", "barcode"], _inventory().columns)
+    assert mapping == {"Frame No.": "FRAMENUM", "COST PRICE": "COSTPRICE", "barcode": "BARCODE"}
+    # No FCOLOUR column in this inventory, and COSTPRICE is already taken
+    assert unmapped == ["Colour", "CostPrice"]
+
+
+def test_framecodes_continue_after_the_supplier_prefix_in_use():
+    existing = ["LUX000004", "AB000007", "ABC000010", "X000009", ""]
+    assert allocate_framecodes(["Luxottica", "ab", "Abc", "x", "ab", "New"], existing) == [
+        "LUX000005", "AB000011", "ABC000011", "X000010", "AB000012", "NEW000001",
+    ]
+
+
+def test_barcodes_come_from_the_free_pool_then_past_it(monkeypatch):
+    picked = allocate_barcodes(3, ["1", "2", "x"], rng=random.Random(1))
+    assert len(set(picked)) == 3 and not {"1", "2"} & set(picked)
+    monkeypatch.setattr("bulk_import.BARCODE_RANGE_MAX", 3)
+    assert allocate_barcodes(3, ["1", "3", "7"]) == ["2", "8", "9"]
+
+
+def test_prepare_import_fills_and_validates_each_row():
+    incoming = _upload(
+        "BAR CODE,FRAME NO.,SUPPLIER,COST PRICE,QUANTITY,NOTES\n"
+        "2001,,AB,$10.00,,new\n"        # framecode allocated after AB000007
+        ",LUX000020,LUXOTTICA,$12.00,3,\n"  # barcode allocated
+        "1001,LUX000021,LUXOTTICA,,1,\n"    # barcode already in inventory
+        "2002,LUX000004,LUXOTTICA,,1,\n"    # framecode already in inventory
+        "2003,LUX000022,LUXOTTICA,,two,\n"
+        "2004,LUX000023,LUXOTTICA,,1,\n"
+        "2004,LUX000024,LUXOTTICA,,1,\n"
+        "2005,,,,1,\n"
+    )
+    preview, mapping, unmapped = prepare_import(incoming, _inventory())
+    assert unmapped == ["NOTES"]
+    assert preview["IMPORT_STATUS"].tolist() == [
+        IMPORT_STATUS_OK, IMPORT_STATUS_OK, "Barcode already in inventory", "Framecode already in inventory",
+        "Invalid quantity", "Duplicate barcode in file", "Duplicate barcode in file", "Missing framecode",
+    ]
+    assert preview.loc[0, "FRAMENUM"] == "AB000008" and preview.loc[0, "QUANTITY"] == "1"
+    assert preview.loc[1, "BARCODE"].isdigit() and preview.loc[1, "BARCODE"] not in {"1001", "1002"}
+
+    committed = rows_to_commit(preview)
+    assert list(committed.columns) == list(_inventory().columns)
+    assert committed["FRAMENUM"].tolist() == ["AB000008", "LUX000020"]
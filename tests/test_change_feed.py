@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from change_feed import ChangeFeed, VersionConflict
+from inventory_utils import read_inventory_file
+
+
+def _edited(df, row, field, value):
+    new_df = df.copy()
+    new_df.loc[row, field] = value
+    return new_df
+
+
+def test_commit_bumps_version_and_logs_changed_fields(inventory_file):
+    feed = ChangeFeed(inventory_file)
+    base = feed.refresh()
+    df = read_inventory_file(inventory_file)
+    version = feed.commit(base, df, _edited(df, 0, "QUANTITY", "5"))
+    assert version == base + 1
+    assert feed.recent[-1]["changed"] == {"BARCODE:1001": {"QUANTITY": "5"}}
+    assert read_inventory_file(inventory_file).loc[0, "QUANTITY"] == "5"
+
+
+def test_commit_against_old_version_is_rejected(inventory_file):
+    feed = ChangeFeed(inventory_file)
+    base = feed.refresh()
+    df = read_inventory_file(inventory_file)
+    feed.commit(base, df, _edited(df, 0, "QUANTITY", "5"))
+    with pytest.raises(VersionConflict) as excinfo:
+        feed.commit(base, df, _edited(df, 1, "QUANTITY", "9"))
+    assert excinfo.value.current_version == base + 1
+    assert read_inventory_file(inventory_file).loc[1, "QUANTITY"] == "1"
+
+
+def test_commit_after_outside_change_does_not_deadlock(inventory_file):
+    feed = ChangeFeed(inventory_file)
+    base = feed.refresh()
+    df = read_inventory_file(inventory_file)
+    with open(inventory_file, "a") as f:
+        f.write("1004,ABC000003,Acme,A3,1,$50.00\n")
+
+    outcome = []
+
+    def commit():
+        try:
+            feed.commit(base, df, _edited(df, 0, "QUANTITY", "5"))
+        except VersionConflict as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=commit, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive(), "commit blocked on its own feed lock"
+    # The outside change is a reload, so the save made before it is a conflict
+    assert len(outcome) == 1 and outcome[0].current_version == base + 1
+
+
+def test_concurrent_commits_from_one_base_let_exactly_one_through(inventory_file):
+    feeds = [ChangeFeed(inventory_file) for _ in range(4)]
+    base = feeds[0].refresh()
+    df = read_inventory_file(inventory_file)
+    results = []
+    start = threading.Barrier(len(feeds))
+
+    def commit(feed, value):
+        feed.refresh()
+        start.wait()
+        try:
+            results.append(feed.commit(base, df, _edited(df, 0, "QUANTITY", value)))
+        except VersionConflict:
+            results.append(None)
+
+    threads = [threading.Thread(target=commit, args=(feed, str(i + 10))) for i, feed in enumerate(feeds)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert sorted(results, key=lambda v: v is None) == [base + 1, None, None, None]
+
+
+def test_refresh_sees_other_feeds_saves_and_outside_replacements(inventory_file):
+    writer, reader = ChangeFeed(inventory_file), ChangeFeed(inventory_file)
+    base = reader.refresh()
+    df = read_inventory_file(inventory_file)
+    writer.commit(writer.refresh(), df, _edited(df, 2, "MODEL", "Z2"))
+    assert reader.refresh() == base + 1
+    assert reader.changed_keys_since(base) == {"BARCODE:1003"}
+
+    df.to_csv(inventory_file, index=False)
+    assert reader.refresh() == base + 2
+    assert reader.changed_keys_since(base + 1) is None
@@ -0,0 +1,68 @@
+import pandas as pd
+
+from archive_store import ArchiveIndex
+from duplicates import ARCHIVE_SOURCE, INVENTORY_SOURCE, cluster_duplicates, get_duplicate_clusters
+from inventory_utils import inventory_snapshot
+
+
+def _inventory():
+    return pd.DataFrame({
+        "BARCODE": ["1001", "1002", "1003", "1004", "1005"],
+        "FRAMENUM": ["ABC000001", " abc000001", "ABC000001", "XYZ000001", ""],
+        "MANUFACT": ["Acme", "ACME", "Acme", "Zed", ""],
+        "MODEL": ["A1", "a1", "A1", "Z1", "A1"],
+        "SIZE": ["52-18", "52-18", "52-18", "50-20", ""],
+        "QUANTITY": ["2", "1", "3", "1", "1"],
+    })
+
+
+def test_exact_clusters_need_identical_fields_and_two_barcodes():
+    df = _inventory()
+    df.loc[2, "BARCODE"] = "1001"
+    assert cluster_duplicates(df, normalize=False)["clusters"].empty
+    df.loc[2, "BARCODE"] = "1003"
+    result = cluster_duplicates(df, normalize=False)
+    clusters = result["clusters"]
+    assert len(clusters) == 1
+    assert clusters.loc[0, "BARCODES"] == "1001, 1003"
+    assert clusters.loc[0, "ROWS"] == 2 and clusters.loc[0, "QUANTITY"] == 5
+    # Inventory rows are numbered as in the spreadsheet
+    assert result["members"]["ROW"].tolist() == ["2", "4"]
+
+
+def test_normalised_clusters_ignore_case_and_spacing():
+    result = cluster_duplicates(_inventory())
+    clusters = result["clusters"]
+    assert len(clusters) == 1
+    assert clusters.loc[0, "BARCODES"] == "1001, 1002, 1003"
+    assert clusters.loc[0, "FRAMENUM"] == "ABC000001"
+    # A row with too few identifying values is never clustered
+    assert "1005" not in result["members"]["BARCODE"].tolist()
+
+
+def test_archive_rows_join_inventory_clusters():
+    archive = pd.DataFrame({
+        "BARCODE": ["2001"], "FRAMENUM": ["XYZ000001"], "MANUFACT": ["Zed"], "MODEL": ["Z1"],
+        "SIZE": ["50-20"], "ARCHIVE_ID": ["a1"], "ARCHIVED_AT": ["2024-03-01 10:00:00"],
+    })
+    result = cluster_duplicates(_inventory(), archive)
+    zed = result["clusters"][result["clusters"]["MANUFACT"] == "ZED"].iloc[0]
+    assert (zed["INVENTORY_ROWS"], zed["ARCHIVE_ROWS"], zed["QUANTITY"]) == (1, 1, 1)
+    members = result["members"][result["members"]["CLUSTER"] == zed["CLUSTER"]]
+    assert members["SOURCE"].tolist() == [INVENTORY_SOURCE, ARCHIVE_SOURCE]
+    assert members["ROW"].tolist() == ["5", "a1"]
+
+
+def test_cached_clusters_follow_the_archive(inventory_file, tmp_path):
+    snapshot = inventory_snapshot(inventory_file)
+    archive_index = ArchiveIndex(str(tmp_path / "archive.jsonl"))
+    assert get_duplicate_clusters(inventory_file, archive_index, snapshot=snapshot)["clusters"].empty
+    record_id = ArchiveIndex(archive_index.log_path).archive_row(
+        {"BARCODE": "9001", "FRAMENUM": "XYZ000001", "MANUFACT": "Zed", "MODEL": "Z1"},
+    )
+    clusters = get_duplicate_clusters(inventory_file, archive_index, snapshot=snapshot)["clusters"]
+    assert clusters["BARCODES"].tolist() == ["1003, 9001"]
+    ArchiveIndex(archive_index.log_path).mark_restored(record_id)
+    assert get_duplicate_clusters(inventory_file, archive_index, snapshot=snapshot)["clusters"].empty
+    # One cached result per setting, replaced as the archive changes
+    assert [name for name in snapshot["derived"] if name.startswith("duplicate_clusters")] == ["duplicate_clusters_True_archive"]
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from frame_fit import build_fit_matrix, nearest_frames, similar_frames_table, split_size
+
+
+def _frames():
+    return pd.DataFrame({
+        "BARCODE": ["1001", "1002", "1003", "1004", "1005", "1006"],
+        "MODEL": ["Asked", "Temple", "Eye", "Bridge", "One shared", "Sold out"],
+        "SIZE": ["52-18", "52/18", "54 18", "52-20", "", "52-18"],
+        "TEMPLE": ["140", "145", "140", "0", "140", "140"],
+        "FRAMETYPE": ["Full", "full", "Rimless", "Full", "Full", "Full"],
+        "QUANTITY": ["1", "2", "1", "1", "1", "0"],
+        "RRP": ["$200.00", "$150.00", "$300.00", "$99.00", "$200.00", "$200.00"],
+    })
+
+
+def test_split_size_reads_eye_and_bridge():
+    eye, bridge = split_size(["56-18", "56/18.5", "56 18", "", "large"])
+    assert eye.tolist()[:3] == [56.0, 56.0, 56.0]
+    assert bridge.tolist()[:3] == [18.0, 18.5, 18.0]
+    assert eye[3:].isna().all() and bridge[3:].isna().all()
+
+
+def test_fit_matrix_reads_measurements_stock_and_prices():
+    fit = build_fit_matrix(_frames())
+    assert fit["matrix"].dtype == np.float32
+    assert fit["matrix"][0, :3].tolist() == [52.0, 18.0, 140.0]
+    # 0 means "not measured"
+    assert np.isnan(fit["matrix"][3, 2])
+    assert fit["in_stock"].tolist() == [True, True, True, True, True, False]
+    assert fit["frametype"].tolist()[:3] == ["FULL", "FULL", "RIMLESS"]
+    assert fit["rrp_cents"][:2].tolist() == [20000.0, 15000.0]
+
+
+def test_nearest_frames_rank_by_scaled_distance():
+    positions, distances = nearest_frames(build_fit_matrix(_frames()), 0)
+    # Out of stock and single-measurement frames are left out
+    assert positions.tolist() == [1, 2, 3]
+    assert np.allclose(distances, [np.sqrt(1 / 3), np.sqrt(4 / 3), np.sqrt(2)])
+    positions, _ = nearest_frames(build_fit_matrix(_frames()), 0, k=1)
+    assert positions.tolist() == [1]
+
+
+def test_nearest_frames_filters():
+    fit = build_fit_matrix(_frames())
+    assert nearest_frames(fit, 0, frametype="full")[0].tolist() == [1, 3]
+    assert nearest_frames(fit, 0, price_min=10000, price_max=20000)[0].tolist() == [1]
+    assert nearest_frames(fit, 0, in_stock_only=False)[0].tolist() == [5, 1, 2, 3]
+
+
+def test_similar_frames_table_lists_results_with_distance():
+    df = _frames()
+    positions, distances = nearest_frames(build_fit_matrix(df), 0, k=2)
+    table = similar_frames_table(df, positions, distances)
+    assert table.columns[0] == "DISTANCE"
+    assert table["BARCODE"].tolist() == ["1002", "1003"]
+    assert table["RRP"].tolist() == ["$150.00", "$300.00"]
+    assert table["DISTANCE"].tolist() == [0.58, 1.15]
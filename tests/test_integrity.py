@@ -0,0 +1,49 @@
+import pandas as pd
+
+from integrity import duplicate_rows, get_integrity
+from inventory_utils import forget_pending_inventory, inventory_snapshot, remember_pending_inventory
+
+
+def _write(path, rows):
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return str(path)
+
+
+def _flagged(integrity):
+    issues = integrity["issues"]
+    return {check: sorted(issues.loc[issues["CHECK"] == check, "ROW"]) for check in issues["CHECK"].unique()}
+
+
+def test_scan_flags_each_check_by_spreadsheet_row(tmp_path):
+    path = _write(tmp_path / "stock.csv", {
+        "BARCODE": ["00123", "123", "555", "556", "557"],
+        "FRAMENUM": ["A1", "A2", "A3", "A3", "A5"],
+        "RRP": ["$10.00", "abc", "", "$5", "$7"],
+        "LASTSALE": ["01/02/2024", "/  /", "someday", "", "03/04/2024"],
+        "QUANTITY": ["1", "-1", "2.5", "600", "3"],
+    })
+    integrity = get_integrity(path)
+    assert _flagged(integrity) == {
+        "Duplicate BARCODE": [2, 3],
+        "Duplicate FRAMENUM": [4, 5],
+        "Barcodes merged by cleaning": [2, 3],
+        "Unreadable price": [3],
+        "Unreadable date": [4],
+        "QUANTITY out of range": [3, 4, 5],
+    }
+    summary = integrity["summary"].set_index("CHECK")["ROWS"]
+    assert summary["Duplicate BARCODE"] == 2 and summary["Unreadable price"] == 1
+    assert duplicate_rows(path, "BARCODE", "0123", exclude_position=0) == [1]
+
+
+def test_pending_save_is_not_checked_against_the_older_file(tmp_path):
+    path = _write(tmp_path / "stock.csv", {"BARCODE": ["00123", "123"], "QUANTITY": ["1", "1"]})
+    assert "Barcodes merged by cleaning" in _flagged(get_integrity(path))
+
+    # Same row count, but the queued save has given the second row a new barcode
+    entry = remember_pending_inventory(path, pd.DataFrame({"BARCODE": ["123", "124"], "QUANTITY": ["1", "1"]}))
+    try:
+        assert inventory_snapshot(path) is entry
+        assert _flagged(get_integrity(path, entry)) == {}
+    finally:
+        forget_pending_inventory(path)
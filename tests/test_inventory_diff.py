@@ -0,0 +1,37 @@
+import io
+
+import pandas as pd
+
+from inventory_diff import apply_download, diff_inventory, read_inventory_file
+from inventory_utils import load_inventory_cached
+
+
+class Upload(io.BytesIO):
+    name = "download.csv"
+
+
+def _download(frame):
+    upload = Upload(frame.to_csv(index=False).encode("utf-8"))
+    return read_inventory_file(upload, name=upload.name)
+
+
+def test_apply_download_writes_the_saved_form_and_caches_a_reread(inventory_file):
+    old_df = load_inventory_cached(inventory_file)
+    # POS column order and naming, one price changed, one row gone, one new
+    download = _download(pd.DataFrame({
+        "FRAME NO.": ["ABC000001", "XYZ000001", "ABC000009"],
+        "MANUFACT": ["Acme", "Zed", "Acme"],
+        "MODEL": ["A1", "Z1", "A9"],
+        "QUANTITY": ["2", "4", "1"],
+        "RRP": ["$149.00", "$210.00", "$75.00"],
+        "BARCODE": ["1001", "1003", "1009"],
+    }))
+    diff = diff_inventory(old_df, download, inventory_file)
+    assert diff["changed_rows"] == 1 and len(diff["added"]) == 1 and len(diff["removed"]) == 1
+
+    apply_download(inventory_file, old_df, download, diff)
+    written = pd.read_csv(inventory_file, dtype=str)
+    assert list(written.columns[:2]) == ["BARCODE", "FRAMENUM"]
+    assert written["RRP"].tolist() == ["$149.00", "$210.00", "$75.00"]
+    assert written["BARCODE"].tolist() == ["1001", "1003", "1009"]
+    pd.testing.assert_frame_equal(load_inventory_cached(inventory_file), read_inventory_file(inventory_file))
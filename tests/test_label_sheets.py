@@ -0,0 +1,77 @@
+import re
+
+import pandas as pd
+
+from label_sheets import LABEL_LAYOUTS, build_label_pdf, label_lines, label_rows, pdf_bytes
+
+ROLL = LABEL_LAYOUTS["Label roll (1 x 1, 50 x 25 mm)"]
+SHEET_24 = LABEL_LAYOUTS["A4 - 24 per sheet (3 x 8, 70 x 37 mm)"]
+
+
+def _inventory():
+    return pd.DataFrame({
+        "BARCODE": ["1001", "1002", "", "1003"],
+        "FRAMENUM": ["ABC000001", "ABC000002", "ABC000003", "XYZ000001"],
+        "MANUFACT": ["Acme", "Acme", "Acme", "Zed"],
+        "MODEL": ["A1", "A2", "A3", "Z1"],
+        "QUANTITY": ["2", "0", "1", "3"],
+        "RRP": ["$149.00", "$99.50", "$10.00", ""],
+    })
+
+
+def _page_count(data):
+    return len(re.findall(rb"/Type\s*/Page\b(?!s)", data))
+
+
+def test_label_rows_skip_blank_barcodes_and_repeat_per_unit():
+    df = _inventory()
+    mask = pd.Series(True, index=df.index)
+    assert label_rows(df, mask)["BARCODE"].tolist() == ["1001", "1002", "1003"]
+    # A zero quantity still gets one label
+    assert label_rows(df, mask, one_per_unit=True)["BARCODE"].tolist() == ["1001", "1001", "1002", "1003", "1003", "1003"]
+
+
+def test_label_lines_build_captions_and_prices():
+    rows = label_rows(_inventory(), pd.Series([True, False, False, True]))
+    assert label_lines(rows) == [
+        ("1001", ("Acme A1", "ABC000001", "$149.00")),
+        ("1003", ("Zed Z1", "XYZ000001", "$0.00")),
+    ]
+
+
+def test_pdf_bytes_accepts_both_fpdf_output_types():
+    class Legacy:
+        def output(self, dest=""):
+            return "%PDF-1.3 caf\xe9"
+
+    class Modern:
+        def output(self, dest=""):
+            return bytearray(b"%PDF-1.3 x")
+
+    assert pdf_bytes(Legacy()) == b"%PDF-1.3 caf\xe9"
+    assert pdf_bytes(Modern()) == b"%PDF-1.3 x"
+
+
+def test_build_label_pdf_pages_and_start_position():
+    rows = label_rows(_inventory(), pd.Series(True, index=range(4)), one_per_unit=True)
+    data, failed = build_label_pdf(rows, ROLL, workers=1)
+    assert data.startswith(b"%PDF")
+    assert failed == []
+    assert _page_count(data) == 6
+    # 6 labels starting at slot 20 of 24 fill the first sheet and spill onto a second
+    data, _ = build_label_pdf(rows, SHEET_24, start_position=20, workers=1)
+    assert _page_count(data) == 2
+
+
+def test_build_label_pdf_reports_unrenderable_barcodes():
+    rows = pd.DataFrame({"BARCODE": ["1001", "café☃"], "MODEL": ["A1", "B1"]})
+    data, failed = build_label_pdf(rows, ROLL, workers=1)
+    assert data.startswith(b"%PDF")
+    assert failed == ["café☃"]
+
+
+def test_build_label_pdf_with_no_rows_is_one_blank_page():
+    data, failed = build_label_pdf(_inventory().iloc[0:0], ROLL, workers=1)
+    assert data.startswith(b"%PDF")
+    assert failed == []
+    assert _page_count(data) == 1
@@ -0,0 +1,105 @@
+import os
+
+import pandas as pd
+
+from inventory_utils import inventory_snapshot, load_inventory_cached
+from lookup_index import get_prefix_index, lookup_table, resolve_barcode, resolve_many, search_products, build_prefix_index
+
+
+def _write(path, rows):
+    pd.DataFrame(rows).to_csv(path, index=False)
+    st = os.stat(path)
+    # A distinct mtime, so the cache sees the rewrite even within one clock tick
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_resolve_many_tries_barcode_then_alternate_keys(tmp_path):
+    path = str(tmp_path / "stock.csv")
+    _write(path, {
+        "BARCODE": ["1001", "1002", "1003", "1004"],
+        "SUPBARCODE": ["9300001", "9300002", "", "9300002"],
+        "FRAMENUM": ["ABC000001", "ABC000002", "XYZ000001", "XYZ000002"],
+    })
+    resolved = resolve_many(path, ["1002", "9300001", "XYZ000001", "9300002", "nothing"])
+    assert resolved["BARCODE"].tolist()[:3] == ["1002", "1001", "1003"]
+    assert resolved["MATCHED_ON"].tolist()[:3] == ["BARCODE", "SUPBARCODE", "FRAMENUM"]
+    # A supplier barcode shared by two products is not guessed
+    assert resolved["BARCODE"][3:].isna().all()
+    assert resolve_barcode(path, "9300001") == ("1001", "SUPBARCODE")
+    assert resolve_barcode(path, "9300002") == (None, None)
+
+    table, positions = lookup_table(path, load_inventory_cached(path), ["XYZ000001", "nothing"])
+    assert table["STATUS"].tolist() == ["Found", "Not found"]
+    assert table["BARCODE"].tolist() == ["1003", ""]
+    assert positions.tolist() == [2]
+
+
+def test_search_products_matches_prefixes_and_model_words():
+    df = pd.DataFrame({
+        "BARCODE": ["1001", "1002", "2001", "3001"],
+        "FRAMENUM": ["ABC000001", "ABC000002", "XYZ000001", "QRS000001"],
+        "MODEL": ["Aviator Gold", "Round", "Cat Eye", "Gold Rim"],
+    })
+    index = build_prefix_index(df)
+    assert search_products(index, "abc") == ["BARCODE:1001", "BARCODE:1002"]
+    assert search_products(index, "10") == ["BARCODE:1001", "BARCODE:1002"]
+    assert search_products(index, "GOLD") == ["BARCODE:1001", "BARCODE:3001"]
+    assert search_products(index, "zzz") == []
+    assert search_products(index, "", limit=2) == ["BARCODE:1001", "BARCODE:1002"]
+    assert index["labels"]["BARCODE:2001"] == "2001 - XYZ000001 - Cat Eye"
+
+
+def test_snapshot_views_keep_pointing_into_their_own_frame(tmp_path):
+    path = str(tmp_path / "stock.csv")
+    _write(path, {"BARCODE": ["1001", "1002", "1003"], "FRAMENUM": ["A", "B", "C"]})
+    snapshot = inventory_snapshot(path)
+    df = snapshot["df"].copy(deep=False)
+    # Another session deletes the first product before this one looks it up
+    _write(path, {"BARCODE": ["1002", "1003"], "FRAMENUM": ["B", "C"]})
+    assert get_prefix_index(path)["positions"]["BARCODE:1003"] == 1
+    position = get_prefix_index(path, snapshot)["positions"]["BARCODE:1003"]
+    assert df.iloc[position]["FRAMENUM"] == "C"
+    table, _ = lookup_table(path, df, ["C"], snapshot=snapshot)
+    assert table["BARCODE"].tolist() == ["1003"]
+
+
+def test_concurrent_first_loads_share_one_entry(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    import inventory_utils
+
+    path = str(tmp_path / "stock.csv")
+    _write(path, {"BARCODE": ["1001", "1002"]})
+    parses = []
+    read = inventory_utils.read_inventory_file
+
+    def slow_read(p, name=None):
+        # Long enough for the second load to start while the first is parsing
+        parses.append(p)
+        time.sleep(0.2)
+        return read(p, name)
+
+    monkeypatch.setattr(inventory_utils, "read_inventory_file", slow_read)
+    snapshots = []
+    threads = [threading.Thread(target=lambda: snapshots.append(inventory_snapshot(path))) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # The warm-up thread and a page loading together parse once, so views a page
+    # builds on its snapshot are the ones every later run finds
+    assert len(parses) == 1
+    assert snapshots[0] is snapshots[1]
+
+
+def test_uuid_that_reads_as_a_huge_number_is_kept_as_text(tmp_path):
+    from inventory_utils import clean_barcode
+
+    # float("12e456") is inf, which int() cannot convert
+    assert clean_barcode("12e456") == "12e456"
+    assert clean_barcode("inf") == "inf"
+    assert clean_barcode("00123.0") == "123"
+    path = str(tmp_path / "stock.csv")
+    _write(path, {"BARCODE": ["1001", "1002"], "UUID": ["4f1c", "12e456"]})
+    assert resolve_barcode(path, clean_barcode("12e456")) == ("1002", "UUID")
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from bulk_edit import select_rows
+from inventory_utils import get_price_cents, inventory_snapshot
+from money import format_cents, format_cents_value, format_money, to_cents
+
+
+def test_to_cents_reads_prices_and_rejects_non_finite_values():
+    cents = to_cents(["$149.00", "1,299.5", " 99 ", "-5", "", None, "abc", "inf", "-inf", "nan", "1e400", "1e30"])
+    assert cents.tolist()[:4] == [14900, 129950, 9900, -500]
+    assert cents[4:].isna().all()
+    assert format_money(["inf", "$10"]).tolist() == ["$0.00", "$10.00"]
+
+
+def test_price_cents_are_parsed_once_per_version(inventory_file):
+    snapshot = inventory_snapshot(inventory_file)
+    cents = get_price_cents(inventory_file, "RRP", snapshot)
+    assert cents.tolist() == [14900, 9950, 20000]
+    assert get_price_cents(inventory_file, "RRP") is cents
+
+    df = snapshot["df"]
+    mask = select_rows(df, price_range=("RRP", 10000, None), price_cents=cents)
+    assert mask.tolist() == [True, False, True]
+    assert select_rows(df, price_range=("RRP", 10000, None)).equals(mask)
+
+
+def test_single_amounts_format_like_the_column():
+    values = [14900, -505, 0, 7, None, pd.NA]
+    assert [format_cents_value(v) for v in values] == format_cents(pd.Series(values, dtype="Int64")).tolist()
@@ -0,0 +1,62 @@
+import pandas as pd
+
+from reconcile import NO_INVENTORY, build_jobs, reconcile_inventory, run_jobs
+
+
+def _write(path, rows):
+    pd.DataFrame(rows, columns=["BARCODE", "FRAMENUM", "LOCATION", "QUANTITY"]).to_csv(path, index=False)
+    return str(path)
+
+
+def _merged(jobs):
+    results = run_jobs(jobs, workers=1)
+    return {name: pd.concat([r[name] for r, _ in results], ignore_index=True) for name in results[0][0]}
+
+
+def _scans(barcodes, locations=None):
+    scans = pd.DataFrame({"barcode": barcodes})
+    if locations is not None:
+        scans["location"] = locations
+    return scans
+
+
+def test_by_file_counts_each_scan_against_one_file(tmp_path):
+    a = _write(tmp_path / "a.csv", [["1", "A1", "Front", 1], ["2", "A2", "Back", 1]])
+    b = _write(tmp_path / "b.csv", [["2", "B2", "Front", 1], ["3", "B3", "Front", 1]])
+    merged = _merged(build_jobs([a, b], _scans(["1", "2", "3", "9", "9"]), by="file"))
+
+    counted = merged["matched"].set_index("FRAMENUM")["COUNTED"].to_dict()
+    assert counted == {"A1": 1, "A2": 1, "B3": 1}
+    # "2" belongs to a.csv, so b.csv's row for it is missing, not matched twice
+    assert merged["missing"]["FRAMENUM"].tolist() == ["B2"]
+    unexpected = merged["unexpected"]
+    assert unexpected[["PARTITION", "BARCODE", "COUNTED"]].values.tolist() == [[NO_INVENTORY, "9", 2]]
+
+
+def test_by_location_keeps_other_files_scans_out_of_blank_partitions(tmp_path):
+    a = _write(tmp_path / "a.csv", [["1", "A1", "Front", 1], ["2", "A2", "", 1]])
+    b = _write(tmp_path / "b.csv", [["3", "B3", "Back", 1]])
+    scans = _scans(["1", "3", "3", "7"], ["", "", "", "Back"])
+    merged = _merged(build_jobs([a, b], scans, by="location"))
+
+    unexpected = merged["unexpected"]
+    assert unexpected[["PARTITION", "BARCODE"]].values.tolist() == [[f"{NO_INVENTORY}:Back", "7"]]
+    matched = merged["matched"].set_index("FRAMENUM")
+    assert matched.loc["A1", "PARTITION"] == "a.csv:Front"
+    assert matched.loc["B3", ["PARTITION", "COUNTED"]].tolist() == ["b.csv:Back", 2]
+    assert merged["missing"][["PARTITION", "FRAMENUM"]].values.tolist() == [["a.csv:(none)", "A2"]]
+
+
+def test_duplicate_barcode_rows_share_their_scans_in_file_order():
+    inventory = pd.DataFrame({
+        "BARCODE": ["5", "5", "5", "6"],
+        "FRAMENUM": ["F1", "F2", "F3", "F4"],
+        "QUANTITY": ["2", "1", "1", "1"],
+    })
+    reports = reconcile_inventory(inventory, pd.Series({"5": 3, "6": 1}))
+    assert reports["matched"]["COUNTED"].tolist() == [2, 1, 1]
+    assert reports["missing"]["FRAMENUM"].tolist() == ["F3"]
+
+    surplus = reconcile_inventory(inventory, pd.Series({"5": 6}))
+    assert surplus["matched"]["COUNTED"].tolist()[:3] == [2, 1, 3]
+    assert surplus["variance"]["FRAMENUM"].tolist() == ["F3", "F4"]
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pandas as pd
+
+import stocktake_history
+from stocktake_history import list_snapshots, seal_stocktake, shrinkage
+from stocktake_session import ALL_LOCATIONS, Partition
+
+
+class _FrozenClock:
+    @staticmethod
+    def now():
+        return datetime(2026, 3, 1, 17, 30, 0)
+
+
+def _seal(tmp_path, inventory_file, df, name, scans):
+    partition = Partition(ALL_LOCATIONS, df, str(tmp_path / f"{name}.csv"))
+    for barcode in scans:
+        partition.add_scan(barcode)
+    return seal_stocktake(str(tmp_path / "history"), df, [partition], inventory_file, ("v", name))
+
+
+def test_counts_sealed_in_the_same_second_stay_separate(tmp_path, inventory_file, monkeypatch):
+    monkeypatch.setattr(stocktake_history, "datetime", _FrozenClock)
+    df = pd.read_csv(inventory_file, dtype=str)
+    first = _seal(tmp_path, inventory_file, df, "first", ["1001", "1001", "1002"])
+    second = _seal(tmp_path, inventory_file, df, "second", ["1001"])
+    assert first["sealed_at"] == second["sealed_at"]
+    assert first["id"] != second["id"]
+    assert [e["short_units"] for e in list_snapshots(str(tmp_path / "history"))] == [3, 5]
+
+    table = shrinkage(str(tmp_path / "history"), "FRAMENUM").set_index("FRAMENUM")
+    assert table.loc["XYZ000001", "COUNTS_SHORT"] == 2
+    assert table.loc["XYZ000001", "SHORT_UNITS"] == 6
+    assert table.loc["ABC000001", "COUNTS_SHORT"] == 1
+    assert table.loc["XYZ000001", "SHORT_VALUE"] == "$1200.00"
+    # One column per count, oldest first, labelled by seal time and snapshot id
+    assert list(table.columns[-2:]) == [
+        f"2026-03-01 17:30:00 ({first['id']})", f"2026-03-01 17:30:00 ({second['id']})",
+    ]
+    assert table.loc["ABC000001"].iloc[-2:].tolist() == [0, 1]
+
+
+def test_shrinkage_filters_by_manufacturer_and_last_n(tmp_path, inventory_file):
+    df = pd.read_csv(inventory_file, dtype=str)
+    _seal(tmp_path, inventory_file, df, "first", [])
+    _seal(tmp_path, inventory_file, df, "second", ["1001", "1001", "1002"])
+    folder = str(tmp_path / "history")
+
+    by_maker = shrinkage(folder, "MANUFACT").set_index("MANUFACT")
+    assert by_maker["SHORT_UNITS"].to_dict() == {"Zed": 6, "Acme": 3}
+    assert by_maker.loc["Acme", "COUNTS_SHORT"] == 1
+    latest = shrinkage(folder, "FRAMENUM", last=1, manufacturers=["Acme"])
+    assert latest.empty
+    assert shrinkage(folder, "FRAMENUM", framenum_prefix="ABC")["FRAMENUM"].tolist() == ["ABC000001", "ABC000002"]
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+import stocktake_session
+from stocktake_session import ALL_LOCATIONS, Partition, get_partition, location_mask, reconcile_partitions
+
+
+@pytest.fixture
+def stock():
+    return pd.DataFrame({
+        "BARCODE": ["1", "2", "3", "3", "4"],
+        "FRAMENUM": ["F1", "F2", "F3", "F3B", "F4"],
+        "LOCATION": ["Front", "Front", "Back", "Back", "Back"],
+        "LOCATION2": ["", "Back", "", "", "Front"],
+        "QUANTITY": ["2", "1", "1", "1", "1"],
+        "RRP": ["$10.00", "$20.00", "$5.00", "$5.00", "$1.00"],
+    })
+
+
+def test_counters_follow_scans_removals_and_clears(stock, tmp_path):
+    partition = Partition(ALL_LOCATIONS, stock, str(tmp_path / "scans.csv"))
+    assert partition.progress()["expected_units"] == 6
+    assert partition.progress()["expected_value"] == 51.0
+
+    for barcode in ["1", "1", "1", "3", "9"]:
+        partition.add_scan(barcode)
+    progress = partition.progress()
+    # The third "1" is over the expected 2 and does not add progress
+    assert (progress["counted_units"], progress["counted_value"]) == (3, 25.0)
+    assert progress["unexpected_scans"] == 1
+    assert partition.missing == {"2", "4"}
+    assert partition.missing_rows().tolist() == [1, 4]
+
+    partition.remove_barcode("1")
+    assert partition.progress()["counted_units"] == 1
+    assert partition.missing == {"1", "2", "4"}
+
+    partition.clear()
+    assert partition.progress()["counted_units"] == 0
+    assert partition.progress()["unexpected_scans"] == 0
+    assert partition.missing == {"1", "2", "3", "4"}
+
+
+def test_counters_pick_up_scans_appended_by_another_session(stock, tmp_path):
+    scan_file = str(tmp_path / "scans.csv")
+    mine, theirs = Partition(ALL_LOCATIONS, stock, scan_file), Partition(ALL_LOCATIONS, stock, scan_file)
+    theirs.add_scan("2")
+    mine.refresh()
+    assert mine.progress()["counted_units"] == 1
+    assert "2" not in mine.missing
+
+
+def test_a_row_in_two_counted_locations_is_expected_in_one(stock):
+    both = ["Front", "Back"]
+    front, back = location_mask(stock, "Front", both), location_mask(stock, "Back", both)
+    assert not (front & back).any()
+    assert (front | back).all()
+    assert stock["FRAMENUM"][front].tolist() == ["F1", "F2"]
+    # Counted on its own, a location still expects every row that names it
+    assert stock["FRAMENUM"][location_mask(stock, "Back")].tolist() == ["F2", "F3", "F3B", "F4"]
+
+
+def test_merged_reconciliation_matches_partition_progress(stock, tmp_path):
+    scope = ["Front", "Back"]
+    partitions = [
+        get_partition(("test", 1), stock, loc, str(tmp_path / f"{loc}.csv"), scope=scope)
+        for loc in scope
+    ]
+    for barcode in ["1", "2", "3", "3"]:
+        partitions[0 if barcode in ("1", "2") else 1].add_scan(barcode)
+
+    reports = reconcile_partitions(stock, partitions, workers=1)
+    lines = pd.concat([reports["matched"], reports["missing"]])
+    assert sorted(lines["FRAMENUM"]) == sorted(stock["FRAMENUM"])
+    assert lines["EXPECTED"].sum() == sum(p.progress()["expected_units"] for p in partitions)
+    assert lines["COUNTED"].sum() == sum(p.progress()["counted_units"] for p in partitions) == 4
+    assert reports["missing"]["FRAMENUM"].tolist() == ["F4"]
+
+
+def test_a_new_inventory_version_replaces_the_shared_partition(stock, tmp_path):
+    scan_file = str(tmp_path / "Front.csv")
+    first = get_partition(("test", 1), stock, "Front", scan_file)
+    first.add_scan("1")
+    assert get_partition(("test", 1), stock, "Front", scan_file) is first
+
+    second = get_partition(("test", 2), stock, "Front", scan_file)
+    assert second is not first and second.counted["1"] == 1
+    assert [p for _, p in stocktake_session._partitions.values()].count(first) == 0
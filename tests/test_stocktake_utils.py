@@ -0,0 +1,64 @@
+import pandas as pd
+
+from stocktake_session import ALL_LOCATIONS, Partition
+from stocktake_utils import ScannedIndex, build_scanned_table, find_scan_duplicate
+
+
+def _inventory():
+    return pd.DataFrame({
+        "BARCODE": ["1001", "1002", "1003", "1004"],
+        "FRAMENUM": ["ABC000001", "ABC000001", "", "XYZ000001"],
+        "MODEL": ["M1", "M1", "M3", "M4"],
+        "MANUFACT": ["Acme", "Acme", "Zed", "Zed"],
+        "QUANTITY": ["2", "1", "3", "5"],
+    })
+
+
+def test_scanned_table_puts_recent_scans_first_and_counts_per_frame():
+    scans = ["1003", "1001", "9999", "1002", "1003"]
+    scanned_df, display_df = build_scanned_table(_inventory(), scans)
+    assert scanned_df["BARCODE"].tolist() == ["1003", "1002", "1001"]
+    # 1001 and 1002 share a FRAMENUM; 1003 has none and is keyed by its barcode
+    assert display_df["QUANTITY"].tolist() == ["2", "2", "2"]
+
+    scanned_df, display_df = build_scanned_table(_inventory(), ["9999"])
+    assert scanned_df.empty and display_df.empty
+
+
+def test_scan_duplicate_matches_same_product_or_same_barcode():
+    df = _inventory()
+    assert find_scan_duplicate(df, ["1004", "1001"], "1002")[0] == "1001"
+    assert find_scan_duplicate(df, ["1003"], "1003")[0] == "1003"
+    match, sig = find_scan_duplicate(df, ["1001"], "1004")
+    assert match is None
+    assert sig == ("XYZ000001", "M4", "Zed", "", "", "")
+
+
+def test_index_follows_partition_logs_scan_by_scan(tmp_path):
+    df = _inventory()
+    partition = Partition(ALL_LOCATIONS, df, str(tmp_path / "scans.csv"))
+    other = Partition(ALL_LOCATIONS, df, str(tmp_path / "scans.csv"))  # another session's view
+    index = ScannedIndex(df)
+
+    def check():
+        index.sync({ALL_LOCATIONS: partition})
+        expected = build_scanned_table(df, partition.log.barcodes)
+        pd.testing.assert_frame_equal(index.table()[1], expected[1])
+        for barcode in df["BARCODE"]:
+            assert index.find_duplicate(barcode) == find_scan_duplicate(df, partition.log.barcodes, barcode)
+
+    for barcode in ["1003", "1001", "9999", "1004", "1001"]:
+        partition.add_scan(barcode)
+        check()
+
+    # This session's removal is applied in place rather than re-read
+    index.remove("1001")
+    partition.remove_barcode("1001")
+    check()
+    assert index.table()[0]["BARCODE"].tolist() == ["1004", "1003"]
+
+    # A removal made elsewhere rewrites the log, and the index is rebuilt from it
+    other.remove_barcode("1003")
+    partition.refresh()
+    check()
+    assert index.table()[0]["BARCODE"].tolist() == ["1004"]
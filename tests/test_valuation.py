@@ -0,0 +1,60 @@
+from datetime import date
+
+import pandas as pd
+
+from inventory_utils import get_derived, inventory_snapshot
+from valuation import BLANK_GROUP, NO_DATE_BUCKET, ageing_by, build_valuation_frame, parse_dates, value_by
+
+
+def _stock():
+    return pd.DataFrame({
+        "SUPPLIER": ["LUX", "LUX", "Safilo", ""],
+        "QUANTITY": ["2", "1", "3", "abc"],
+        "RRP": ["$100.00", "50", "$20.00", "$10.00"],
+        # COSTPRICE is preferred; the POS often only fills EXCOSTPR
+        "COSTPRICE": ["$40.00", "", "", ""],
+        "EXCOSTPR": ["$35.00", "$20.00", "", ""],
+        "LASTSALE": ["01/12/2023", "", "", ""],
+        "LASTPUR": ["", "2023-06-15", "", ""],
+    })
+
+
+def test_value_by_groups_units_and_cents():
+    frame = build_valuation_frame(_stock())
+    # An unreadable QUANTITY still counts as one frame on the shelf
+    assert frame["UNITS"].tolist() == [2, 1, 3, 1]
+    assert frame["COST_CENTS"].tolist() == [8000, 2000, 0, 0]
+    assert frame["RRP_CENTS"].tolist() == [20000, 5000, 6000, 1000]
+
+    grouped = value_by(frame, "SUPPLIER").set_index("SUPPLIER")
+    assert list(grouped.index) == ["LUX", "Safilo", BLANK_GROUP]
+    assert grouped.loc["LUX", ["PRODUCTS", "UNITS", "COST_CENTS", "RRP_CENTS", "NO_COST"]].tolist() == [2, 3, 10000, 25000, 0]
+    assert grouped.loc["LUX", "MARGIN_PCT"] == 60.0
+    assert grouped.loc["Safilo", "NO_COST"] == 1
+    assert grouped.loc[BLANK_GROUP, "NO_COST"] == 1
+    # The groups add up to the page's totals
+    assert grouped["RRP_CENTS"].sum() == frame["RRP_CENTS"].sum() == 32000
+
+
+def test_ageing_buckets_fall_back_along_the_basis():
+    frame = build_valuation_frame(_stock())
+    value, units = ageing_by(frame, "SUPPLIER", "Last sale (else last purchase)", date(2024, 3, 1))
+    assert value.loc["LUX", "91-180 days"] == 20000  # last sold 1 Dec 2023
+    assert value.loc["LUX", "6-12 months"] == 5000  # never sold, bought 15 Jun 2023
+    assert value.loc["Safilo", NO_DATE_BUCKET] == 6000 and units.loc["Safilo", NO_DATE_BUCKET] == 3
+    value, _ = ageing_by(frame, "SUPPLIER", "Last sale", date(2024, 3, 1))
+    assert value.loc["LUX", NO_DATE_BUCKET] == 5000
+
+
+def test_dates_parse_in_either_format_and_blanks_stay_blank():
+    parsed = parse_dates(["25/12/2023", "2023-12-24", "/  /", "", "soon"])
+    assert parsed[:2].dt.strftime("%Y-%m-%d").tolist() == ["2023-12-25", "2023-12-24"]
+    assert parsed[2:].isna().all()
+
+
+def test_page_tables_come_from_one_snapshot(inventory_file):
+    snapshot = inventory_snapshot(inventory_file)
+    frame = get_derived(inventory_file, "valuation_frame", build_valuation_frame, snapshot)
+    grouped = get_derived(inventory_file, "valuation_by_SUPPLIER", lambda _: value_by(frame, "SUPPLIER"), snapshot)
+    assert grouped["RRP_CENTS"].sum() == 2 * 14900 + 9950 + 3 * 20000
+    assert get_derived(inventory_file, "valuation_by_SUPPLIER", None, snapshot) is grouped
@@ -0,0 +1,88 @@
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+
+import pandas as pd
+import pytest
+
+import write_behind
+from change_feed import ChangeFeed
+from inventory_utils import prepare_for_save, read_inventory_file
+from write_behind import WriteBehind
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The edits a session makes: one field changed, one row deleted, one added
+SAVE = textwrap.dedent("""
+    import pandas as pd
+    from inventory_utils import prepare_for_save, read_inventory_file
+
+    def save(feed, writer, path):
+        old = prepare_for_save(read_inventory_file(path))
+        new = old.copy()
+        new.loc[0, "QUANTITY"] = "7"
+        new = new.drop(1).reset_index(drop=True)
+        new = pd.concat([new, pd.DataFrame([{
+            "BARCODE": "1004", "FRAMENUM": "ABC000003", "MANUFACT": "Acme",
+            "MODEL": "A3", "QUANTITY": "1", "RRP": "$50.00",
+        }])], ignore_index=True)
+        feed.commit(feed.refresh(), old, prepare_for_save(new), write=writer.submit, deferred=True)
+""")
+
+
+@pytest.fixture(autouse=True)
+def slow_writer(monkeypatch):
+    # Nothing is written in the background while a test looks at the feed
+    monkeypatch.setattr(write_behind, "FLUSH_DELAY", 60)
+    monkeypatch.setattr(write_behind, "FLUSH_MAX_DELAY", 60)
+
+
+def _save(feed, writer, path):
+    namespace = {}
+    exec(SAVE, namespace)
+    namespace["save"](feed, writer, path)
+
+
+def test_crash_replay_writes_the_same_file_as_a_live_flush(inventory_file, tmp_path, monkeypatch):
+    monkeypatch.setenv("INVENTORY_WRITE_DELAY", "60")
+    monkeypatch.setenv("INVENTORY_WRITE_MAX_DELAY", "60")
+    crashed = str(tmp_path / "crashed" / "stock.csv")
+    os.makedirs(os.path.dirname(crashed))
+    shutil.copy(inventory_file, crashed)
+
+    # The save is logged, then the process dies before the background write
+    script = SAVE + textwrap.dedent(f"""
+        import os
+        from write_behind import get_write_behind
+        writer = get_write_behind({crashed!r})
+        save(writer.feed, writer, {crashed!r})
+        os._exit(0)
+    """)
+    subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, check=True, env=dict(os.environ))
+    assert read_inventory_file(crashed)["QUANTITY"].tolist() == ["2", "1", "3"]
+
+    writer = WriteBehind(crashed, ChangeFeed(crashed))
+    assert writer.feed.unpersisted_events() == []
+
+    live = WriteBehind(inventory_file, ChangeFeed(inventory_file))
+    _save(live.feed, live, inventory_file)
+    assert live.flush()
+
+    with open(crashed) as f, open(inventory_file) as g:
+        assert f.read() == g.read()
+    replayed = pd.read_csv(crashed, dtype=str)
+    assert replayed["RRP"].tolist() == ["$149.00", "$200.00", "$50.00"]
+    assert replayed["QUANTITY"].tolist() == ["7", "3", "1"]
+
+
+def test_replay_is_not_repeated_once_persisted(inventory_file):
+    feed = ChangeFeed(inventory_file)
+    writer = WriteBehind(inventory_file, feed)
+    _save(feed, writer, inventory_file)
+    assert feed.persisted_version < feed.version
+    assert writer.recover() == 1
+    assert feed.persisted_version == feed.version
+    assert writer.recover() == 0
+    assert prepare_for_save(read_inventory_file(inventory_file))["RRP"].tolist() == ["$149.00", "$200.00", "$50.00"]
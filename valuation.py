@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from money import COST_FIELDS, first_cents
+from reconcile import expected_quantities
+
+# Stock value and ageing for the Stock Valuation page. Everything here is a pure
+# function of one inventory frame, so the page memoises the results per
+# inventory version with inventory_utils.get_derived.
+GROUP_FIELDS = ["SUPPLIER", "MANUFACT", "LOCATION", "FRAMETYPE"]
+DATE_FIELDS = ["LASTSALE", "LASTPUR", "FIRSTPUR", "AVAILFROM"]
+# Each basis falls back along its list when a frame has no date in the first field
+AGEING_BASES = {
+    "Last sale (else last purchase)": ["LASTSALE", "LASTPUR", "FIRSTPUR", "AVAILFROM"],
+    "Last sale": ["LASTSALE"],
+    "Last purchase": ["LASTPUR", "FIRSTPUR"],
+    "Available from": ["AVAILFROM"],
+}
+AGEING_BUCKETS = [(0, 90, "0-90 days"), (91, 180, "91-180 days"), (181, 365, "6-12 months"),
+                  (366, 730, "1-2 years"), (731, None, "Over 2 years")]
+NO_DATE_BUCKET = "No date"
+BLANK_GROUP = "(blank)"
+# POS exports write dd/mm/yyyy, the app itself writes ISO dates
+DATE_FORMATS = ["%d/%m/%Y", "%Y-%m-%d", "%d/%m/%y", "%d-%m-%Y", "%Y/%m/%d"]
+
+# The format that last parsed each field, tried first next time
+_field_formats = {}
+_field_formats_lock = threading.Lock()
+
+
+def parse_dates(values, field=None):
+    # Vectorised: only distinct strings are parsed, each format is applied to a
+    # whole batch, and "/  /", "" and "nan" are blank
+    text = pd.Series(values).astype("string").str.strip()
+    text = text.mask(text.isin(["", "nan", "NaT", "None"]) | text.str.fullmatch(r"[/\s-]*").fillna(True))
+    uniques = pd.Series(text.dropna().unique(), dtype="string")
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype="datetime64[ns]")
+    with _field_formats_lock:
+        preferred = _field_formats.get(field)
+    formats = ([preferred] if preferred else []) + [f for f in DATE_FORMATS if f != preferred]
+    best_format, best_count = None, 0
+    for fmt in formats:
+        todo = parsed.isna()
+        if not todo.any():
+            break
+        attempt = pd.to_datetime(uniques[todo], format=fmt, errors="coerce")
+        count = int(attempt.notna().sum())
+        if count:
+            parsed[todo] = attempt
+            if count > best_count:
+                best_format, best_count = fmt, count
+    if field and best_format:
+        with _field_formats_lock:
+            _field_formats[field] = best_format
+    lookup = dict(zip(uniques.tolist(), parsed.tolist()))
+    return pd.to_datetime(text.map(lookup, na_action="ignore"), errors="coerce")
+
+
+def build_valuation_frame(df):
+    # One narrow frame per inventory version: group keys, units, value in cents, dates
+    frame = pd.DataFrame(index=df.index)
+    for field in GROUP_FIELDS:
+        values = df[field].astype("string").str.strip() if field in df.columns else pd.Series(pd.NA, index=df.index, dtype="string")
+        frame[field] = values.mask(values.isin(["", "nan"])).fillna(BLANK_GROUP)
+    frame["UNITS"] = expected_quantities(df)
+    frame["UNIT_COST"] = first_cents(df, COST_FIELDS)
+    frame["UNIT_RRP"] = first_cents(df, ["RRP"])
+    frame["COST_CENTS"] = frame["UNIT_COST"].fillna(0).astype(np.int64) * frame["UNITS"]
+    frame["RRP_CENTS"] = frame["UNIT_RRP"].fillna(0).astype(np.int64) * frame["UNITS"]
+    for field in DATE_FIELDS:
+        frame[field] = parse_dates(df[field], field) if field in df.columns else pd.NaT
+        frame[field] = frame[field].astype("datetime64[ns]")
+    return frame
+
+
+def value_by(frame, field):
+    grouped = frame.groupby(field, sort=False).agg(
+        PRODUCTS=("UNITS", "size"),
+        UNITS=("UNITS", "sum"),
+        COST_CENTS=("COST_CENTS", "sum"),
+        RRP_CENTS=("RRP_CENTS", "sum"),
+        NO_COST=("UNIT_COST", lambda s: int(s.isna().sum())),
+    )
+    grouped["MARGIN_PCT"] = np.where(
+        grouped["RRP_CENTS"] > 0,
+        ((grouped["RRP_CENTS"] - grouped["COST_CENTS"]) / grouped["RRP_CENTS"].where(grouped["RRP_CENTS"] > 0) * 100).round(1),
+        np.nan,
+    )
+    return grouped.sort_values("RRP_CENTS", ascending=False).reset_index()
+
+
+def ageing_dates(frame, basis):
+    dates = pd.Series(pd.NaT, index=frame.index, dtype="datetime64[ns]")
+    for field in AGEING_BASES[basis]:
+        dates = dates.fillna(frame[field])
+    return dates
+
+
+def ageing_by(frame, field, basis, today):
+    days = (pd.Timestamp(today).normalize() - ageing_dates(frame, basis)).dt.days
+    labels = [label for _, _, label in AGEING_BUCKETS]
+    bins = [-np.inf] + [high if high is not None else np.inf for _, high, _ in AGEING_BUCKETS]
+    bucket = pd.cut(days.clip(lower=0), bins=bins, labels=labels).cat.add_categories([NO_DATE_BUCKET]).fillna(NO_DATE_BUCKET)
+    table = pd.pivot_table(
+        frame.assign(BUCKET=bucket), index=field, columns="BUCKET", values="RRP_CENTS",
+        aggfunc="sum", fill_value=0, observed=False,
+    )
+    table = table.reindex(columns=labels + [NO_DATE_BUCKET], fill_value=0)
+    units = pd.pivot_table(
+        frame.assign(BUCKET=bucket), index=field, columns="BUCKET", values="UNITS",
+        aggfunc="sum", fill_value=0, observed=False,
+    ).reindex(columns=labels + [NO_DATE_BUCKET], fill_value=0)
+    return table, units
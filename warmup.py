@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+import time
+
+from inventory_utils import load_inventory_cached, get_barcode_index, size_options
+from lookup_index import get_key_index, get_prefix_index
+
+# Background warm-up so the first visitor doesn't pay for parsing the inventory,
+# building the barcode, key and search indexes or importing the barcode/PIL stack.
+_state = {"started": None, "ready": False, "error": None, "timings": {}}
+_state_lock = threading.Lock()
+_thread = None
+
+
+def _timed(name, fn):
+    start = time.perf_counter()
+    fn()
+    _state["timings"][name] = round(time.perf_counter() - start, 3)
+
+
+def _import_barcode_stack():
+    import barcode  # noqa: F401
+    from barcode.writer import ImageWriter  # noqa: F401
+
+
+def _run(inventory_files, ready_file, extra_steps):
+    try:
+        _timed("import_barcode", _import_barcode_stack)
+        _timed("size_options", size_options)
+        for path in inventory_files:
+            name = os.path.basename(path)
+            _timed(f"load:{name}", lambda: load_inventory_cached(path))
+            _timed(f"index:{name}", lambda: get_barcode_index(path))
+            _timed(f"keys:{name}", lambda: get_key_index(path))
+            _timed(f"search:{name}", lambda: get_prefix_index(path))
+        for name, step in extra_steps:
+            _timed(name, step)
+        _state["ready"] = True
+    except Exception as e:
+        _state["error"] = str(e)
+    _state["timings"]["total"] = round(time.perf_counter() - _state["started"], 3)
+    if ready_file:
+        with open(ready_file, "w", encoding="utf-8") as f:
+            json.dump(status(), f)
+
+
+def inventory_paths(folder):
+    if not os.path.isdir(folder):
+        return []
+    return [
+        os.path.join(folder, f) for f in sorted(os.listdir(folder))
+        if f.lower().endswith(('.xlsx', '.csv')) and not f.startswith("archive_inventory")
+    ]
+
+
+def start_warmup(inventory_files, ready_file=None, extra_steps=()):
+    # Idempotent: only the first call in a process starts the thread
+    global _thread
+    with _state_lock:
+        if _thread is not None:
+            return _thread
+        if ready_file and os.path.exists(ready_file):
+            os.remove(ready_file)
+        _state["started"] = time.perf_counter()
+        _thread = threading.Thread(
+            target=_run, args=(list(inventory_files), ready_file, list(extra_steps)),
+            name="inventory-warmup", daemon=True,
+        )
+        _thread.start()
+    return _thread
+
+
+def is_ready():
+    return _state["ready"]
+
+
+def status():
+    return {"ready": _state["ready"], "error": _state["error"], "timings": dict(_state["timings"])}
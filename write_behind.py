@@ -0,0 +1,189 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from change_feed import SAVE_EVENT, get_change_feed
+from inventory_diff import row_keys
+from inventory_utils import (
+    read_inventory_file, write_inventory_file, prepare_for_save, remember_pending_inventory,
+    mark_inventory_written, forget_pending_inventory,
+)
+from perf import span
+
+# Write-behind persistence for the inventory file. A save is logged to the
+# change feed straight away (the durable intent log) and the new frame is
+# served from the process cache, while a background thread rewrites the file
+# once the edits stop for FLUSH_DELAY seconds (or FLUSH_MAX_DELAY after the
+# first unwritten one), so a burst of edits costs one rewrite. The file is
+# written to a temporary copy and renamed over the original, so it is never
+# left half written; after a crash the unwritten saves are replayed from the
+# feed the next time the file is opened. Pending saves are flushed at exit.
+FLUSH_DELAY = float(os.environ.get("INVENTORY_WRITE_DELAY", "2"))
+FLUSH_MAX_DELAY = float(os.environ.get("INVENTORY_WRITE_MAX_DELAY", "15"))
+logger = logging.getLogger("inventory.write_behind")
+
+
+def write_inventory_atomic(df, path, folder):
+    # df is in the saved form (inventory_utils.prepare_for_save). The temporary
+    # copy lives in `folder` (the change feed's), not next to the inventory
+    # files, so it never shows up in the file pickers
+    os.makedirs(folder, exist_ok=True)
+    root, ext = os.path.splitext(os.path.basename(path))
+    tmp_path = os.path.join(folder, f"{root}.writing{ext}")
+    write_inventory_file(df, tmp_path)
+    with open(tmp_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def replay_events(df, events):
+    # Applies logged deferred saves to the frame read from the file; returns it in
+    # the saved form, as the live save would have written it
+    df = df.fillna("").replace({"nan": ""}).reset_index(drop=True)
+    for event in events:
+        keys = row_keys(df)
+        if event.get("removed"):
+            df = df[~pd.Series(keys).isin(event["removed"]).to_numpy()].reset_index(drop=True)
+            keys = row_keys(df)
+        positions = {key: i for i, key in enumerate(keys)}
+        for key, fields in event.get("changed", {}).items():
+            if key not in positions:
+                continue
+            for field, value in fields.items():
+                if field not in df.columns:
+                    df[field] = ""
+                df.loc[positions[key], field] = value
+        if event.get("added_rows"):
+            df = pd.concat([df, pd.DataFrame(event["added_rows"])], ignore_index=True).fillna("")
+    return prepare_for_save(df)
+
+
+class WriteBehind:
+    def __init__(self, inventory_file, feed=None):
+        self.inventory_file = inventory_file
+        self.feed = feed or get_change_feed(inventory_file)
+        self._cond = threading.Condition()
+        self._pending = None  # (frame, feed version it belongs to, cache entry)
+        self._due = None
+        self._deadline = None
+        self.last_error = None
+        self.recover()
+        self._thread = threading.Thread(target=self._run, name="inventory-write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, df):
+        # Called by ChangeFeed.commit while it holds the feed lock, just before the
+        # save event for version + 1 is appended. Returns the cache entry that now
+        # serves df (see inventory_utils.inventory_snapshot).
+        entry = remember_pending_inventory(self.inventory_file, df)
+        now = time.monotonic()
+        with self._cond:
+            if self._pending is None:
+                self._deadline = now + FLUSH_MAX_DELAY
+            self._pending = (df, self.feed.version + 1, entry)
+            self._due = min(now + FLUSH_DELAY, self._deadline)
+            self._cond.notify()
+        return entry
+
+    def pending(self):
+        with self._cond:
+            return self._pending is not None
+
+    def discard(self):
+        # A direct write is replacing the file; whatever was queued is superseded
+        with self._cond:
+            self._pending = None
+        forget_pending_inventory(self.inventory_file)
+
+    def flush(self):
+        # Writes the queued frame now; returns True if the file was rewritten.
+        # Lock order is feed, then condition, the same as commit -> submit.
+        with self.feed._locked():
+            with self._cond:
+                pending, self._pending = self._pending, None
+            if pending is None:
+                return False
+            df, version, entry = pending
+            self.feed._refresh_locked()
+            if self.feed.version != version:
+                # The file was replaced or saved directly after this save was queued
+                forget_pending_inventory(self.inventory_file)
+                return False
+            try:
+                with span("write_behind.write"):
+                    write_inventory_atomic(df, self.inventory_file, os.path.dirname(self.feed.log_path))
+            except Exception:
+                with self._cond:
+                    if self._pending is None:
+                        self._pending = pending
+                        self._due = time.monotonic() + FLUSH_DELAY
+                raise
+            self.feed.mark_persisted(version)
+            mark_inventory_written(self.inventory_file, entry)
+        return True
+
+    def recover(self):
+        # Redoes deferred saves logged before a crash; returns how many were replayed
+        with self.feed._locked():
+            self.feed._refresh_locked()
+            events = self.feed.unpersisted_events()
+            if events is None:
+                logger.warning("Unwritten saves for %s are no longer in the change feed", self.inventory_file)
+                return 0
+            events = [e for e in events if e["event"] == SAVE_EVENT and e.get("deferred")]
+            if not events or not os.path.exists(self.inventory_file):
+                return 0
+            df = replay_events(read_inventory_file(self.inventory_file), events)
+            write_inventory_atomic(df, self.inventory_file, os.path.dirname(self.feed.log_path))
+            self.feed.mark_persisted(events[-1]["version"])
+            logger.warning("Replayed %d unwritten saves into %s", len(events), self.inventory_file)
+            return len(events)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                delay = self._due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+            try:
+                self.flush()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("Writing %s failed; retrying", self.inventory_file)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_write_behind(inventory_file):
+    # One writer per inventory file for the whole process, shared by every session.
+    key = os.path.abspath(inventory_file)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = WriteBehind(inventory_file)
+            writer.feed.pending_writer = writer
+            _writers[key] = writer
+    return writer
+
+
+def flush_all():
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        try:
+            writer.flush()
+        except Exception:
+            logger.exception("Writing %s failed at shutdown", writer.inventory_file)
+
+
+atexit.register(flush_all)